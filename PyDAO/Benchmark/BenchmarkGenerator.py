@@ -0,0 +1,61 @@
+#
+# BenchmarkGenerator
+#
+# A simple generator producing a class stub for each
+# table, for use in benchmarks.
+#
+# Part of the PyDAO package.
+#
+# (c) 2011 Lee Supe (lain_proliant)
+# Released under the GNU General Public License, version 3.
+#
+
+from PyDAO.GeneratorBase import *
+from PyDAO.IndentWriter import *
+
+#--------------------------------------------------------------------
+class BenchmarkGenerator (GeneratorBase):
+   """
+      Generates a PHP value object class for each table,
+      with a field, getter and setter for every column.
+
+      The output is not meant to be used; the generator
+      exists to measure the cost of the code generation
+      machinery shared by real generators.
+   """
+
+   def generateTable (self, table):
+      """
+         Generates the value object class for the given table.
+      """
+
+      sb = IndentStringBuilder ()
+
+      sb.println ('<?php')
+      sb.newline ()
+      sb.println ('class %s {' % table.getName ())
+
+      with sb:
+         for column in table.getAllColumns ():
+            sb.println ('private $%s; // %s' % (column.getName (), column.getDataType ()))
+
+         for column in table.getAllColumns ():
+            sb.newline ()
+            sb.println ('public function get_%s () {' % column.getName ())
+
+            with sb:
+               sb.println ('return $this->%s;' % column.getName ())
+
+            sb.println ('}')
+            sb.newline ()
+            sb.println ('public function set_%s ($value) {' % column.getName ())
+
+            with sb:
+               sb.println ('$this->%s = $value;' % column.getName ())
+
+            sb.println ('}')
+
+      sb.println ('}')
+
+      return [('%s.php' % table.getName (), str (sb))]
+
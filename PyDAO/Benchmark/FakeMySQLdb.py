@@ -0,0 +1,744 @@
+#
+# FakeMySQLdb
+#
+# An in-process stand-in for a MySQLdb connection, or for a
+# non-blocking connection on an event loop, which serves the
+# information_schema of DatabaseSchema objects.
+#
+# Part of the PyDAO package.
+#
+# (c) 2011 Lee Supe (lain_proliant)
+# Released under the GNU General Public License, version 3.
+#
+
+import datetime
+import heapq
+import itertools
+import re
+import threading
+import time
+
+from PyDAO.PyDAOException import *
+
+#--------------------------------------------------------------------
+class Error (PyDAOException): pass
+class OperationalError (Error): pass
+class ProgrammingError (Error): pass
+class NotSupportedError (Error): pass
+
+#--------------------------------------------------------------------
+# The columns of each of the information_schema tables served.
+INFORMATION_SCHEMA = {
+   'tables': ('table_schema', 'table_name', 'table_type', 'engine',
+         'row_format', 'table_rows', 'create_time', 'update_time',
+         'table_collation', 'create_options'),
+
+   'columns': ('table_schema', 'table_name', 'column_name',
+         'ordinal_position', 'is_nullable', 'data_type', 'column_type',
+         'extra'),
+
+   'statistics': ('table_schema', 'table_name', 'non_unique',
+         'index_schema', 'index_name', 'seq_in_index', 'column_name'),
+
+   'table_constraints': ('constraint_schema', 'constraint_name',
+         'table_schema', 'table_name', 'constraint_type'),
+
+   'key_column_usage': ('constraint_schema', 'constraint_name',
+         'table_schema', 'table_name', 'column_name', 'ordinal_position',
+         'position_in_unique_constraint', 'referenced_table_schema',
+         'referenced_table_name', 'referenced_column_name'),
+
+   'referential_constraints': ('constraint_schema', 'constraint_name',
+         'unique_constraint_schema', 'unique_constraint_name',
+         'update_rule', 'delete_rule', 'table_name',
+         'referenced_table_name')
+   }
+
+# The information_schema names of each constraint type.
+CONSTRAINT_TYPES = {
+   'PRIMARY_KEY': 'PRIMARY KEY',
+   'UNIQUE': 'UNIQUE',
+   'FOREIGN_KEY': 'FOREIGN KEY'
+   }
+
+# The creation time reported for every table.
+CREATE_TIME = datetime.datetime (2011, 1, 1)
+
+#--------------------------------------------------------------------
+def getSchemaColumn (table):
+   """
+      Gets the column of the named information_schema table
+      which holds the name of the database of each row.
+   """
+
+   if 'table_schema' in INFORMATION_SCHEMA [table]:
+      return 'table_schema'
+
+   return 'constraint_schema'
+
+#--------------------------------------------------------------------
+QUERY_PATTERN = re.compile (r"""
+   ^select \s+ (?P<distinct> distinct \s+)? (?P<columns> .+?)
+   \s+ from \s+ information_schema\.(?P<table> \w+)
+   (?: \s+ where \s+ (?P<where> .+?))?
+   (?: \s+ order \s+ by \s+ (?P<order> .+?))?
+   $""", re.IGNORECASE | re.VERBOSE | re.DOTALL)
+
+CONJUNCTION_PATTERN = re.compile (r'\s+and\s+', re.IGNORECASE)
+DISJUNCTION_PATTERN = re.compile (r'\s+or\s+', re.IGNORECASE)
+
+PREDICATE_PATTERN = re.compile (r"""
+   ^(?: lower \s* \( \s* (?P<loweredColumn> \w+) \s* \) | (?P<column> \w+)) \s+
+   (?: (?P<compare> = | != | <> | (?P<notLike> not \s+)? like) \s+ (?P<value> %s | '[^']*')
+   |   (?P<notIn> not \s+)? in \s* \( (?P<values> [^)]*) \)
+   |   is \s+ (?P<notNull> not \s+)? null)$
+   """, re.IGNORECASE | re.VERBOSE)
+
+#--------------------------------------------------------------------
+def compileQuery (sql):
+   """
+      Parses the given SQL text into a (table, columns,
+      distinct, predicates, order) tuple.
+
+      Only the simple queries issued against information_schema
+      are understood: a single table, a list of plain columns,
+      an optional conjunction of comparisons, and an optional
+      list of columns to order by.  Each comparison may be a
+      parenthesized disjunction.
+
+      Each predicate is a list of alternatives, each as
+      returned by compilePredicate ().
+   """
+
+   match = QUERY_PATTERN.match (' '.join (sql.split ()).rstrip (';'))
+
+   if match is None:
+      raise NotSupportedError ('Unsupported query: %s' % sql)
+
+   table = match.group ('table').lower ()
+
+   if table not in INFORMATION_SCHEMA:
+      raise ProgrammingError ("Table 'information_schema.%s' doesn't exist" % table)
+
+   columns = [column.strip ().lower () for column in match.group ('columns').split (',')]
+   predicates = []
+   order = []
+
+   if match.group ('where'):
+      for term in CONJUNCTION_PATTERN.split (match.group ('where')):
+         if term.startswith ('(') and term.endswith (')'):
+            term = term [1:-1]
+
+         predicates.append ([compilePredicate (alternative, sql)
+               for alternative in DISJUNCTION_PATTERN.split (term)])
+
+   if match.group ('order'):
+      for term in match.group ('order').split (','):
+         words = term.split ()
+         order.append ((words [0].lower (), len (words) > 1 and words [1].lower () == 'desc'))
+
+   for column in columns + [column for column, descending in order]:
+      if column not in INFORMATION_SCHEMA [table]:
+         raise OperationalError ("Unknown column '%s' in 'field list'" % column)
+
+   return (table, columns, match.group ('distinct') is not None, predicates, order)
+
+
+def compilePredicate (text, sql):
+   """
+      Compiles a single comparison of a WHERE clause.
+
+      Returns a (parameterCount, bind, column) tuple, where bind
+      takes the comparison's parameters and returns a test of a
+      row dictionary, and column is the name of the column
+      compared if the comparison is for equality with a
+      parameter or membership in a list of parameters, or None.
+
+      The column may be wrapped in lower (), in which case its
+      values are lowered before they are compared, and no
+      column name is returned.
+   """
+
+   match = PREDICATE_PATTERN.match (text.strip ())
+
+   if match is None:
+      raise NotSupportedError ('Unsupported condition "%s" in query: %s' % (text, sql))
+
+   if match.group ('loweredColumn'):
+      loweredColumn = match.group ('loweredColumn').lower ()
+      getValue = lambda row: row [loweredColumn] is not None and row [loweredColumn].lower () or row [loweredColumn]
+      column = None
+
+   else:
+      column = match.group ('column').lower ()
+      getValue = lambda row: row [column]
+
+   if match.group ('compare'):
+      operator = match.group ('compare').lower ()
+      operand = match.group ('value')
+
+      if operator.endswith ('like'):
+         negate = match.group ('notLike') is not None
+         compare = lambda value, pattern: (matchLike (value, pattern) != negate)
+
+      elif operator == '=':
+         compare = lambda value, operand: value == operand
+
+      else:
+         compare = lambda value, operand: value is not None and value != operand
+
+      if operand == '%s':
+         return (1, lambda params: lambda row: compare (getValue (row), params [0]),
+               operator == '=' and column or None)
+
+      operand = operand [1:-1]
+      return (0, lambda params: lambda row: compare (getValue (row), operand), None)
+
+   elif match.group ('values') is not None:
+      operands = [operand.strip () for operand in match.group ('values').split (',')]
+      negate = match.group ('notIn') is not None
+      count = operands.count ('%s')
+
+      def bind (params):
+         params = iter (params)
+         values = frozenset (params.next () if operand == '%s' else operand [1:-1]
+               for operand in operands)
+
+         return lambda row: (getValue (row) in values) != negate
+
+      return (count, bind, not negate and count == len (operands) and column or None)
+
+   else:
+      negate = match.group ('notNull') is not None
+      return (0, lambda params: lambda row: (getValue (row) is None) != negate, None)
+
+
+def matchLike (value, pattern):
+   """
+      Tests the given value against the given LIKE pattern.
+
+      Case is significant, as it is for every comparison made
+      by the fake server: the table names of information_schema
+      have a binary collation on servers which keep the case of
+      table names, such as MySQL 8 on Linux.
+   """
+
+   if value is None:
+      return False
+
+   expression = ''
+   escaped = False
+
+   for character in pattern:
+      if escaped:
+         expression += re.escape (character)
+         escaped = False
+
+      elif character == '\\':
+         escaped = True
+
+      elif character == '%':
+         expression += '.*'
+
+      elif character == '_':
+         expression += '.'
+
+      else:
+         expression += re.escape (character)
+
+   return re.match (expression + '$', value, re.DOTALL) is not None
+
+#--------------------------------------------------------------------
+class FakeServer (object):
+   """
+      Serves the information_schema of one or more
+      DatabaseSchema objects to FakeConnection objects.
+
+      Every query sleeps for the server's latency before it
+      is answered, so that the cost of each round trip to a
+      real server can be simulated.  The server counts the
+      queries and rows served to all of its connections.
+   """
+
+   def __init__ (self, latency = 0.0):
+      """
+         Initializes an empty FakeServer.
+
+         latency:
+            The number of seconds each query takes to answer.
+      """
+
+      self.latency = latency
+
+      # The rows of each information_schema table, as dictionaries.
+      self.rows = dict ((table, []) for table in INFORMATION_SCHEMA)
+
+      # The same rows, in maps of table names to lists of rows,
+      # so that queries about a single table need not scan
+      # every row.  Every information_schema table served has
+      # a table_name column.
+      self.rowsByTableName = dict ((table, {}) for table in INFORMATION_SCHEMA)
+
+      # The same rows, in maps of database names to lists of
+      # rows, so that a server holding many databases need not
+      # scan them all to answer queries about one.
+      self.rowsByDatabaseName = dict ((table, {}) for table in INFORMATION_SCHEMA)
+
+      # A map of SQL text to compiled queries.
+      self.queryCache = {}
+
+      self.lock = threading.Lock ()
+      self.resetCounters ()
+
+
+   def addDatabase (self, schema):
+      """
+         Adds the given DatabaseSchema to the information_schema
+         served, under the schema's name.
+      """
+
+      databaseName = schema.getName ()
+
+      for table in schema.getAllTables ():
+         tableName = table.getName ()
+
+         self.addRow ('tables', table_schema = databaseName,
+               table_name = tableName, table_type = 'BASE TABLE',
+               engine = 'InnoDB', row_format = 'Dynamic', table_rows = 0,
+               create_time = CREATE_TIME, update_time = None,
+               table_collation = 'utf8_general_ci', create_options = '')
+
+         for position, column in enumerate (table.getAllColumns ()):
+            self.addRow ('columns', table_schema = databaseName,
+                  table_name = tableName, column_name = column.getName (),
+                  ordinal_position = position + 1,
+                  is_nullable = column.isNullable () and 'YES' or 'NO',
+                  data_type = column.getDataType (),
+                  column_type = column.getDataType (),
+                  extra = column.getExtra ())
+
+         for index in table.getAllIndexes ():
+            for position, columnName in enumerate (index.getColumns ()):
+               self.addRow ('statistics', table_schema = databaseName,
+                     table_name = tableName,
+                     non_unique = not index.isUnique () and 1 or 0,
+                     index_schema = databaseName,
+                     index_name = index.getName (),
+                     seq_in_index = position + 1,
+                     column_name = columnName)
+
+            if index.getConstraint () is not None:
+               self.addConstraint (databaseName, tableName,
+                     index.getName (), index.getConstraint ())
+
+
+   def addConstraint (self, databaseName, tableName, constraintName, constraint):
+      """
+         Adds the rows describing the given Constraint.
+      """
+
+      constraintType = constraint.getType ()
+      referencedDatabase = None
+      referencedTable = None
+
+      if constraintType == 'FOREIGN_KEY':
+         referencedDatabase = constraint.databaseName or databaseName
+         referencedTable = constraint.tableName
+
+         self.addRow ('referential_constraints',
+               constraint_schema = databaseName,
+               constraint_name = constraintName,
+               unique_constraint_schema = referencedDatabase,
+               unique_constraint_name = 'PRIMARY',
+               update_rule = 'RESTRICT', delete_rule = 'RESTRICT',
+               table_name = tableName,
+               referenced_table_name = referencedTable)
+
+      self.addRow ('table_constraints', constraint_schema = databaseName,
+            constraint_name = constraintName, table_schema = databaseName,
+            table_name = tableName,
+            constraint_type = CONSTRAINT_TYPES [constraintType])
+
+      for position, columnName in enumerate (constraint.getColumns ()):
+         referencedColumn = None
+
+         if constraintType == 'FOREIGN_KEY':
+            referencedColumn = constraint.getMapping (columnName)
+
+         self.addRow ('key_column_usage', constraint_schema = databaseName,
+               constraint_name = constraintName, table_schema = databaseName,
+               table_name = tableName, column_name = columnName,
+               ordinal_position = position + 1,
+               position_in_unique_constraint = referencedTable and position + 1,
+               referenced_table_schema = referencedDatabase,
+               referenced_table_name = referencedTable,
+               referenced_column_name = referencedColumn)
+
+
+   def addRow (self, table, **values):
+      """
+         Adds a row to the named information_schema table.
+      """
+
+      self.rows [table].append (values)
+      self.rowsByTableName [table].setdefault (values ['table_name'], []).append (values)
+      self.rowsByDatabaseName [table].setdefault (values [getSchemaColumn (table)], []).append (values)
+
+
+   def connect (self, **kwargs):
+      """
+         Opens a new FakeConnection to this server.  Any
+         arguments, as for MySQLdb.connect (), are ignored.
+      """
+
+      return FakeConnection (self)
+
+
+   def connectAsync (self, loop):
+      """
+         Opens a new FakeAsyncConnection to this server, whose
+         queries are answered through the given FakeEventLoop.
+      """
+
+      return FakeAsyncConnection (self, loop)
+
+
+   def query (self, sql, params):
+      """
+         Answers the given query after the server's latency,
+         returning a list of row tuples.
+      """
+
+      if self.latency:
+         time.sleep (self.latency)
+
+      return self.answer (sql, params)
+
+
+   def answer (self, sql, params):
+      """
+         Answers the given query at once, returning a list
+         of row tuples.
+      """
+
+      query = self.queryCache.get (sql)
+
+      if query is None:
+         query = self.queryCache [sql] = compileQuery (sql)
+
+      table, columns, distinct, predicates, order = query
+      params = list (params or ())
+
+      candidates = self.rows [table]
+      alternatives = []
+
+      for predicate in predicates:
+         tests = []
+
+         for count, bind, column in predicate:
+            if count > len (params):
+               raise ProgrammingError ('Not enough parameters for the query: %s' % sql)
+
+            if column == 'table_name' and len (predicate) == 1:
+               candidates = [row for tableName in set (params [:count])
+                     for row in self.rowsByTableName [table].get (tableName, ())]
+
+            elif column == getSchemaColumn (table) and len (predicate) == 1 and \
+                  candidates is self.rows [table]:
+               candidates = self.rowsByDatabaseName [table].get (params [0], [])
+
+            tests.append (bind (params [:count]))
+            del params [:count]
+
+         alternatives.append (tests)
+
+      if params:
+         raise ProgrammingError ('Not all parameters were used in the query: %s' % sql)
+
+      rows = [row for row in candidates
+            if all (any (test (row) for test in tests)
+                  for tests in alternatives)]
+
+      for column, descending in reversed (order):
+         rows.sort (key = lambda row: row [column], reverse = descending)
+
+      results = [tuple (row [column] for column in columns) for row in rows]
+
+      if distinct:
+         seen = set ()
+         results = [row for row in results if not (row in seen or seen.add (row))]
+
+      with self.lock:
+         self.queryCount += 1
+         self.rowCount += len (results)
+
+      return results
+
+
+   def resetCounters (self):
+      """
+         Resets the query and row counts to zero.
+      """
+
+      with self.lock:
+         self.queryCount = 0
+         self.rowCount = 0
+         self.connectionCount = 0
+
+
+   def getQueryCount (self):
+      """
+         Gets the number of queries answered, i.e. the number
+         of round trips made to the server.
+      """
+
+      return self.queryCount
+
+
+   def getRowCount (self):
+      """
+         Gets the total number of rows returned.
+      """
+
+      return self.rowCount
+
+
+   def getConnectionCount (self):
+      """
+         Gets the number of connections opened.
+      """
+
+      return self.connectionCount
+
+#--------------------------------------------------------------------
+class FakeConnection (object):
+   """
+      A connection to a FakeServer, providing the parts of
+      the MySQLdb connection interface used by PyDAO.
+   """
+
+   def __init__ (self, server):
+      """
+         Initializes a FakeConnection.
+      """
+
+      self.server = server
+      self.closed = False
+
+      with server.lock:
+         server.connectionCount += 1
+
+
+   def cursor (self, cursorClass = None):
+      """
+         Opens a new cursor.  The cursor class is ignored.
+      """
+
+      if self.closed:
+         raise ProgrammingError ('The connection has been closed.')
+
+      return FakeCursor (self)
+
+
+   def commit (self):
+      pass
+
+
+   def rollback (self):
+      pass
+
+
+   def close (self):
+      self.closed = True
+
+#--------------------------------------------------------------------
+class FakeCursor (object):
+   """
+      A cursor of a FakeConnection, providing the parts of
+      the MySQLdb cursor interface used by PyDAO.
+   """
+
+   def __init__ (self, connection):
+      """
+         Initializes a FakeCursor.
+      """
+
+      self.connection = connection
+      self.results = []
+      self.position = 0
+      self.rowcount = -1
+
+
+   def execute (self, sql, params = None):
+      """
+         Runs the given query against the server.
+      """
+
+      if self.connection.closed:
+         raise ProgrammingError ('The connection has been closed.')
+
+      self.results = self.connection.server.query (sql, params)
+      self.position = 0
+      self.rowcount = len (self.results)
+
+      return self.rowcount
+
+
+   def fetchone (self):
+      """
+         Fetches the next row, or None if there are no more.
+      """
+
+      if self.position >= len (self.results):
+         return None
+
+      self.position += 1
+      return self.results [self.position - 1]
+
+
+   def fetchmany (self, size = 1):
+      """
+         Fetches up to the given number of rows.
+      """
+
+      rows = self.results [self.position:self.position + size]
+      self.position += len (rows)
+
+      return tuple (rows)
+
+
+   def fetchall (self):
+      """
+         Fetches all of the remaining rows.
+      """
+
+      rows = self.results [self.position:]
+      self.position = len (self.results)
+
+      return tuple (rows)
+
+
+   def __iter__ (self):
+      return iter (self.fetchone, None)
+
+
+   def close (self):
+      self.results = []
+      self.position = 0
+
+#--------------------------------------------------------------------
+class FakeAsyncConnection (object):
+   """
+      A non-blocking connection to a FakeServer, providing the
+      interface expected by AsyncMySQLSchematizer.
+
+      Each query is answered by calling its callback from the
+      event loop once the server's latency has passed, without
+      blocking the loop in the meantime.  As over a real MySQL
+      connection, only one query may be in flight at a time.
+   """
+
+   def __init__ (self, server, loop):
+      """
+         Initializes a FakeAsyncConnection.
+      """
+
+      self.server = server
+      self.loop = loop
+      self.closed = False
+      self.busy = False
+
+      with server.lock:
+         server.connectionCount += 1
+
+
+   def query (self, sql, params, callback):
+      """
+         Starts the given query, calling callback (rows, error)
+         from the event loop when it completes.
+      """
+
+      if self.closed:
+         raise ProgrammingError ('The connection has been closed.')
+
+      if self.busy:
+         raise ProgrammingError ("Commands out of sync; you can't run this command now")
+
+      self.busy = True
+
+      try:
+         rows, error = self.server.answer (sql, params), None
+
+      except Error, excVal:
+         rows, error = None, excVal
+
+      self.loop.callLater (self.server.latency, self.complete, callback, rows, error)
+
+
+   def complete (self, callback, rows, error):
+      """
+         Delivers the result of the query in flight.
+      """
+
+      self.busy = False
+      callback (rows, error)
+
+
+   def close (self):
+      self.closed = True
+
+#--------------------------------------------------------------------
+class FakeEventLoop (object):
+   """
+      A minimal single-threaded event loop which runs scheduled
+      calls in order of their due times, sleeping while none
+      is due.
+   """
+
+   def __init__ (self):
+      """
+         Initializes a FakeEventLoop with nothing scheduled.
+      """
+
+      # A heap of (dueTime, sequence, function, args) tuples.
+      self.calls = []
+      self.sequence = itertools.count ()
+      self.running = False
+
+
+   def callLater (self, delay, function, *args):
+      """
+         Schedules function (*args) to be called after the
+         given number of seconds.
+      """
+
+      heapq.heappush (self.calls, (time.time () + delay,
+            self.sequence.next (), function, args))
+
+
+   def run (self):
+      """
+         Runs the scheduled calls until stop () is called or
+         there are none left.
+      """
+
+      self.running = True
+
+      while self.running and self.calls:
+         delay = self.calls [0][0] - time.time ()
+
+         if delay > 0:
+            time.sleep (delay)
+
+         dueTime, sequence, function, args = heapq.heappop (self.calls)
+         function (*args)
+
+      self.running = False
+
+
+   def stop (self):
+      """
+         Stops the loop once the current call returns.
+      """
+
+      self.running = False
@@ -0,0 +1,100 @@
+#
+# SyntheticSchema
+#
+# Builds synthetic DatabaseSchema objects of any size,
+# for use in benchmarks.
+#
+# Part of the PyDAO package.
+#
+# (c) 2011 Lee Supe (lain_proliant)
+# Released under the GNU General Public License, version 3.
+#
+
+from PyDAO.Schema import *
+
+#--------------------------------------------------------------------
+DATATYPES = ['int', 'bigint', 'varchar', 'datetime', 'decimal', 'text']
+EXTRAS = ['', '', '', 'on update CURRENT_TIMESTAMP']
+
+#--------------------------------------------------------------------
+def buildSyntheticSchema (tableCount, columnCount, indexCount,
+      databaseName = 'benchmark', foreignKeys = False):
+   """
+      Builds a synthetic DatabaseSchema with the given number
+      of tables, each with the given number of columns and
+      indexes.  The same arguments always build the same schema.
+
+      Every table has an auto-increment primary key on its
+      first column, named `id`.  The remaining columns cycle
+      through a few common data types.  The remaining indexes
+      are single-column indexes over the other columns, every
+      third of which is unique.
+
+      If foreignKeys is True, the first secondary index of each
+      table but the first is a foreign key on the table's
+      `parent_id` column referencing the previous table.
+   """
+
+   if columnCount < 2 and (indexCount > 1 or foreignKeys):
+      raise SchemaException ('Secondary indexes need at least 2 columns per table.')
+
+   schema = DatabaseSchema (databaseName)
+
+   for t in xrange (tableCount):
+      table = TableSchema (getSyntheticTableName (t))
+      table.addColumn (ColumnSchema ('id', 'bigint', 'NO', 'auto_increment'))
+
+      for c in xrange (1, columnCount):
+         if c == 1 and foreignKeys:
+            table.addColumn (ColumnSchema ('parent_id', 'bigint', 'YES', ''))
+
+         else:
+            table.addColumn (ColumnSchema ('column_%d' % c,
+                  DATATYPES [c % len (DATATYPES)],
+                  'YES' if c % 2 else 'NO',
+                  EXTRAS [c % len (EXTRAS)]))
+
+      columnNames = table.getColumnNames ()
+
+      primaryKey = IndexSchema ('PRIMARY', 0)
+      primaryKey.addColumn ('id')
+      primaryKey.setConstraint (PrimaryKeyConstraint ())
+      primaryKey.getConstraint ().addColumn ('id')
+      table.addIndex (primaryKey)
+
+      for i in xrange (1, indexCount):
+         columnName = columnNames [1 + (i - 1) % (columnCount - 1)]
+
+         if i == 1 and foreignKeys and t > 0:
+            index = IndexSchema ('fk_%s_parent' % table.getName (), 1)
+            index.addColumn (columnName)
+
+            constraint = ForeignKeyConstraint (getSyntheticTableName (t - 1))
+            constraint.addColumn (columnName)
+            constraint.mapColumn (columnName, 'id')
+            index.setConstraint (constraint)
+
+         elif i % 3 == 0:
+            index = IndexSchema ('unique_%d' % i, 0)
+            index.addColumn (columnName)
+            index.setConstraint (UniqueConstraint ())
+            index.getConstraint ().addColumn (columnName)
+
+         else:
+            index = IndexSchema ('index_%d' % i, 1)
+            index.addColumn (columnName)
+
+         table.addIndex (index)
+
+      schema.addTable (table)
+
+   return schema
+
+
+def getSyntheticTableName (tableNumber):
+   """
+      Gets the name of the given table of a synthetic schema.
+   """
+
+   return 'table_%05d' % tableNumber
+
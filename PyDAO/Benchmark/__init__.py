@@ -0,0 +1,3 @@
+from SyntheticSchema import *
+from FakeMySQLdb import *
+from BenchmarkGenerator import *
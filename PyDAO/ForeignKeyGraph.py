@@ -0,0 +1,260 @@
+#
+# ForeignKeyGraph
+#
+# An index of the foreign keys between the tables of a
+# DatabaseSchema.
+#
+# Part of the PyDAO package.
+#
+# (c) 2011 Lee Supe (lain_proliant)
+# Released under the GNU General Public License, version 3.
+#
+
+#--------------------------------------------------------------------
+class ForeignKeyGraph (object):
+   """
+      The graph of foreign keys between the tables of a
+      DatabaseSchema, with an edge from each table to each
+      table which it references.
+
+      The graph is built in a single pass over the indexes of
+      the schema, after which the tables referenced by or
+      referencing any table can be found without scanning the
+      schema.  Foreign keys into other databases, or into tables
+      missing from the schema, are not part of the graph; see
+      getUnresolvedForeignKeys ().
+
+      Use DatabaseSchema.getForeignKeyGraph () to obtain the
+      graph of a schema, rather than building one directly.
+   """
+
+   def __init__ (self, schema):
+      """
+         Builds the ForeignKeyGraph of the given DatabaseSchema.
+      """
+
+      # The names of the tables, in schema order.
+      self.tableNames = schema.getTableNames ()
+
+      # Maps of table names to lists of (tableName, indexName,
+      # referencedTableName) edges out of and into each table.
+      self.forward = dict ((tableName, []) for tableName in self.tableNames)
+      self.reverse = dict ((tableName, []) for tableName in self.tableNames)
+
+      # Edges to tables outside of the schema.
+      self.unresolved = []
+
+      # The strongly connected components, computed on demand.
+      self.components = None
+
+      for table in schema.getAllTables ():
+         for index in table.getAllIndexes ():
+            constraint = index.getConstraint ()
+
+            if constraint is None or constraint.getType () != 'FOREIGN_KEY':
+               continue
+
+            edge = (table.getName (), index.getName (), constraint.tableName)
+
+            if (constraint.databaseName not in (None, schema.getName ()) or
+                  constraint.tableName not in self.forward):
+               self.unresolved.append (edge)
+
+            else:
+               self.forward [table.getName ()].append (edge)
+               self.reverse [constraint.tableName].append (edge)
+
+
+   def hasTable (self, tableName):
+      """
+         Gets whether the graph contains the named table.
+      """
+
+      return tableName in self.forward
+
+
+   def getForeignKeys (self, tableName):
+      """
+         Gets the foreign keys of the named table, as a list of
+         (tableName, indexName, referencedTableName) tuples.
+      """
+
+      return list (self.forward.get (tableName, ()))
+
+
+   def getIncomingForeignKeys (self, tableName):
+      """
+         Gets the foreign keys of other tables which reference
+         the named table, as a list of (tableName, indexName,
+         referencedTableName) tuples.
+      """
+
+      return list (self.reverse.get (tableName, ()))
+
+
+   def getReferencedTables (self, tableName):
+      """
+         Gets the names of the tables which the named table
+         references, in order, each named once.
+      """
+
+      return uniqueNames (edge [2] for edge in self.forward.get (tableName, ()))
+
+
+   def getReferencingTables (self, tableName):
+      """
+         Gets the names of the tables which reference the
+         named table, in order, each named once.
+      """
+
+      return uniqueNames (edge [0] for edge in self.reverse.get (tableName, ()))
+
+
+   def getUnresolvedForeignKeys (self):
+      """
+         Gets the foreign keys which reference a table in
+         another database or a table missing from the schema,
+         as (tableName, indexName, referencedTableName) tuples.
+      """
+
+      return list (self.unresolved)
+
+
+   def getStronglyConnectedComponents (self):
+      """
+         Gets the strongly connected components of the graph: a
+         list of lists of table names, such that the tables in
+         each list reference each other, directly or indirectly.
+
+         Each table is in exactly one component.  The components
+         are in dependency order: no component references a
+         component which follows it.
+      """
+
+      if self.components is None:
+         self.components = self.findComponents ()
+
+      return [list (component) for component in self.components]
+
+
+   def getCycles (self):
+      """
+         Gets the components of the graph which contain a cycle
+         of foreign keys: those with more than one table, and
+         tables which reference themselves.
+      """
+
+      return [component for component in self.getStronglyConnectedComponents ()
+            if len (component) > 1 or component [0] in self.getReferencedTables (component [0])]
+
+
+   def isAcyclic (self):
+      """
+         Gets whether the graph has no cycles of foreign keys.
+      """
+
+      return not self.getCycles ()
+
+
+   def getTopologicalOrder (self):
+      """
+         Gets the names of all of the tables, ordered so that
+         each table comes after the tables which it references,
+         e.g. the order in which to create the tables or to
+         insert rows into them.
+
+         The tables of each cycle are kept together, but cannot
+         themselves be ordered; see getCycles ().
+      """
+
+      return [tableName for component in self.getStronglyConnectedComponents ()
+            for tableName in component]
+
+
+   def findComponents (self):
+      """
+         Finds the strongly connected components of the graph,
+         using an iterative form of Tarjan's algorithm so that
+         long chains of foreign keys cannot exhaust the stack.
+
+         Tarjan's algorithm completes each component only after
+         every component reachable from it, so the components
+         are found in dependency order.
+      """
+
+      # The order in which each table was first visited, and the
+      # lowest such order reachable from it through the tables
+      # on the stack.
+      visitOrder = {}
+      lowLink = {}
+
+      stack = []
+      onStack = set ()
+      components = []
+
+      positions = dict ((tableName, position)
+            for position, tableName in enumerate (self.tableNames))
+
+      for root in self.tableNames:
+         if root in visitOrder:
+            continue
+
+         # The tables being visited, each with an iterator over
+         # the tables it references.
+         path = [(root, iter (self.getReferencedTables (root)))]
+         visitOrder [root] = lowLink [root] = len (visitOrder)
+         stack.append (root)
+         onStack.add (root)
+
+         while path:
+            tableName, referenced = path [-1]
+            descended = False
+
+            for target in referenced:
+               if target not in visitOrder:
+                  visitOrder [target] = lowLink [target] = len (visitOrder)
+                  stack.append (target)
+                  onStack.add (target)
+                  path.append ((target, iter (self.getReferencedTables (target))))
+                  descended = True
+                  break
+
+               elif target in onStack:
+                  lowLink [tableName] = min (lowLink [tableName], visitOrder [target])
+
+            if descended:
+               continue
+
+            path.pop ()
+
+            if path:
+               parent = path [-1][0]
+               lowLink [parent] = min (lowLink [parent], lowLink [tableName])
+
+            if lowLink [tableName] == visitOrder [tableName]:
+               component = []
+
+               while True:
+                  member = stack.pop ()
+                  onStack.discard (member)
+                  component.append (member)
+
+                  if member == tableName:
+                     break
+
+               # Keep the tables of a component in schema order.
+               component.sort (key = positions.get)
+               components.append (component)
+
+      return components
+
+#--------------------------------------------------------------------
+def uniqueNames (names):
+   """
+      Gets a list of the given names without repetitions,
+      keeping the first occurrence of each.
+   """
+
+   seen = set ()
+   return [name for name in names if not (name in seen or seen.add (name))]
+
@@ -7,8 +7,13 @@
 # Released under the GNU General Public License, version 3.
 #
 
+import os
 from abc import ABCMeta, abstractmethod
 
+from GeneratorException import *
+from IndexLinter import *
+from OutputManifest import *
+
 class GeneratorBase (object):
    """
       Abstract base class for Generators.
@@ -20,15 +25,231 @@ class GeneratorBase (object):
 
       Generators also accept a Mapping object, which is used
       to customize the code generation process.
+
+      Generated files are written to an output directory
+      along with an OutputManifest recording their hashes.
+      Files whose contents have not changed since the last
+      run are not rewritten, so their modification times
+      are preserved.
+
+      Generators which describe their queries with
+      getQueryShapes () can have them checked against the
+      indexes of the schema by an IndexLinter; in strict mode,
+      nothing is generated unless every query can use an index.
    """
-   
+
    __metaclass__ = ABCMeta
-   
-   def __init__ (self, schema, mapping):
+
+   def __init__ (self, schema, mapping, outputDir = '.'):
       """
          Initializes the abstract portions of a Generator.
+
+         schema:
+            The DatabaseSchema to generate code for.
+
+         mapping:
+            The Mapping object used to customize the code
+            generation process, or None.
+
+         outputDir:
+            The directory in which to write generated files.
+      """
+
+      self.schema = schema
+      self.mapping = mapping
+      self.outputDir = outputDir
+
+      # A list of (filename, source) pairs not yet written.
+      self.pendingOutput = []
+
+      # The set of filenames in pendingOutput, for fast lookups.
+      self.pendingFilenames = set ()
+
+      # Whether generate () refuses queries which cannot use
+      # an index; see checkIndexes ().
+      self.strictIndexes = False
+
+
+   def getSchema (self):
+      """
+         Gets the DatabaseSchema to generate code for.
+      """
+
+      return self.schema
+
+
+   def getMapping (self):
+      """
+         Gets the Mapping object used to customize code generation.
+      """
+
+      return self.mapping
+
+
+   def getOutputDir (self):
+      """
+         Gets the directory in which generated files are written.
+      """
+
+      return self.outputDir
+
+
+   def isStrictIndexes (self):
+      """
+         Gets whether generate () refuses queries which
+         cannot use an index.
+      """
+
+      return self.strictIndexes
+
+
+   def setStrictIndexes (self, strictIndexes):
+      """
+         Sets whether generate () refuses queries which
+         cannot use an index.
       """
 
-      
+      self.strictIndexes = strictIndexes
+
+
+   @abstractmethod
+   def generateTable (self, table):
+      """
+         Generates source code for the given TableSchema.
+
+         Returns a list of (filename, source) pairs, where each
+         filename is relative to the output directory.
+
+         This method is abstract and must be implemented
+         by subclasses.
+      """
+
+      pass
+
+
+   def generateCommon (self):
+      """
+         Generates source code shared by all of the tables,
+         such as support classes used by the generated code.
+
+         Returns a list of (filename, source) pairs, as for
+         generateTable ().  There are none by default.
+      """
+
+      return []
+
+
+   def getQueryShapes (self, table):
+      """
+         Gets a QueryShape for each query generated for the
+         given TableSchema, to be checked by lintIndexes ().
+         There are none by default.
+      """
+
+      return []
+
+
+   def lintIndexes (self):
+      """
+         Checks the queries generated for every table in the
+         schema against the indexes of their tables, returning
+         an IndexLintReport of those which cannot use an index.
+      """
+
+      return IndexLinter (self.schema).lint (query
+            for table in self.schema.getAllTables ()
+            for query in self.getQueryShapes (table))
+
+
+   def checkIndexes (self):
+      """
+         In strict mode, raises an IndexLintException describing
+         the queries which cannot use an index, if there are any.
+      """
+
+      if self.strictIndexes:
+         report = self.lintIndexes ()
+
+         if not report.isEmpty ():
+            raise IndexLintException (str (report))
+
+
+   def generate (self):
+      """
+         Generates source code for every table in the schema
+         and writes it to the output directory.
+
+         Returns the list of filenames which were written.
+      """
+
+      self.checkIndexes ()
+
+      for filename, source in self.generateCommon ():
+         self.addOutput (filename, source)
+
+      for table in self.schema.getAllTables ():
+         for filename, source in self.generateTable (table):
+            self.addOutput (filename, source)
+
+      return self.writeOutput ()
+
+
+   def addOutput (self, filename, source):
+      """
+         Queues the given source to be written to the given
+         file, relative to the output directory, by the next
+         call to writeOutput ().
+      """
+
+      if filename in self.pendingFilenames:
+         raise GeneratorException ('The output file "%s" was generated more than once.' % filename)
+
+      self.pendingOutput.append ((filename, source))
+      self.pendingFilenames.add (filename)
+
+
+   def writeOutput (self):
+      """
+         Writes all of the queued output in one pass, then
+         updates the manifest.
+
+         Each file whose contents are unchanged is skipped
+         without being touched.  Each changed file is written
+         to a temporary file which then replaces it, so that
+         no file is ever left partially written.  Files from
+         previous runs which were not generated this time are
+         dropped from the manifest, but not deleted.
+
+         Returns the list of filenames which were written.
+      """
+
+      if not os.path.isdir (self.outputDir):
+         os.makedirs (self.outputDir)
+
+      manifest = OutputManifest (self.outputDir)
+      written = []
+
+      for filename, source in self.pendingOutput:
+         digest = hashContent (source)
+
+         if manifest.isCurrent (filename, digest):
+            continue
+
+         path = manifest.getPath (filename)
+         directory = os.path.dirname (path)
+
+         if directory and not os.path.isdir (directory):
+            os.makedirs (directory)
+
+         writeFileAtomically (path, source)
+         manifest.record (filename, digest)
+         written.append (filename)
+
+      manifest.retain (self.pendingFilenames)
+      manifest.save ()
+
+      self.pendingOutput = []
+      self.pendingFilenames = set ()
 
+      return written
 
@@ -0,0 +1,1413 @@
+#
+# MySQLi Generator
+#
+# Generates PHP value object and data access object classes
+# which use the mysqli extension and prepared statements.
+#
+# Part of the PyDAO package.
+#
+# (c) 2011 Lee Supe (lain_proliant)
+# Released under the GNU General Public License, version 3.
+#
+
+import re
+
+from PyDAO.GeneratorBase import *
+from PyDAO.IndentWriter import *
+
+#--------------------------------------------------------------------
+# The mysqli bind_param type of each MySQL data type.  Other
+# types, including decimal, which would lose precision as a
+# PHP float, are bound as strings.
+BIND_TYPES = {
+   'tinyint': 'i',
+   'smallint': 'i',
+   'mediumint': 'i',
+   'int': 'i',
+   'integer': 'i',
+   'bigint': 'i',
+   'year': 'i',
+   'float': 'd',
+   'double': 'd',
+   'real': 'd'
+   }
+
+# Names which PHP or the generated methods use for their own
+# variables, and which columns therefore may not be given.
+RESERVED_VARIABLES = set (['this', 'stmt', 'vo', 'results', 'limit', 'after'])
+
+# The most rows read or written by one batch statement.
+MAX_BATCH_ROWS = 1024
+
+# The most parameters MySQL allows in one prepared statement.
+MAX_PARAMETERS = 65535
+
+# The name of the file holding the support classes shared by
+# all of the generated DAOs.
+RUNTIME_FILENAME = 'PyDAOMySQLi.php'
+
+RUNTIME_SOURCE = """<?php
+/*
+ * Support classes for the DAOs generated by PyDAO's MySQLiGenerator.
+ *
+ * Generated by PyDAO.  Do not edit.
+ */
+
+class PyDAOException extends Exception {
+}
+
+/*
+ * The prepared statements of each mysqli connection, by SQL text.
+ *
+ * Each statement is prepared on the first call to prepare () with
+ * its SQL text for a connection, and the same mysqli_stmt handle is
+ * returned by every later call, so a statement is parsed and planned
+ * by the server only once per connection.  Release a connection's
+ * statements with release () before closing it.
+ */
+class PyDAOStatementCache {
+   /* Statement handles by connection key and SQL text. */
+   private static $statements = array ();
+
+   /* The max_allowed_packet of each connection, by key. */
+   private static $maxAllowedPackets = array ();
+
+   /*
+    * The connections by key, which keeps each connection alive,
+    * and so its key unique, while anything about it is cached.
+    */
+   private static $connections = array ();
+
+   public static function prepare (mysqli $db, $sql) {
+      $key = spl_object_hash ($db);
+
+      if (isset (self::$statements [$key][$sql])) {
+         return self::$statements [$key][$sql];
+      }
+
+      $stmt = $db->prepare ($sql);
+
+      if ($stmt === false) {
+         throw new PyDAOException ('Could not prepare statement: ' . $db->error);
+      }
+
+      self::$connections [$key] = $db;
+      self::$statements [$key][$sql] = $stmt;
+
+      return $stmt;
+   }
+
+   /*
+    * Gets the largest packet the server accepts from the connection,
+    * which bounds the size of a single statement and its parameters.
+    * The server is asked once per connection.
+    */
+   public static function getMaxAllowedPacket (mysqli $db) {
+      $key = spl_object_hash ($db);
+
+      if (!isset (self::$maxAllowedPackets [$key])) {
+         $result = $db->query ('select @@max_allowed_packet');
+
+         if ($result === false) {
+            throw new PyDAOException ('Could not read max_allowed_packet: ' . $db->error);
+         }
+
+         $row = $result->fetch_row ();
+         $result->free ();
+
+         self::$connections [$key] = $db;
+         self::$maxAllowedPackets [$key] = (int) $row [0];
+      }
+
+      return self::$maxAllowedPackets [$key];
+   }
+
+   public static function release (mysqli $db) {
+      $key = spl_object_hash ($db);
+
+      if (isset (self::$statements [$key])) {
+         foreach (self::$statements [$key] as $stmt) {
+            $stmt->close ();
+         }
+      }
+
+      unset (self::$statements [$key]);
+      unset (self::$maxAllowedPackets [$key]);
+      unset (self::$connections [$key]);
+   }
+
+   public static function getStatementCount (mysqli $db) {
+      $key = spl_object_hash ($db);
+      return isset (self::$statements [$key]) ? count (self::$statements [$key]) : 0;
+   }
+}
+
+/*
+ * The base class of the generated DAOs.
+ */
+abstract class PyDAOMySQLiDAO {
+   /* Room left in each packet for the protocol's own overhead. */
+   const PACKET_MARGIN = 1024;
+
+   protected $db;
+
+   public function __construct (mysqli $db) {
+      $this->db = $db;
+   }
+
+   public function getConnection () {
+      return $this->db;
+   }
+
+   protected function prepare ($sql) {
+      return PyDAOStatementCache::prepare ($this->db, $sql);
+   }
+
+   protected function execute (mysqli_stmt $stmt) {
+      if (!$stmt->execute ()) {
+         throw new PyDAOException ('Could not execute statement: ' . $stmt->error);
+      }
+   }
+
+   /* Reads the rows of an executed select into an array of VOs. */
+   abstract protected function fetch (mysqli_stmt $stmt);
+
+   /* Builds a VO from an array of the values of a row, in order. */
+   abstract public function fromRow (array $row);
+
+   /*
+    * Binds the given values to the parameters of the statement.
+    */
+   protected function bindValues (mysqli_stmt $stmt, $types, array $values) {
+      if ($types === '') {
+         return;
+      }
+
+      $params = array ($types);
+
+      foreach (array_keys ($values) as $i) {
+         $params [] = &$values [$i];
+      }
+
+      if (!call_user_func_array (array ($stmt, 'bind_param'), $params)) {
+         throw new PyDAOException ('Could not bind parameters: ' . $stmt->error);
+      }
+   }
+
+   /*
+    * Prepares the statement made of the prefix, the given number of
+    * copies of the item joined by the separator, and the suffix, as
+    * built by BatchStatement.getSQL () in the generator.
+    *
+    * Batch statements only ever have a power of two rows, so that a
+    * few statements of each kind are prepared and cached, by their
+    * SQL, and then reused by every batch.
+    */
+   protected function prepareBatch ($prefix, $item, $separator, $suffix, $count) {
+      return $this->prepare ($prefix . implode ($separator, array_fill (0, $count, $item)) . $suffix);
+   }
+
+   /*
+    * Estimates the bytes which the given row of parameters adds
+    * to the packet executing a prepared statement.
+    */
+   protected function estimateRowSize (array $row) {
+      $size = 0;
+
+      foreach ($row as $value) {
+         if ($value === null) {
+            $size += 2;
+         } else if (is_int ($value) || is_float ($value)) {
+            $size += 10;
+         } else {
+            $size += 11 + strlen ($value);
+         }
+      }
+
+      return $size;
+   }
+
+   /*
+    * Inserts the given rows, each an array of values, with multi-row
+    * inserts of a power of two rows each, at most $maxRows, as many
+    * as fit in the server's max_allowed_packet.  Returns the number
+    * of rows.
+    */
+   protected function insertRows ($prefix, $item, $types, $maxRows, array $rows) {
+      $rows = array_values ($rows);
+      $count = count ($rows);
+
+      if ($count == 0) {
+         return 0;
+      }
+
+      $budget = PyDAOStatementCache::getMaxAllowedPacket ($this->db) - self::PACKET_MARGIN;
+      $offset = 0;
+
+      while ($offset < $count) {
+         $size = 0;
+         $fit = 0;
+
+         while ($fit < $maxRows && $offset + $fit < $count) {
+            $size += $this->estimateRowSize ($rows [$offset + $fit]);
+
+            if ($fit > 0 && $size > $budget) {
+               break;
+            }
+
+            $fit++;
+         }
+
+         $chunk = 1;
+
+         while ($chunk * 2 <= $fit) {
+            $chunk *= 2;
+         }
+
+         $values = array ();
+
+         for ($i = $offset; $i < $offset + $chunk; $i++) {
+            foreach ($rows [$i] as $value) {
+               $values [] = $value;
+            }
+         }
+
+         $stmt = $this->prepareBatch ($prefix, $item, ', ', '', $chunk);
+         $this->bindValues ($stmt, str_repeat ($types, $chunk), $values);
+         $this->execute ($stmt);
+
+         $offset += $chunk;
+      }
+
+      return $count;
+   }
+
+   /*
+    * Selects the rows with the given keys, each a value or, for keys
+    * of several columns, an array of values, with batch statements
+    * of a power of two keys each, at most $maxRows.  The last key of
+    * a partial batch is repeated to fill it, which does not change
+    * its result.
+    */
+   protected function selectByKeys ($prefix, $item, $separator, $suffix, $types, $maxRows, array $keys) {
+      $keys = array_values ($keys);
+      $results = array ();
+
+      for ($offset = 0; $offset < count ($keys); $offset += $maxRows) {
+         $chunkKeys = array_slice ($keys, $offset, $maxRows);
+         $chunk = 1;
+
+         while ($chunk < count ($chunkKeys)) {
+            $chunk *= 2;
+         }
+
+         $values = array ();
+
+         for ($i = 0; $i < $chunk; $i++) {
+            $key = $chunkKeys [min ($i, count ($chunkKeys) - 1)];
+
+            foreach ((array) $key as $value) {
+               $values [] = $value;
+            }
+         }
+
+         $stmt = $this->prepareBatch ($prefix, $item, $separator, $suffix, $chunk);
+         $this->bindValues ($stmt, str_repeat ($types, $chunk), $values);
+         $this->execute ($stmt);
+
+         foreach ($this->fetch ($stmt) as $vo) {
+            $results [] = $vo;
+         }
+      }
+
+      return $results;
+   }
+}
+
+/*
+ * Iterates over the rows of an executed statement as VOs, reading
+ * each row from the server only when it is needed, so that results
+ * of any size are read in constant memory.
+ *
+ * The result is unbuffered: until the last row has been read or
+ * the iterator closed, no other statement may be executed on the
+ * connection, and the iterator cannot be rewound.
+ */
+class PyDAOResultIterator implements Iterator {
+   private $stmt;
+   private $dao;
+
+   /* The values of the current row, bound to the statement. */
+   private $row;
+
+   private $vo = null;
+   private $position = null;
+
+   public function __construct (mysqli_stmt $stmt, PyDAOMySQLiDAO $dao) {
+      $this->stmt = $stmt;
+      $this->dao = $dao;
+      $this->row = array_fill (0, $stmt->field_count, null);
+
+      $refs = array ();
+
+      foreach (array_keys ($this->row) as $i) {
+         $refs [] = &$this->row [$i];
+      }
+
+      if (!call_user_func_array (array ($stmt, 'bind_result'), $refs)) {
+         throw new PyDAOException ('Could not bind results: ' . $stmt->error);
+      }
+   }
+
+   public function rewind () {
+      if ($this->position !== null) {
+         throw new PyDAOException ('An unbuffered result cannot be rewound.');
+      }
+
+      $this->position = -1;
+      $this->next ();
+   }
+
+   public function valid () {
+      return $this->vo !== null;
+   }
+
+   public function current () {
+      return $this->vo;
+   }
+
+   public function key () {
+      return $this->position;
+   }
+
+   public function next () {
+      $this->vo = null;
+
+      if ($this->stmt === null) {
+         return;
+      }
+
+      $status = $this->stmt->fetch ();
+
+      if ($status === true) {
+         $this->position++;
+         $this->vo = $this->dao->fromRow ($this->row);
+         return;
+      }
+
+      $error = $this->stmt->error;
+      $this->close ();
+
+      if ($status === false) {
+         throw new PyDAOException ('Could not fetch row: ' . $error);
+      }
+   }
+
+   /*
+    * Discards the rest of the result, freeing the connection.
+    */
+   public function close () {
+      if ($this->stmt !== null) {
+         $this->stmt->free_result ();
+         $this->stmt = null;
+      }
+   }
+
+   public function __destruct () {
+      $this->close ();
+   }
+}
+"""
+
+#--------------------------------------------------------------------
+def getBindType (column):
+   """
+      Gets the mysqli bind_param type of the given column.
+   """
+
+   return BIND_TYPES.get (column.getDataType ().lower (), 's')
+
+
+def splitWords (name):
+   """
+      Splits the given name into words at underscores, other
+      characters not allowed in PHP identifiers, and the
+      boundaries of camel case.
+   """
+
+   name = re.sub (r'([a-z0-9])([A-Z])', r'\1_\2', name)
+   return [word for word in re.split (r'[^A-Za-z0-9]+', name) if word]
+
+
+def toClassName (name):
+   """
+      Gets the PHP class name for the given table name,
+      e.g. UserAccount for user_account.
+   """
+
+   words = [word [0].upper () + word [1:].lower () for word in splitWords (name)]
+   className = ''.join (words) or 'Table'
+
+   if className [0].isdigit ():
+      className = 'T' + className
+
+   return className
+
+
+def toVariableName (name):
+   """
+      Gets the PHP variable and property name for the given
+      column name, e.g. userId for user_id.
+   """
+
+   variableName = toClassName (name)
+   variableName = variableName [0].lower () + variableName [1:]
+
+   if variableName in RESERVED_VARIABLES:
+      variableName += '_'
+
+   return variableName
+
+
+def toAccessorSuffix (variableName):
+   """
+      Gets the suffix of the getter and setter of the given
+      PHP property, e.g. UserId for userId.
+   """
+
+   return variableName [0].upper () + variableName [1:]
+
+
+def quoteIdentifier (name):
+   """
+      Quotes the given table or column name for use in MySQL.
+   """
+
+   return '`%s`' % name.replace ('`', '``')
+
+
+def quotePHPString (value):
+   """
+      Quotes the given string as a single-quoted PHP string.
+   """
+
+   return "'%s'" % value.replace ('\\', '\\\\').replace ("'", "\\'")
+
+#--------------------------------------------------------------------
+class BatchStatement (object):
+   """
+      A statement of a DAO which reads or writes many rows at
+      once: a prefix, followed by an item for each row joined
+      by a separator, and a suffix.
+
+      The generated DAOs pass these parts and getMaxRows () to
+      the runtime, whose prepareBatch () builds the same SQL as
+      getSQL () for each of getRowCounts ().  Each of those
+      statements is prepared and cached by its SQL, so a DAO
+      prepares at most one statement per row count.
+   """
+
+   def __init__ (self, prefix, item, separator, suffix, bindTypes):
+      """
+         Initializes a BatchStatement.
+
+         bindTypes:
+            The mysqli bind_param types of the parameters
+            of each item.
+      """
+
+      self.prefix = prefix
+      self.item = item
+      self.separator = separator
+      self.suffix = suffix
+      self.bindTypes = bindTypes
+
+
+   def getMaxRows (self):
+      """
+         Gets the most rows, a power of two, which one statement
+         may have: at most MAX_BATCH_ROWS, and few enough that it
+         has at most MAX_PARAMETERS parameters.
+      """
+
+      maxRows = MAX_BATCH_ROWS
+
+      while maxRows > 1 and maxRows * len (self.bindTypes) > MAX_PARAMETERS:
+         maxRows >>= 1
+
+      return maxRows
+
+
+   def getRowCounts (self):
+      """
+         Gets the numbers of rows of the statements which may
+         be prepared: the powers of two up to getMaxRows ().
+      """
+
+      rowCounts = [1]
+
+      while rowCounts [-1] < self.getMaxRows ():
+         rowCounts.append (rowCounts [-1] * 2)
+
+      return rowCounts
+
+
+   def getSQL (self, rowCount):
+      """
+         Gets the SQL of the statement for the given number of rows.
+      """
+
+      return self.prefix + self.separator.join ([self.item] * rowCount) + self.suffix
+
+#--------------------------------------------------------------------
+class MySQLiGenerator (GeneratorBase):
+   """
+      Generates a value object (VO) class and a data access
+      object (DAO) class for each table.
+
+      Each DAO wraps a mysqli connection and has a finder for
+      each index of its table, and methods to insert, update and
+      delete rows by primary key.  Rows can also be inserted and
+      looked up by primary key in batches, with a few statements
+      carrying as many rows as the server allows, paged through
+      in the order of an index, or streamed by iterators which
+      do not buffer the result.  All SQL is held in class
+      constants, and every statement is prepared once per
+      connection through PyDAOStatementCache and reused by every
+      later call, on any instance of any DAO, so calling a finder
+      costs a single execute round trip.
+
+      The support classes are generated into PyDAOMySQLi.php,
+      which the DAOs require.
+   """
+
+   def generateCommon (self):
+      """
+         Generates the support classes shared by the DAOs.
+      """
+
+      return [(RUNTIME_FILENAME, RUNTIME_SOURCE)]
+
+
+   def generateTable (self, table):
+      """
+         Generates the VO and DAO classes for the given table.
+      """
+
+      className = toClassName (table.getName ())
+
+      return [('%sVO.php' % className, str (self.generateValueObject (table))),
+            ('%sDAO.php' % className, str (self.generateDataAccessObject (table)))]
+
+
+   def getVariableNames (self, table):
+      """
+         Gets a map of the names of the columns of the given
+         table to their PHP variable names.
+      """
+
+      variableNames = {}
+      seen = set ()
+
+      for columnName in table.getColumnNames ():
+         variableName = toVariableName (columnName)
+
+         if variableName in seen:
+            raise GeneratorException ('The columns of the table "%s" map to the same PHP name "%s".' % (table.getName (), variableName))
+
+         seen.add (variableName)
+         variableNames [columnName] = variableName
+
+      return variableNames
+
+
+   def getPrimaryKey (self, table):
+      """
+         Gets the names of the columns of the primary key of
+         the given table, or None if it has none.
+      """
+
+      for index in table.getAllIndexes ():
+         constraint = index.getConstraint ()
+
+         if (constraint is not None and constraint.getType () == 'PRIMARY_KEY') or \
+               index.getName () == 'PRIMARY':
+            return index.getColumns ()
+
+      return None
+
+
+   def getFinders (self, table):
+      """
+         Gets the finders of the DAO of the given table, as a
+         list of (methodName, columnNames, isUnique) tuples.
+
+         The primary key is found by getByPrimaryKey (), each
+         other unique index by getBy<Columns> (), which returns
+         one VO or null, and each other index by findBy<Columns> (),
+         which returns an array of VOs.  Indexes which would give
+         the same method as an earlier one are skipped.
+      """
+
+      finders = []
+      methodNames = set ()
+      primaryKey = self.getPrimaryKey (table)
+
+      if primaryKey:
+         finders.append (('getByPrimaryKey', primaryKey, True))
+         methodNames.add ('getByPrimaryKey')
+
+      for index in table.getAllIndexes ():
+         columnNames = index.getColumns ()
+
+         if not columnNames or columnNames == primaryKey:
+            continue
+
+         methodName = '%sBy%s' % (index.isUnique () and 'get' or 'find',
+               'And'.join (toClassName (columnName) for columnName in columnNames))
+
+         if methodName not in methodNames:
+            finders.append ((methodName, columnNames, index.isUnique ()))
+            methodNames.add (methodName)
+
+      return finders
+
+
+   def getPages (self, table):
+      """
+         Gets the keyset pagination methods of the DAO of the
+         given table, as a list of (methodName, keyColumnNames)
+         tuples: pageByPrimaryKey () and pageBy<Columns> () for
+         each other index, which page through the rows in the
+         order of the key columns.
+
+         The key of a unique index is its columns, and that of
+         any other index its columns followed by the remaining
+         columns of the primary key, which InnoDB stores in every
+         index, so that the key orders the rows completely.
+         Indexes whose key is not unique, or has a nullable
+         column, are skipped, as their rows cannot be paged
+         without repeating or skipping some of them.
+      """
+
+      pages = []
+      methodNames = set ()
+      primaryKey = self.getPrimaryKey (table)
+
+      if primaryKey:
+         pages.append (('pageByPrimaryKey', primaryKey))
+         methodNames.add ('pageByPrimaryKey')
+
+      for index in table.getAllIndexes ():
+         columnNames = index.getColumns ()
+
+         if not columnNames or columnNames == primaryKey:
+            continue
+
+         if index.isUnique ():
+            keyColumnNames = columnNames
+
+         elif primaryKey:
+            keyColumnNames = columnNames + [columnName for columnName in primaryKey
+                  if columnName not in columnNames]
+
+         else:
+            continue
+
+         if any (table.getColumn (columnName).isNullable () for columnName in keyColumnNames):
+            continue
+
+         methodName = 'pageBy%s' % 'And'.join (toClassName (columnName) for columnName in columnNames)
+
+         if methodName not in methodNames:
+            pages.append ((methodName, keyColumnNames))
+            methodNames.add (methodName)
+
+      return pages
+
+
+   def getIterators (self, table):
+      """
+         Gets the iterator methods of the DAO of the given table,
+         as a list of (methodName, finderName, columnNames) tuples:
+         iterate (), over every row, and iterateBy<Columns> () for
+         each finder which may return many rows.
+      """
+
+      iterators = [('iterate', None, [])]
+
+      for methodName, columnNames, isUnique in self.getFinders (table):
+         if not isUnique:
+            iterators.append (('iterate' + methodName [len ('find'):], methodName, columnNames))
+
+      return iterators
+
+
+   def getKeysetCondition (self, keyColumnNames):
+      """
+         Builds a where clause condition selecting the rows which
+         follow a row in the order of the given key columns, e.g.
+         `a` > ? or (`a` = ? and `b` > ?), whose parameters are
+         the values of the key columns of that row in the order
+         given by getKeysetParameters ().
+
+         The condition is spelled out rather than written as a
+         row comparison, (`a`, `b`) > (?, ?), for which older
+         versions of MySQL cannot use the index.
+      """
+
+      terms = []
+
+      for position, columnName in enumerate (keyColumnNames):
+         term = ' and '.join (['%s = ?' % quoteIdentifier (equalName)
+               for equalName in keyColumnNames [:position]] +
+               ['%s > ?' % quoteIdentifier (columnName)])
+
+         terms.append (position and '(%s)' % term or term)
+
+      return ' or '.join (terms)
+
+
+   def getKeysetParameters (self, keyColumnNames):
+      """
+         Gets the key columns whose values are bound, in order,
+         to the parameters of getKeysetCondition ().
+      """
+
+      return [columnName for position in xrange (len (keyColumnNames))
+            for columnName in keyColumnNames [:position + 1]]
+
+
+   def generateValueObject (self, table):
+      """
+         Generates the value object class of the given table,
+         with a property, getter and setter for each column.
+      """
+
+      variableNames = self.getVariableNames (table)
+
+      sb = IndentStringBuilder ()
+
+      sb.println ('<?php')
+      sb.println ('/*')
+      sb.println (' * The value object of the table %s.' % quoteIdentifier (table.getName ()))
+      sb.println (' *')
+      sb.println (' * Generated by PyDAO.  Do not edit.')
+      sb.println (' */')
+      sb.newline ()
+      sb.println ('class %sVO {' % toClassName (table.getName ()))
+
+      with sb:
+         for column in table.getAllColumns ():
+            sb.println ('private $%s; /* %s%s */' % (variableNames [column.getName ()],
+                  column.getDataType (), column.isNullable () and ', nullable' or ''))
+
+         for column in table.getAllColumns ():
+            variableName = variableNames [column.getName ()]
+            methodSuffix = toAccessorSuffix (variableName)
+
+            sb.newline ()
+            sb.println ('public function get%s () {' % methodSuffix)
+
+            with sb:
+               sb.println ('return $this->%s;' % variableName)
+
+            sb.println ('}')
+            sb.newline ()
+            sb.println ('public function set%s ($value) {' % methodSuffix)
+
+            with sb:
+               sb.println ('$this->%s = $value;' % variableName)
+
+            sb.println ('}')
+
+      sb.println ('}')
+
+      return sb
+
+
+   def generateDataAccessObject (self, table):
+      """
+         Generates the data access object class of the given table.
+      """
+
+      className = toClassName (table.getName ())
+
+      sb = IndentStringBuilder ()
+
+      sb.println ('<?php')
+      sb.println ('/*')
+      sb.println (' * The data access object of the table %s.' % quoteIdentifier (table.getName ()))
+      sb.println (' *')
+      sb.println (' * Generated by PyDAO.  Do not edit.')
+      sb.println (' */')
+      sb.newline ()
+      sb.println ("require_once dirname (__FILE__) . '/%s';" % RUNTIME_FILENAME)
+      sb.println ("require_once dirname (__FILE__) . '/%sVO.php';" % className)
+      sb.newline ()
+      sb.println ('class %sDAO extends PyDAOMySQLiDAO {' % className)
+
+      with sb:
+         self.generateStatements (sb, table)
+         self.generateMethods (sb, table)
+
+      sb.println ('}')
+
+      return sb
+
+
+   def getStatements (self, table):
+      """
+         Gets the SQL statements of the DAO of the given table,
+         as a list of (constantName, sql) pairs.
+      """
+
+      statements = []
+
+      selectSQL = 'select %s from %s' % (
+            ', '.join (quoteIdentifier (columnName) for columnName in table.getColumnNames ()),
+            quoteIdentifier (table.getName ()))
+
+      for methodName, columnNames, isUnique in self.getFinders (table):
+         statements.append ((self.getConstantName (methodName),
+               '%s where %s' % (selectSQL, self.getCondition (columnNames))))
+
+      if self.getPrimaryKey (table):
+         statements.append (('SQL_GET_MANY_BY_PRIMARY_KEY', self.getGetManyBatch (table).prefix))
+
+      for methodName, keyColumnNames in self.getPages (table):
+         orderBy = ', '.join (quoteIdentifier (columnName) for columnName in keyColumnNames)
+
+         statements.append ((self.getConstantName (methodName) + '_FIRST',
+               '%s order by %s limit ?' % (selectSQL, orderBy)))
+         statements.append ((self.getConstantName (methodName),
+               '%s where %s order by %s limit ?' % (selectSQL,
+                  self.getKeysetCondition (keyColumnNames), orderBy)))
+
+      statements.append (('SQL_ITERATE', selectSQL))
+
+      insertBatch = self.getInsertBatch (table)
+
+      statements.append (('SQL_INSERT', insertBatch.getSQL (1)))
+      statements.append (('SQL_INSERT_MANY', insertBatch.prefix))
+
+      primaryKey = self.getPrimaryKey (table)
+
+      if primaryKey:
+         updateColumns = self.getUpdateColumns (table)
+
+         if updateColumns:
+            statements.append (('SQL_UPDATE', 'update %s set %s where %s' % (
+                  quoteIdentifier (table.getName ()),
+                  ', '.join ('%s = ?' % quoteIdentifier (columnName) for columnName in updateColumns),
+                  self.getCondition (primaryKey))))
+
+         statements.append (('SQL_DELETE', 'delete from %s where %s' % (
+               quoteIdentifier (table.getName ()), self.getCondition (primaryKey))))
+
+      return statements
+
+
+   def getGetManyBatch (self, table):
+      """
+         Gets the BatchStatement of getManyByPrimaryKey () for the
+         given table, which must have a primary key.  A single
+         column key is matched with an IN list, and keys of several
+         columns with OR'ed equality conditions.
+      """
+
+      primaryKey = self.getPrimaryKey (table)
+
+      selectSQL = 'select %s from %s where ' % (
+            ', '.join (quoteIdentifier (columnName) for columnName in table.getColumnNames ()),
+            quoteIdentifier (table.getName ()))
+
+      bindTypes = ''.join (getBindType (table.getColumn (columnName)) for columnName in primaryKey)
+
+      if len (primaryKey) == 1:
+         return BatchStatement ('%s%s in (' % (selectSQL, quoteIdentifier (primaryKey [0])),
+               '?', ', ', ')', bindTypes)
+
+      return BatchStatement (selectSQL, '(%s)' % self.getCondition (primaryKey), ' or ', '', bindTypes)
+
+
+   def getInsertBatch (self, table):
+      """
+         Gets the BatchStatement of insertMany () for the given
+         table, a multi-row insert of getInsertColumns ().
+      """
+
+      insertColumns = self.getInsertColumns (table)
+
+      return BatchStatement ('insert into %s (%s) values ' % (
+               quoteIdentifier (table.getName ()),
+               ', '.join (quoteIdentifier (columnName) for columnName in insertColumns)),
+            '(%s)' % ', '.join (['?'] * len (insertColumns)), ', ', '',
+            ''.join (getBindType (table.getColumn (columnName)) for columnName in insertColumns))
+
+
+   def getQueryShapes (self, table):
+      """
+         Gets a QueryShape for each select, update and delete
+         statement of the DAO of the given table, for the
+         IndexLinter.  SQL_ITERATE, which reads every row by
+         design, is left out.
+      """
+
+      className = toClassName (table.getName ())
+      statements = dict (self.getStatements (table))
+      shapes = []
+
+      def addShape (constantName, equalColumns = (), orderColumns = ()):
+         shapes.append (QueryShape ('%sDAO::%s' % (className, constantName), table.getName (),
+               statements [constantName], equalColumns, orderColumns))
+
+      for methodName, columnNames, isUnique in self.getFinders (table):
+         addShape (self.getConstantName (methodName), columnNames)
+
+      primaryKey = self.getPrimaryKey (table)
+
+      if primaryKey:
+         addShape ('SQL_GET_MANY_BY_PRIMARY_KEY', primaryKey)
+
+      for methodName, keyColumnNames in self.getPages (table):
+         addShape (self.getConstantName (methodName) + '_FIRST', (), keyColumnNames)
+         addShape (self.getConstantName (methodName), (), keyColumnNames)
+
+      for constantName in ('SQL_UPDATE', 'SQL_DELETE'):
+         if constantName in statements:
+            addShape (constantName, primaryKey)
+
+      return shapes
+
+
+   def getConstantName (self, methodName):
+      """
+         Gets the name of the class constant holding the SQL
+         of the given method, e.g. SQL_FIND_BY_USER_ID.
+      """
+
+      return 'SQL_' + '_'.join (word.upper () for word in splitWords (methodName))
+
+
+   def getCondition (self, columnNames):
+      """
+         Builds a where clause condition matching the given
+         columns to statement parameters.
+      """
+
+      return ' and '.join ('%s = ?' % quoteIdentifier (columnName) for columnName in columnNames)
+
+
+   def getInsertColumns (self, table):
+      """
+         Gets the names of the columns given by an insert:
+         all but the auto-increment column, if any.
+      """
+
+      return [column.getName () for column in table.getAllColumns ()
+            if 'auto_increment' not in column.getExtra ().lower ()]
+
+
+   def getUpdateColumns (self, table):
+      """
+         Gets the names of the columns set by an update:
+         all but those of the primary key.
+      """
+
+      primaryKey = self.getPrimaryKey (table) or []
+
+      return [columnName for columnName in table.getColumnNames ()
+            if columnName not in primaryKey]
+
+
+   def generateStatements (self, sb, table):
+      """
+         Generates the class constants holding the SQL of
+         the DAO of the given table.
+      """
+
+      for constantName, sql in self.getStatements (table):
+         sb.println ('const %s = %s;' % (constantName, quotePHPString (sql)))
+
+
+   def generateMethods (self, sb, table):
+      """
+         Generates the methods of the DAO of the given table.
+      """
+
+      for methodName, columnNames, isUnique in self.getFinders (table):
+         sb.newline ()
+         self.generateFinder (sb, table, methodName, columnNames, isUnique)
+
+      if self.getPrimaryKey (table):
+         sb.newline ()
+         self.generateGetManyByPrimaryKey (sb, table)
+
+      for methodName, keyColumnNames in self.getPages (table):
+         sb.newline ()
+         self.generatePage (sb, table, methodName, keyColumnNames)
+
+      for methodName, finderName, columnNames in self.getIterators (table):
+         sb.newline ()
+         self.generateIterator (sb, table, methodName, finderName, columnNames)
+
+      sb.newline ()
+      self.generateInsert (sb, table)
+
+      sb.newline ()
+      self.generateInsertMany (sb, table)
+
+      if self.getPrimaryKey (table):
+         if self.getUpdateColumns (table):
+            sb.newline ()
+            self.generateUpdate (sb, table)
+
+         sb.newline ()
+         self.generateDelete (sb, table)
+
+      sb.newline ()
+      self.generateFetch (sb, table)
+
+      sb.newline ()
+      self.generateFromRow (sb, table)
+
+
+   def generateBind (self, sb, table, columnNames, extraParameters = ()):
+      """
+         Generates a call binding the PHP variables of the
+         given columns to the parameters of $stmt, followed by
+         any extra (bindType, variableName) parameters.
+      """
+
+      if columnNames or extraParameters:
+         variableNames = self.getVariableNames (table)
+
+         parameters = [(getBindType (table.getColumn (columnName)), variableNames [columnName])
+               for columnName in columnNames] + list (extraParameters)
+
+         sb.println ("$stmt->bind_param ('%s', %s);" % (
+               ''.join (bindType for bindType, variableName in parameters),
+               ', '.join ('$%s' % variableName for bindType, variableName in parameters)))
+
+
+   def generateFinder (self, sb, table, methodName, columnNames, isUnique):
+      """
+         Generates a finder method, which returns the VO of the
+         matching row or null if isUnique, and otherwise an
+         array of the VOs of the matching rows.
+      """
+
+      variableNames = self.getVariableNames (table)
+
+      sb.println ('public function %s (%s) {' % (methodName,
+            ', '.join ('$%s' % variableNames [columnName] for columnName in columnNames)))
+
+      with sb:
+         sb.println ('$stmt = $this->prepare (self::%s);' % self.getConstantName (methodName))
+         self.generateBind (sb, table, columnNames)
+         sb.println ('$this->execute ($stmt);')
+         sb.newline ()
+
+         if isUnique:
+            sb.println ('$results = $this->fetch ($stmt);')
+            sb.println ('return $results ? $results [0] : null;')
+
+         else:
+            sb.println ('return $this->fetch ($stmt);')
+
+      sb.println ('}')
+
+
+   def generateGetManyByPrimaryKey (self, sb, table):
+      """
+         Generates the getManyByPrimaryKey method, which looks up
+         many rows by primary key with a few batch statements.
+         Keys of several columns are given as arrays of values,
+         in the order of the columns of the primary key.
+
+         The keys are compared with the rows by MySQL, under the
+         type and collation of each column, so a key may match
+         a row whose value differs from it, e.g. in case.  Each
+         row matched is returned once, however many of the keys
+         match it, and the rows are in no particular order; keys
+         which match no row add nothing.
+      """
+
+      variableNames = self.getVariableNames (table)
+      primaryKey = self.getPrimaryKey (table)
+      batch = self.getGetManyBatch (table)
+
+      sb.println ('public function getManyByPrimaryKey (array $keys) {')
+
+      with sb:
+         sb.println ('$results = array ();')
+         sb.newline ()
+         sb.println ('foreach ($this->selectByKeys (self::SQL_GET_MANY_BY_PRIMARY_KEY, %s, %s, %s, %s, %d, $keys) as $vo) {' % (
+               quotePHPString (batch.item), quotePHPString (batch.separator),
+               quotePHPString (batch.suffix), quotePHPString (batch.bindTypes),
+               batch.getMaxRows ()))
+
+         with sb:
+            sb.println ('// A row matched by keys in several batches is kept once,')
+            sb.println ('// by the primary key which MySQL returned for it.')
+            sb.println ('$results [serialize (array (%s))] = $vo;' % ', '.join (
+                  '$vo->get%s ()' % toAccessorSuffix (variableNames [columnName])
+                  for columnName in primaryKey))
+
+         sb.println ('}')
+         sb.newline ()
+         sb.println ('return array_values ($results);')
+
+      sb.println ('}')
+
+
+   def generatePage (self, sb, table, methodName, keyColumnNames):
+      """
+         Generates a keyset pagination method, which returns an
+         array of the VOs of at most $limit rows in the order of
+         the key columns: the first rows, or those following the
+         VO $after, usually the last of the previous page.
+
+         Unlike paging with an offset, each page is read directly
+         from the index, however far into the table it is.
+      """
+
+      variableNames = self.getVariableNames (table)
+      constantName = self.getConstantName (methodName)
+
+      sb.println ('public function %s ($limit, %sVO $after = null) {' % (
+            methodName, toClassName (table.getName ())))
+
+      with sb:
+         sb.println ('if ($after === null) {')
+
+         with sb:
+            sb.println ('$stmt = $this->prepare (self::%s_FIRST);' % constantName)
+            self.generateBind (sb, table, [], [('i', 'limit')])
+
+         sb.println ('} else {')
+
+         with sb:
+            sb.println ('$stmt = $this->prepare (self::%s);' % constantName)
+            sb.newline ()
+
+            for columnName in keyColumnNames:
+               variableName = variableNames [columnName]
+               sb.println ('$%s = $after->get%s ();' % (variableName, toAccessorSuffix (variableName)))
+
+            self.generateBind (sb, table, self.getKeysetParameters (keyColumnNames), [('i', 'limit')])
+
+         sb.println ('}')
+         sb.newline ()
+         sb.println ('$this->execute ($stmt);')
+         sb.println ('return $this->fetch ($stmt);')
+
+      sb.println ('}')
+
+
+   def generateIterator (self, sb, table, methodName, finderName, columnNames):
+      """
+         Generates an iterator method, which returns an unbuffered
+         PyDAOResultIterator over the VOs of the rows which the
+         given finder would return, or of every row if there is
+         no finder.  The rows are read from the server as the
+         iteration proceeds, rather than all at once.
+      """
+
+      variableNames = self.getVariableNames (table)
+      constantName = finderName and self.getConstantName (finderName) or 'SQL_ITERATE'
+
+      sb.println ('public function %s (%s) {' % (methodName,
+            ', '.join ('$%s' % variableNames [columnName] for columnName in columnNames)))
+
+      with sb:
+         sb.println ('$stmt = $this->prepare (self::%s);' % constantName)
+         self.generateBind (sb, table, columnNames)
+         sb.println ('$this->execute ($stmt);')
+         sb.newline ()
+         sb.println ('return new PyDAOResultIterator ($stmt, $this);')
+
+      sb.println ('}')
+
+
+   def generateInsert (self, sb, table):
+      """
+         Generates the insert method, which sets the value of
+         the auto-increment column, if any, of the given VO.
+      """
+
+      variableNames = self.getVariableNames (table)
+      insertColumns = self.getInsertColumns (table)
+
+      sb.println ('public function insert (%sVO $vo) {' % toClassName (table.getName ()))
+
+      with sb:
+         sb.println ('$stmt = $this->prepare (self::SQL_INSERT);')
+         sb.newline ()
+
+         for columnName in insertColumns:
+            variableName = variableNames [columnName]
+            sb.println ('$%s = $vo->get%s ();' % (variableName, toAccessorSuffix (variableName)))
+
+         self.generateBind (sb, table, insertColumns)
+         sb.println ('$this->execute ($stmt);')
+
+         for column in table.getAllColumns ():
+            if column.getName () not in insertColumns:
+               variableName = variableNames [column.getName ()]
+
+               sb.newline ()
+               sb.println ('$vo->set%s ($stmt->insert_id);' % toAccessorSuffix (variableName))
+
+      sb.println ('}')
+
+
+   def generateInsertMany (self, sb, table):
+      """
+         Generates the insertMany method, which inserts the given
+         VOs with a few multi-row inserts, returning the number of
+         rows inserted.  The values of auto-increment columns are
+         not set in the VOs, as MySQL does not report them all.
+      """
+
+      variableNames = self.getVariableNames (table)
+      insertColumns = self.getInsertColumns (table)
+      batch = self.getInsertBatch (table)
+
+      sb.println ('public function insertMany (array $vos) {')
+
+      with sb:
+         sb.println ('$rows = array ();')
+         sb.newline ()
+         sb.println ('foreach ($vos as $vo) {')
+
+         with sb:
+            sb.println ('$rows [] = array (%s);' % ', '.join ('$vo->get%s ()' % toAccessorSuffix (
+                  variableNames [columnName]) for columnName in insertColumns))
+
+         sb.println ('}')
+         sb.newline ()
+         sb.println ('return $this->insertRows (self::SQL_INSERT_MANY, %s, %s, %d, $rows);' % (
+               quotePHPString (batch.item), quotePHPString (batch.bindTypes), batch.getMaxRows ()))
+
+      sb.println ('}')
+
+
+   def generateUpdate (self, sb, table):
+      """
+         Generates the update method, which updates the row
+         with the primary key of the given VO, returning the
+         number of rows changed.
+      """
+
+      variableNames = self.getVariableNames (table)
+      columnNames = self.getUpdateColumns (table) + self.getPrimaryKey (table)
+
+      sb.println ('public function update (%sVO $vo) {' % toClassName (table.getName ()))
+
+      with sb:
+         sb.println ('$stmt = $this->prepare (self::SQL_UPDATE);')
+         sb.newline ()
+
+         for columnName in columnNames:
+            variableName = variableNames [columnName]
+            sb.println ('$%s = $vo->get%s ();' % (variableName, toAccessorSuffix (variableName)))
+
+         self.generateBind (sb, table, columnNames)
+         sb.println ('$this->execute ($stmt);')
+         sb.newline ()
+         sb.println ('return $stmt->affected_rows;')
+
+      sb.println ('}')
+
+
+   def generateDelete (self, sb, table):
+      """
+         Generates the delete method, which deletes the row
+         with the primary key of the given VO, returning the
+         number of rows deleted.
+      """
+
+      variableNames = self.getVariableNames (table)
+      primaryKey = self.getPrimaryKey (table)
+
+      sb.println ('public function delete (%sVO $vo) {' % toClassName (table.getName ()))
+
+      with sb:
+         sb.println ('$stmt = $this->prepare (self::SQL_DELETE);')
+         sb.newline ()
+
+         for columnName in primaryKey:
+            variableName = variableNames [columnName]
+            sb.println ('$%s = $vo->get%s ();' % (variableName, toAccessorSuffix (variableName)))
+
+         self.generateBind (sb, table, primaryKey)
+         sb.println ('$this->execute ($stmt);')
+         sb.newline ()
+         sb.println ('return $stmt->affected_rows;')
+
+      sb.println ('}')
+
+
+   def generateFetch (self, sb, table):
+      """
+         Generates the method which reads the rows of an
+         executed select statement into an array of VOs.
+
+         The rows are buffered with store_result () and the
+         result freed afterwards, which leaves the statement
+         ready to be executed again.
+      """
+
+      variableNames = self.getVariableNames (table)
+      className = toClassName (table.getName ())
+
+      sb.println ('protected function fetch (mysqli_stmt $stmt) {')
+
+      with sb:
+         sb.println ('$stmt->store_result ();')
+         sb.println ('$stmt->bind_result (%s);' % ', '.join ('$%s' % variableNames [columnName]
+               for columnName in table.getColumnNames ()))
+         sb.newline ()
+         sb.println ('$results = array ();')
+         sb.newline ()
+         sb.println ('while ($stmt->fetch ()) {')
+
+         with sb:
+            sb.println ('$vo = new %sVO ();' % className)
+
+            for columnName in table.getColumnNames ():
+               variableName = variableNames [columnName]
+               sb.println ('$vo->set%s ($%s);' % (toAccessorSuffix (variableName), variableName))
+
+            sb.println ('$results [] = $vo;')
+
+         sb.println ('}')
+         sb.newline ()
+         sb.println ('$stmt->free_result ();')
+         sb.println ('return $results;')
+
+      sb.println ('}')
+
+
+   def generateFromRow (self, sb, table):
+      """
+         Generates the method which builds a VO from an array
+         of the values of a row, used by PyDAOResultIterator.
+      """
+
+      variableNames = self.getVariableNames (table)
+
+      sb.println ('public function fromRow (array $row) {')
+
+      with sb:
+         sb.println ('$vo = new %sVO ();' % toClassName (table.getName ()))
+
+         for position, columnName in enumerate (table.getColumnNames ()):
+            sb.println ('$vo->set%s ($row [%d]);' % (
+                  toAccessorSuffix (variableNames [columnName]), position))
+
+         sb.println ('return $vo;')
+
+      sb.println ('}')
@@ -15,6 +15,39 @@
 import sys
 from abc import ABCMeta, abstractmethod
 
+#--------------------------------------------------------------------
+def emitIndented (emit, text, prefix, state):
+   """
+      Passes the given text on to emit (), prepending the
+      given prefix to each line, including blank lines.
+
+      state is a one-element list recording whether the output
+      is at the start of a line.  It is shared across calls so
+      that lines split between several texts are indented once.
+   """
+
+   if not text:
+      return
+
+   if prefix:
+      endsLine = text.endswith ('\n')
+
+      if endsLine:
+         output = text [:-1].replace ('\n', '\n' + prefix) + '\n'
+
+      else:
+         output = text.replace ('\n', '\n' + prefix)
+
+      if state [0]:
+         output = prefix + output
+
+      emit (output)
+      state [0] = endsLine
+
+   else:
+      emit (text)
+      state [0] = text.endswith ('\n')
+
 #--------------------------------------------------------------------
 class IndentBase (object):
    """
@@ -33,6 +66,9 @@ class IndentBase (object):
       self.enabled = True
       self.isnewline = False
 
+      # The indent prefix for each indent level, built on demand.
+      self.indentPrefixes = ['']
+
    
    @abstractmethod
    def _write_raw (self, output):
@@ -56,11 +92,25 @@ class IndentBase (object):
 
       if self.isnewline:
          self.isnewline = False
-         self._write_raw (self.indentStr * self.il)
+         self._write_raw (self.getIndentPrefix ())
 
       self._write_raw (output)
 
 
+   def getIndentPrefix (self):
+      """
+         Gets the string prepended to each line at the
+         current indent level.
+
+         The prefix for each level is built only once.
+      """
+
+      while len (self.indentPrefixes) <= self.il:
+         self.indentPrefixes.append (self.indentStr * len (self.indentPrefixes))
+
+      return self.indentPrefixes [self.il]
+
+
    def indent (self, level = 1):
       """
          Indent the given number of levels.
@@ -97,6 +147,7 @@ class IndentBase (object):
       """
 
       self.indentStr = indentStr
+      self.indentPrefixes = ['']
 
 
    def setEnabled (self, enabled):
@@ -129,6 +180,31 @@ class IndentBase (object):
          self.println (line)
 
 
+   def embed (self, fragment):
+      """
+         Prints the given fragment, indenting each of its lines,
+         and ends the line.  This is equivalent to
+         printLines (str (fragment)).
+
+         The fragment may be a string or an IndentStringBuilder,
+         which is rendered straight to the output without first
+         being built into a string.
+      """
+
+      state = [self.isnewline]
+
+      if isinstance (fragment, basestring):
+         emitIndented (self._write_raw, fragment, self.getIndentPrefix (), state)
+
+      else:
+         fragment._render (self._write_raw, self.getIndentPrefix (), state)
+
+      if not state [0]:
+         self._write_raw ('\n')
+
+      self.isnewline = True
+
+
    def writeln (self, output):
       """
          A synonym for println.
@@ -213,6 +289,132 @@ class IndentWriter (IndentBase):
       
       self.outfile.write (output)
 
+#--------------------------------------------------------------------
+class BufferedIndentWriter (IndentWriter):
+   """
+      An indented text printer which collects its output in
+      a small buffer and passes it on to the output file in
+      large chunks.
+
+      The output file may be any object with a write () method,
+      or a socket, in which case sendall () is used.  Only up
+      to about flushThreshold characters of output are held
+      in memory at once.
+
+      The buffer is flushed when it reaches the threshold and
+      whenever the outermost with block is left, even by an
+      exception.  Output written outside of any with block is
+      not; flush () or close () must be called once all of the
+      output has been written, or whatever remains in the buffer
+      is silently lost.  contextlib.closing () does so:
+
+         with closing (BufferedIndentWriter (outfile)) as writer:
+            writer.println ("Hello,")
+
+            with writer:
+               writer.println ("World!")
+   """
+
+   def __init__ (self, outfile = sys.stdout, flushThreshold = 65536):
+      """
+         Initializes a BufferedIndentWriter.
+
+         outfile:
+            The file or socket to which output is written.
+
+         flushThreshold:
+            The number of characters to collect before passing
+            them on to the output file.
+      """
+
+      IndentWriter.__init__ (self, outfile)
+
+      self.flushThreshold = flushThreshold
+      self.buffer = []
+      self.bufferSize = 0
+
+      # The number of with blocks currently entered.
+      self.depth = 0
+
+      if hasattr (outfile, 'sendall'):
+         self.sink = self._send
+
+      else:
+         self.sink = outfile.write
+
+
+   def _write_raw (self, output):
+      """
+         The raw write method.
+
+         Adds the given output to the buffer, flushing it
+         if it has reached the flush threshold.
+      """
+
+      self.buffer.append (output)
+      self.bufferSize += len (output)
+
+      if self.bufferSize >= self.flushThreshold:
+         self.flush ()
+
+
+   def _send (self, output):
+      """
+         Sends the given output to a socket.
+
+         This method is private.
+      """
+
+      if isinstance (output, unicode):
+         output = output.encode ('utf-8')
+
+      self.outfile.sendall (output)
+
+
+   def __enter__ (self):
+      """
+         Indents the output within the with block.
+      """
+
+      self.depth += 1
+      IndentWriter.__enter__ (self)
+
+
+   def __exit__ (self, excType, excVal, excTraceback):
+      """
+         Unindents the output after the with block, and flushes
+         the buffered output once the outermost block is left.
+      """
+
+      IndentWriter.__exit__ (self, excType, excVal, excTraceback)
+      self.depth -= 1
+
+      if self.depth == 0:
+         self.flush ()
+
+
+   def flush (self):
+      """
+         Passes all of the buffered output on to the output file.
+      """
+
+      if self.buffer:
+         output = ''.join (self.buffer)
+         self.buffer = []
+         self.bufferSize = 0
+
+         self.sink (output)
+
+
+   def close (self):
+      """
+         Flushes the buffered output.
+
+         The output file itself is left open.
+      """
+
+      self.flush ()
+
 #--------------------------------------------------------------------
 class IndentStringBuilder (IndentBase):
    """
@@ -230,6 +432,7 @@ class IndentStringBuilder (IndentBase):
       
       IndentBase.__init__ (self)
       self.strings = []
+      self.hasFragments = False
    
 
    def _write_raw (self, output):
@@ -242,29 +445,86 @@ class IndentStringBuilder (IndentBase):
 
       self.strings.append (output)
 
+
+   def embed (self, fragment):
+      """
+         Embeds the given fragment, a string or another
+         IndentStringBuilder, at the current indent level
+         and ends the line.
+
+         An embedded builder is kept as it is, and only indented
+         when the final string is rendered.  Embedding builders
+         in one another to any depth therefore costs time linear
+         in the size of the final output, whereas printLines ()
+         re-indents the whole fragment at every level.  A string
+         is indented immediately, at this level only.
+
+         An embedded builder should not be written to afterwards.
+      """
+
+      if isinstance (fragment, basestring):
+         IndentBase.embed (self, fragment)
+
+      else:
+         self.strings.append (IndentFragment (fragment, self.getIndentPrefix ()))
+         self.hasFragments = True
+         self.isnewline = True
+
+
+   def _render (self, emit, prefix, state):
+      """
+         Passes the output on to emit (), prepending the given
+         prefix to each line and rendering embedded fragments.
+
+         This method is private.
+      """
+
+      # Consecutive strings are joined and indented together.
+      start = 0
+
+      for n, output in enumerate (self.strings):
+         if not isinstance (output, basestring):
+            emitIndented (emit, ''.join (self.strings [start:n]), prefix, state)
+            output.render (emit, prefix, state)
+            start = n + 1
+
+      emitIndented (emit, ''.join (self.strings [start:]), prefix, state)
+
    
    def getLines (self):
       """
          Gets all of the individual lines of output.
       """
       
-      lines = []
-
-      for outputStr in self.strings:
-         lines.extend (filter (None, outputStr.split ('\n')))
-      
-      return lines
+      return filter (None, self.getString ().split ('\n'))
 
 
    def getString (self):
       """
-         Concatenates the list of output strings.
+         Concatenates the list of output strings, rendering
+         any embedded fragments.
 
          This is much more efficient than concatenating
          on each write.
       """
 
-      return ''.join (self.strings)
+      if not self.hasFragments:
+         return ''.join (self.strings)
+
+      strings = []
+      self._render (strings.append, '', [True])
+
+      return ''.join (strings)
+
+
+   def writeTo (self, outfile):
+      """
+         Writes the output, rendering any embedded fragments,
+         straight to the given file without first building
+         it into a string.
+      """
+
+      self._render (outfile.write, '', [True])
 
 
    def __str__ (self):
@@ -276,3 +536,44 @@ class IndentStringBuilder (IndentBase):
       
       return self.getString ()
 
+#--------------------------------------------------------------------
+class IndentFragment (object):
+   """
+      A fragment embedded in an IndentStringBuilder, along
+      with the indent prefix at the point where it was embedded.
+   """
+
+   def __init__ (self, content, prefix):
+      """
+         Initializes an IndentFragment.
+
+         content:
+            A string or an IndentStringBuilder.
+
+         prefix:
+            The indent prefix to prepend to each of its lines.
+      """
+
+      self.content = content
+      self.prefix = prefix
+
+
+   def render (self, emit, prefix, state):
+      """
+         Passes the fragment on to emit (), prepending the given
+         outer prefix and the fragment's own prefix to each line,
+         and ends the line.
+      """
+
+      prefix = prefix + self.prefix
+
+      if isinstance (self.content, basestring):
+         emitIndented (emit, self.content, prefix, state)
+
+      else:
+         self.content._render (emit, prefix, state)
+
+      if not state [0]:
+         emit ('\n')
+         state [0] = True
+
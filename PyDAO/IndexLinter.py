@@ -0,0 +1,282 @@
+#
+# IndexLinter
+#
+# Checks the queries emitted by a generator against the
+# indexes of their tables, reporting those which cannot use
+# any index and so would read every row of the table.
+#
+# Part of the PyDAO package.
+#
+# (c) 2011 Lee Supe (lain_proliant)
+# Released under the GNU General Public License, version 3.
+#
+
+from GeneratorException import *
+from IndentWriter import *
+
+#--------------------------------------------------------------------
+class IndexLintException (GeneratorException): pass
+
+#--------------------------------------------------------------------
+class QueryShape (object):
+   """
+      Describes how a generated query selects and orders the
+      rows of its table, which is all the IndexLinter needs to
+      know of it; the SQL itself is kept only for reporting.
+   """
+
+   __slots__ = ('name', 'tableName', 'sql', 'equalColumns', 'orderColumns')
+
+   def __init__ (self, name, tableName, sql, equalColumns = (), orderColumns = ()):
+      """
+         Initializes a QueryShape.
+
+         name:
+            The name by which the query is reported, e.g. the
+            class and constant holding it.
+
+         tableName:
+            The name of the table queried.
+
+         sql:
+            The SQL of the query.
+
+         equalColumns:
+            The columns which the where clause compares for
+            equality, or with an IN list.
+
+         orderColumns:
+            The columns by which the rows are ordered, in order,
+            including those whose range a keyset condition such
+            as `a` > ? selects.
+      """
+
+      self.name = name
+      self.tableName = tableName
+      self.sql = sql
+      self.equalColumns = list (equalColumns)
+      self.orderColumns = list (orderColumns)
+
+#--------------------------------------------------------------------
+class IndexLintFinding (object):
+   """
+      A query which cannot use an index of its table for its
+      where clause, which would read every row of the table,
+      or for its order by clause, which would sort the rows.
+   """
+
+   SCAN = 'scan'
+   SORT = 'sort'
+
+   def __init__ (self, query, kind):
+      """
+         Initializes an IndexLintFinding for the given
+         QueryShape, of the kind SCAN or SORT.
+      """
+
+      self.query = query
+      self.kind = kind
+
+
+   def getQuery (self):
+      """
+         Gets the QueryShape of the query found.
+      """
+
+      return self.query
+
+
+   def getKind (self):
+      """
+         Gets the kind of the finding, SCAN or SORT.
+      """
+
+      return self.kind
+
+
+   def getMessage (self):
+      """
+         Gets a description of the finding.
+      """
+
+      if self.kind == IndexLintFinding.SCAN:
+         return 'No index of `%s` begins with any of the columns (%s) of the where clause; every row is read.' % (
+               self.query.tableName, ', '.join (self.query.equalColumns))
+
+      return 'No index of `%s` orders the rows by (%s)%s; the rows are sorted.' % (
+            self.query.tableName, ', '.join (self.query.orderColumns),
+            self.query.equalColumns and ' after (%s)' % ', '.join (self.query.equalColumns) or '')
+
+#--------------------------------------------------------------------
+class IndexLinter (object):
+   """
+      Checks QueryShapes against the indexes of the tables of a
+      DatabaseSchema.
+
+      A query can use an index if the leading columns of the
+      index are compared for equality by its where clause, and
+      its rows are ordered by an index if the columns following
+      those are its order by columns.  Each index other than the
+      primary key is taken to end with the columns of the primary
+      key, which InnoDB stores in every index.
+   """
+
+   def __init__ (self, schema):
+      """
+         Initializes an IndexLinter for the given DatabaseSchema.
+      """
+
+      self.schema = schema
+
+      # A map of table names to the columns of each index of the
+      # table, extended by the primary key, computed on demand.
+      self.indexKeys = {}
+
+
+   def getIndexKeys (self, tableName):
+      """
+         Gets the columns of each index of the named table,
+         followed by any columns of the primary key which the
+         index does not have, as a list of lists.
+      """
+
+      if tableName not in self.indexKeys:
+         table = self.schema.getTable (tableName)
+
+         if table is None:
+            raise IndexLintException ('The table "%s" is not in the schema.' % tableName)
+
+         primaryKey = []
+
+         for index in table.getAllIndexes ():
+            constraint = index.getConstraint ()
+
+            if (constraint is not None and constraint.getType () == 'PRIMARY_KEY') or \
+                  index.getName () == 'PRIMARY':
+               primaryKey = index.getColumns ()
+               break
+
+         self.indexKeys [tableName] = [index.getColumns () + [columnName
+               for columnName in primaryKey if columnName not in index.getColumns ()]
+               for index in table.getAllIndexes () if index.getColumns ()]
+
+      return self.indexKeys [tableName]
+
+
+   def checkQuery (self, query):
+      """
+         Checks the given QueryShape, returning an
+         IndexLintFinding, or None if it can use an index.
+      """
+
+      equalColumns = set (query.equalColumns)
+      orderColumns = [columnName for columnName in query.orderColumns
+            if columnName not in equalColumns]
+
+      isFiltered = False
+      isOrdered = not orderColumns
+
+      for key in self.getIndexKeys (query.tableName):
+         prefixLength = 0
+
+         while prefixLength < len (key) and key [prefixLength] in equalColumns:
+            prefixLength += 1
+
+         if prefixLength > 0:
+            isFiltered = True
+
+         # An index orders the rows only if it also selects them;
+         # otherwise the whole index would be read in order.
+         if (prefixLength > 0 or not equalColumns) and \
+               key [prefixLength:prefixLength + len (orderColumns)] == orderColumns:
+            isOrdered = True
+
+      if equalColumns and not isFiltered:
+         return IndexLintFinding (query, IndexLintFinding.SCAN)
+
+      if not isOrdered:
+         return IndexLintFinding (query, IndexLintFinding.SORT)
+
+      return None
+
+
+   def lint (self, queries):
+      """
+         Checks each of the given QueryShapes, returning an
+         IndexLintReport of those which cannot use an index.
+      """
+
+      report = IndexLintReport ()
+
+      for query in queries:
+         finding = self.checkQuery (query)
+
+         if finding is not None:
+            report.addFinding (finding)
+
+      return report
+
+#--------------------------------------------------------------------
+class IndexLintReport (object):
+   """
+      The findings of an IndexLinter, in the order in which
+      the queries were checked.
+   """
+
+   def __init__ (self):
+      """
+         Initializes an empty IndexLintReport.
+      """
+
+      self.findings = []
+
+
+   def addFinding (self, finding):
+      """
+         Adds the given IndexLintFinding to the report.
+      """
+
+      self.findings.append (finding)
+
+
+   def getFindings (self):
+      """
+         Gets the list of IndexLintFindings.
+      """
+
+      return list (self.findings)
+
+
+   def isEmpty (self):
+      """
+         Gets whether every query checked can use an index.
+      """
+
+      return not self.findings
+
+
+   def toStringBuilder (self):
+      """
+         Builds a description of each finding, with the SQL
+         of its query.
+      """
+
+      sb = IndentStringBuilder ()
+
+      sb.println ('%d %s cannot use an index.' % (len (self.findings),
+            len (self.findings) == 1 and 'query' or 'queries'))
+
+      for finding in self.findings:
+         sb.newline ()
+         sb.println ('%s:' % finding.getQuery ().name)
+
+         with sb:
+            sb.println (finding.getMessage ())
+            sb.println (finding.getQuery ().sql)
+
+      return sb
+
+
+   def __repr__ (self):
+      return str (self.toStringBuilder ())
+
@@ -0,0 +1,200 @@
+#
+# OutputManifest
+#
+# A record of the files written by a generator and the
+# hashes of their contents.
+#
+# (c) September 2011 Lee Supe (lain_proliant)
+# Released under the GNU General Public License, version 3.
+#
+
+import hashlib
+import json
+import os
+import tempfile
+
+#--------------------------------------------------------------------
+class OutputManifest (object):
+   """
+      Records the content hash, size and modification time of
+      each file written by a generator, keyed by its path
+      relative to the output directory.
+
+      This allows a generator to tell which of its outputs are
+      unchanged since the previous run without reading them,
+      and to leave those files untouched.
+   """
+
+   # The name of the manifest file within the output directory.
+   FILENAME = '.pydao-manifest'
+
+   # Increment whenever the layout of the manifest changes.
+   VERSION = 1
+
+   def __init__ (self, outputDir):
+      """
+         Initializes an OutputManifest for the given output
+         directory, loading the existing manifest if there is one.
+      """
+
+      self.outputDir = outputDir
+      self.path = os.path.join (outputDir, self.FILENAME)
+      self.entries = {}
+
+      self.load ()
+
+
+   def load (self):
+      """
+         Loads the manifest file.  A missing or unreadable
+         manifest is treated as empty.
+      """
+
+      try:
+         with open (self.path, 'rb') as infile:
+            manifest = json.load (infile)
+
+      except (IOError, ValueError):
+         return
+
+      if isinstance (manifest, dict) and manifest.get ('version') == self.VERSION:
+         self.entries = manifest ['files']
+
+
+   def save (self):
+      """
+         Writes the manifest file, replacing it atomically.
+      """
+
+      manifest = {
+            'version': self.VERSION,
+            'files': self.entries
+            }
+
+      writeFileAtomically (self.path, json.dumps (manifest, indent = 1, sort_keys = True))
+
+
+   def getPath (self, filename):
+      """
+         Gets the full path of the given output file.
+      """
+
+      return os.path.join (self.outputDir, filename)
+
+
+   def isCurrent (self, filename, digest):
+      """
+         Returns whether the given output file exists and
+         already has contents with the given hash.
+
+         The file is only read if its size or modification time
+         differ from those in the manifest, e.g. because it was
+         touched or the manifest is missing.  If its contents
+         turn out to be current, the manifest is updated to
+         match the file.
+      """
+
+      path = self.getPath (filename)
+
+      try:
+         stat = os.stat (path)
+
+      except OSError:
+         return False
+
+      entry = self.entries.get (filename)
+
+      if entry is not None and entry ['hash'] == digest and \
+            entry ['size'] == stat.st_size and entry ['mtime'] == stat.st_mtime:
+         return True
+
+      with open (path, 'rb') as infile:
+         if hashContent (infile.read ()) != digest:
+            return False
+
+      self.record (filename, digest)
+      return True
+
+
+   def record (self, filename, digest):
+      """
+         Records the hash of the given output file along
+         with its current size and modification time.
+      """
+
+      stat = os.stat (self.getPath (filename))
+
+      self.entries [filename] = {
+            'hash': digest,
+            'size': stat.st_size,
+            'mtime': stat.st_mtime
+            }
+
+
+   def retain (self, filenames):
+      """
+         Forgets all of the files except the given ones.
+      """
+
+      filenames = set (filenames)
+
+      for filename in self.entries.keys ():
+         if filename not in filenames:
+            del self.entries [filename]
+
+#--------------------------------------------------------------------
+def hashContent (content):
+   """
+      Computes the hash of the given file contents.
+   """
+
+   if isinstance (content, unicode):
+      content = content.encode ('utf-8')
+
+   return hashlib.sha1 (content).hexdigest ()
+
+#--------------------------------------------------------------------
+def writeFileAtomically (path, content):
+   """
+      Writes the given contents to the given path by way of
+      a temporary file in the same directory, so that readers
+      never observe a partially written file.
+
+      A file which already exists keeps its permissions;
+      a new file is created with the default permissions of
+      the process.
+   """
+
+   if isinstance (content, unicode):
+      content = content.encode ('utf-8')
+
+   directory = os.path.dirname (os.path.abspath (path))
+   fd, tempPath = tempfile.mkstemp (dir = directory, prefix = '.pydao-')
+
+   try:
+      with os.fdopen (fd, 'wb') as outfile:
+         outfile.write (content)
+
+      try:
+         mode = os.stat (path).st_mode & 07777
+
+      except OSError:
+         mode = 0666 & ~getUmask ()
+
+      os.chmod (tempPath, mode)
+      os.rename (tempPath, path)
+
+   except:
+      os.remove (tempPath)
+      raise
+
+#--------------------------------------------------------------------
+def getUmask ():
+   """
+      Gets the file mode creation mask of the process.
+   """
+
+   umask = os.umask (0)
+   os.umask (umask)
+   return umask
+
@@ -0,0 +1,110 @@
+#
+# ParallelGenerator
+#
+# Runs a generator across a pool of worker processes.
+#
+# (c) September 2011 Lee Supe (lain_proliant)
+# Released under the GNU General Public License, version 3.
+#
+
+import multiprocessing
+
+from GeneratorException import *
+
+#--------------------------------------------------------------------
+# The generator used by a worker process, set by initWorker ().
+workerGenerator = None
+
+def initWorker (generator):
+   """
+      Initializes a worker process with the generator to run.
+   """
+
+   global workerGenerator
+   workerGenerator = generator
+
+
+def generateTableByName (tableName):
+   """
+      Generates source code for the named table of the
+      worker's schema.  Runs in a worker process.
+   """
+
+   table = workerGenerator.getSchema ().getTable (tableName)
+   return workerGenerator.generateTable (table)
+
+#--------------------------------------------------------------------
+class ParallelGenerator (object):
+   """
+      Drives a generator, running its generateTable () method
+      for many tables at once in a pool of worker processes.
+
+      The generator, including its schema, is handed to each
+      worker process once when the pool starts; afterwards only
+      table names are sent to the workers and generated sources
+      sent back.  The sources are collected in table order and
+      written by the generator in the parent process, so the
+      output is identical to that of GeneratorBase.generate ().
+
+      The generator must be picklable on platforms which do not
+      fork, and generateTable () must not depend on state built
+      up by previous calls.
+   """
+
+   def __init__ (self, generator, jobs = None):
+      """
+         Initializes a ParallelGenerator.
+
+         generator:
+            The GeneratorBase to run.
+
+         jobs:
+            The number of worker processes, or None to use
+            one per CPU.  With a single job, the tables are
+            generated in this process.
+      """
+
+      if jobs is None:
+         jobs = multiprocessing.cpu_count ()
+
+      if jobs < 1:
+         raise GeneratorException ('The number of jobs must be at least 1, got %d.' % jobs)
+
+      self.generator = generator
+      self.jobs = jobs
+
+
+   def generate (self):
+      """
+         Generates source code for every table in the schema
+         and writes it to the output directory.
+
+         Returns the list of filenames which were written.
+      """
+
+      tableNames = [table.getName () for table in self.generator.getSchema ().getAllTables ()]
+
+      if self.jobs == 1 or len (tableNames) < 2:
+         return self.generator.generate ()
+
+      self.generator.checkIndexes ()
+
+      pool = multiprocessing.Pool (self.jobs, initWorker, (self.generator,))
+
+      try:
+         results = pool.map (generateTableByName, tableNames)
+         pool.close ()
+
+      finally:
+         pool.terminate ()
+         pool.join ()
+
+      for filename, source in self.generator.generateCommon ():
+         self.generator.addOutput (filename, source)
+
+      for outputs in results:
+         for filename, source in outputs:
+            self.generator.addOutput (filename, source)
+
+      return self.generator.writeOutput ()
+
@@ -9,8 +9,14 @@
 # Released under the GNU General Public License, version 3.
 #
 
+import hashlib
+import itertools
+from abc import ABCMeta, abstractmethod
+from xml.sax.saxutils import escape
+
 from PyDAOException import *
 from IndentWriter import *
+from ForeignKeyGraph import *
 
 #--------------------------------------------------------------------
 class SchemaException (PyDAOException): pass
@@ -19,6 +25,240 @@ class TableSchemaException (SchemaException): pass
 class ColumnSchemaException (SchemaException): pass
 class IndexSchemaException (SchemaException): pass
 
+#--------------------------------------------------------------------
+def structuralHash (*fields):
+   """
+      Computes a stable hexadecimal digest of the given fields.
+
+      Used to fingerprint the structure of schema objects.
+      The digest does not depend on the process or platform,
+      so it may be stored and compared across runs.
+   """
+
+   digest = hashlib.sha1 ()
+
+   for field in fields:
+      if isinstance (field, unicode):
+         field = field.encode ('utf-8')
+
+      else:
+         field = str (field)
+
+      digest.update ('%d:%s;' % (len (field), field))
+
+   return digest.hexdigest ()
+
+#--------------------------------------------------------------------
+# Counts the changes made to the columns and indexes of any table,
+# so that a cached ForeignKeyGraph can tell in constant time whether
+# a table may have changed since it was built.  Tables may be shared
+# between schemas, so the count is kept for all of them at once.
+tableGeneration = 0
+
+def getTableGeneration ():
+   """
+      Gets the number of changes made so far to any table.
+   """
+
+   return tableGeneration
+
+
+def nextTableGeneration ():
+   """
+      Records a change to the columns or indexes of a table.
+   """
+
+   global tableGeneration
+   tableGeneration += 1
+
+#--------------------------------------------------------------------
+def internString (value):
+   """
+      Interns the given value if it is a byte string, so that
+      equal strings repeated throughout a schema, such as data
+      types and column names, share a single object.
+   """
+
+   if type (value) is str:
+      return intern (value)
+
+   return value
+
+#--------------------------------------------------------------------
+def escapeAttribute (value):
+   """
+      Escapes the given string for use as the value of a
+      double-quoted attribute in a schema's representation.
+   """
+
+   return escape (value, {'"': '&quot;'})
+
+#--------------------------------------------------------------------
+class OrderedNameMap (object):
+   """
+      A sequence of named values, kept in the order in which
+      they were added, with constant time lookups, additions,
+      replacements and removals by name.
+
+      Removing a value leaves a hole in the sequence, which is
+      closed up the next time the sequence is read in full, or
+      once half of it is holes.  Removing many values one by one
+      therefore costs time linear in their number rather than
+      quadratic, as list.remove () would.
+   """
+
+   __slots__ = ('names', 'values', 'positions', 'holes')
+
+   def __init__ (self):
+      """
+         Initializes an empty OrderedNameMap.
+      """
+
+      # The names and values, in order, with None in both
+      # at the position of each removed value.
+      self.names = []
+      self.values = []
+
+      # A map of names to their positions in the lists above.
+      self.positions = {}
+
+      # The number of removed values not yet closed up.
+      self.holes = 0
+
+
+   def __len__ (self):
+      return len (self.positions)
+
+
+   def __contains__ (self, name):
+      return name in self.positions
+
+
+   def get (self, name):
+      """
+         Gets the value with the given name, or None.
+      """
+
+      position = self.positions.get (name)
+
+      if position is None:
+         return None
+
+      return self.values [position]
+
+
+   def add (self, name, value):
+      """
+         Adds the given value under the given name, which must
+         not already be present, at the end of the sequence.
+      """
+
+      self.positions [name] = len (self.names)
+      self.names.append (name)
+      self.values.append (value)
+
+
+   def replace (self, name, value):
+      """
+         Replaces the value with the given name, which must be
+         present, keeping its position in the sequence.
+      """
+
+      self.values [self.positions [name]] = value
+
+
+   def remove (self, name):
+      """
+         Removes the value with the given name, if present.
+      """
+
+      position = self.positions.pop (name, None)
+
+      if position is not None:
+         self.names [position] = None
+         self.values [position] = None
+         self.holes += 1
+
+         if self.holes * 2 > len (self.names):
+            self.compact ()
+
+
+   def removeAll (self, names):
+      """
+         Removes the values with any of the given names.
+      """
+
+      for name in names:
+         position = self.positions.pop (name, None)
+
+         if position is not None:
+            self.names [position] = None
+            self.values [position] = None
+            self.holes += 1
+
+      self.compact ()
+
+
+   def retain (self, predicate):
+      """
+         Removes every value for which the given function
+         returns False, in a single pass.
+      """
+
+      for position, value in enumerate (self.values):
+         if self.names [position] is not None and not predicate (value):
+            del self.positions [self.names [position]]
+            self.names [position] = None
+            self.values [position] = None
+            self.holes += 1
+
+      self.compact ()
+
+
+   def compact (self):
+      """
+         Closes up the holes left by removed values.
+      """
+
+      if self.holes:
+         self.values = [value for name, value in zip (self.names, self.values)
+               if name is not None]
+         self.names = [name for name in self.names if name is not None]
+         self.positions = dict ((name, position)
+               for position, name in enumerate (self.names))
+         self.holes = 0
+
+
+   def getNames (self):
+      """
+         Gets a list of the names, in order.
+      """
+
+      self.compact ()
+      return list (self.names)
+
+
+   def iterNamesAfter (self, name):
+      """
+         Iterates over the names following the given name,
+         which must be present, in order.  The map must not
+         be changed during the iteration.
+      """
+
+      self.compact ()
+
+      for position in xrange (self.positions [name] + 1, len (self.names)):
+         yield self.names [position]
+
+
+   def getValues (self):
+      """
+         Gets a list of the values, in order.
+      """
+
+      self.compact ()
+      return list (self.values)
+
 #--------------------------------------------------------------------
 class DatabaseSchema (object):
    """
@@ -31,9 +271,16 @@ class DatabaseSchema (object):
       """
 
       self.name = databaseName
-      self.tables = []
 
-      self.tableMap = {}
+      # The tables of the database, in order, by name.
+      self.tables = OrderedNameMap ()
+
+      # The cached ForeignKeyGraph of the database, or None.
+      self.foreignKeyGraph = None
+
+      # The table generation when the cached ForeignKeyGraph
+      # was built; see getTableGeneration ().
+      self.foreignKeyGraphGeneration = None
 
    
    def getName (self):
@@ -50,10 +297,19 @@ class DatabaseSchema (object):
       """
       
       if self.hasTable (table.getName ()):
-         raise DatabaseSchemaException ('A table by this name already exists: "%s"' % table.name)
+         raise DatabaseSchemaException ('A table by this name already exists: "%s"' % table.getName ())
+
+      self.tables.add (table.getName (), table)
+      self.resetForeignKeyGraph ()
 
-      self.tables.append (table)
-      self.tableMap [table.getName ()] = table
+
+   def addTables (self, tables):
+      """
+         Adds each of the given tables to the database, in order.
+      """
+
+      for table in tables:
+         self.addTable (table)
 
    
    def getTable (self, tableName):
@@ -61,11 +317,7 @@ class DatabaseSchema (object):
          Gets the named table if it exists.
       """
 
-      if self.hasTable (tableName):
-         return self.tableMap [tableName]
-
-      else:
-         return None
+      return self.tables.get (tableName)
 
 
    def getAllTables (self):
@@ -73,15 +325,16 @@ class DatabaseSchema (object):
          Gets all of the tables in the database.
       """
 
-      return self.tables
+      return self.tables.getValues ()
 
 
    def getTableNames (self):
       """
-         Gets all of the names of the tables in the database.
+         Gets all of the names of the tables in the database,
+         in order.
       """
 
-      return self.tableMap.keys ()
+      return self.tables.getNames ()
 
 
    def hasTable (self, tableName):
@@ -89,7 +342,7 @@ class DatabaseSchema (object):
          Gets whether the database contains the named table.
       """
 
-      return self.tableMap.has_key (tableName)
+      return tableName in self.tables
 
 
    def removeTable (self, tableName):
@@ -97,25 +350,223 @@ class DatabaseSchema (object):
          Removes the given named table if it exists.
       """
 
-      if self.hasTable (tableName):
-         table = getTable (tableName)
-         del tableMap [tableName]
-         self.tables.remove (table)
+      self.tables.remove (tableName)
+      self.resetForeignKeyGraph ()
+
+
+   def removeTables (self, tableNames):
+      """
+         Removes those of the named tables which exist.
+      """
+
+      self.tables.removeAll (tableNames)
+      self.resetForeignKeyGraph ()
+
+
+   def retainTables (self, predicate):
+      """
+         Removes every table for which the given function,
+         called with the TableSchema, returns False.
+      """
+
+      self.tables.retain (predicate)
+      self.resetForeignKeyGraph ()
+
+
+   def getForeignKeyGraph (self):
+      """
+         Gets the ForeignKeyGraph of the database, from which the
+         tables referencing or referenced by any table, and the
+         order of the tables by their dependencies, can be found
+         without scanning the schema.
+
+         The graph is built on first use and cached.  It is
+         rebuilt when tables are added to or removed from the
+         database, and when the columns or indexes of any table
+         have been changed in place since it was built, e.g. by
+         MySQLSchematizer.patchTable ().
+      """
+
+      if self.foreignKeyGraph is None or self.foreignKeyGraphGeneration != getTableGeneration ():
+         self.foreignKeyGraph = ForeignKeyGraph (self)
+         self.foreignKeyGraphGeneration = getTableGeneration ()
+
+      return self.foreignKeyGraph
+
+
+   def resetForeignKeyGraph (self):
+      """
+         Discards the cached ForeignKeyGraph of the database.
+      """
+
+      self.foreignKeyGraph = None
+      self.foreignKeyGraphGeneration = None
+
+
+   def getStructuralHash (self):
+      """
+         Gets a digest of the structure of the database,
+         computed from the structural hashes of its tables.
+
+         The name of the database and the order of its tables
+         do not contribute to the digest, so identically
+         shaped databases have the same structural hash.
+      """
+
+      tableHashes = sorted (table.getStructuralHash () for table in self.getAllTables ())
+      return structuralHash (len (tableHashes), *tableHashes)
 
    
-   def __repr__ (self):
-      sb = IndentStringBuilder ()
+   def printTo (self, printer):
+      """
+         Prints the representation of the database to the given
+         IndentWriter or IndentStringBuilder, embedding the
+         representation of each table.
+
+         Each table is built and embedded in turn, so printing
+         to an IndentWriter streams the representation without
+         holding more than one table's worth of it in memory.
+      """
 
-      sb.println ('<database name="%s">' % self.getName ())
+      printer.println ('<database name="%s">' % escapeAttribute (self.getName ()))
       
-      with sb:
+      with printer:
          for table in self.getAllTables ():
-            sb.printLines (str (table))
-            sb.newline ()
+            printer.embed (table.toStringBuilder ())
+            printer.newline ()
+
+      printer.println ('</database>')
+
+
+   def toStringBuilder (self):
+      """
+         Builds the representation of the database,
+         embedding the representation of each table.
+      """
+
+      sb = IndentStringBuilder ()
+      self.printTo (sb)
+
+      return sb
+
+
+   def __repr__ (self):
+      return str (self.toStringBuilder ())
+
+
+#--------------------------------------------------------------------
+class LazyDatabaseSchema (DatabaseSchema):
+   """
+      A DatabaseSchema which knows the names of all of its
+      tables up front, but only loads each TableSchema when
+      it is first accessed.
+
+      Subclasses implement loadTables () to fetch tables from
+      wherever they are stored.  Tables are loaded by getTable (),
+      getAllTables () and retainTables (), and by anything which
+      calls them; getTableNames (), hasTable (), removeTable ()
+      and removeTables () never load a table.
+
+      A number of tables to prefetch may be given, in which case
+      whenever tables are loaded, up to that many unloaded tables
+      following them are loaded along with them.  This pays off
+      when tables are visited in order and loading several tables
+      at once costs little more than loading one.
+   """
+
+   __metaclass__ = ABCMeta
+
+   def __init__ (self, databaseName, tableNames, prefetch = 0):
+      """
+         Initializes a LazyDatabaseSchema with the names
+         of its tables, in order, and the number of tables
+         to prefetch.
+      """
+
+      DatabaseSchema.__init__ (self, databaseName)
+
+      self.prefetch = prefetch
+
+      # Unloaded tables map to None.
+      for tableName in tableNames:
+         self.tables.add (tableName, None)
+
+
+   @abstractmethod
+   def loadTables (self, tableNames):
+      """
+         Loads the named tables, returning a list of TableSchema
+         objects in the same order as the given names.
+
+         This method is abstract and must be implemented
+         by subclasses.
+      """
+
+      pass
+
+
+   def isTableLoaded (self, tableName):
+      """
+         Returns whether the named table exists and has been loaded.
+      """
+
+      return self.tables.get (tableName) is not None
+
+
+   def ensureTablesLoaded (self, tableNames):
+      """
+         Loads those of the named tables which exist but have
+         not been loaded yet, and any tables to prefetch, with a
+         single call to loadTables ().
+      """
+
+      unloadedNames = [tableName for tableName in tableNames
+            if self.hasTable (tableName) and not self.isTableLoaded (tableName)]
 
-      sb.println ('</database>')
+      if unloadedNames and self.prefetch:
+         requestedNames = set (unloadedNames)
+         followingNames = (tableName for tableName in self.tables.iterNamesAfter (unloadedNames [-1])
+               if tableName not in requestedNames and not self.isTableLoaded (tableName))
 
-      return str (sb)
+         unloadedNames.extend (itertools.islice (followingNames, self.prefetch))
+
+      if unloadedNames:
+         for table in self.loadTables (unloadedNames):
+            self.tables.replace (table.getName (), table)
+
+
+   def getTable (self, tableName):
+      """
+         Gets the named table if it exists, loading it
+         if necessary.
+      """
+
+      if not self.hasTable (tableName):
+         return None
+
+      self.ensureTablesLoaded ([tableName])
+      return self.tables.get (tableName)
+
+
+   def getAllTables (self):
+      """
+         Gets all of the tables in the database, loading
+         any which have not been loaded yet.
+      """
+
+      self.ensureTablesLoaded (self.getTableNames ())
+      return DatabaseSchema.getAllTables (self)
+
+
+   def retainTables (self, predicate):
+      """
+         Removes every table for which the given function,
+         called with the TableSchema, returns False.  Any
+         tables not yet loaded are loaded first.
+      """
+
+      self.ensureTablesLoaded (self.getTableNames ())
+      DatabaseSchema.retainTables (self, predicate)
 
 
 #--------------------------------------------------------------------
@@ -123,6 +574,9 @@ class TableSchema (object):
    """
       An abstract representation of a table in a database.
    """
+
+   __slots__ = ('tableName', 'columns', 'indexes', 'primaryKey',
+         'fingerprint', 'structuralHash')
    
    def __init__ (self, tableName):
       """
@@ -130,24 +584,23 @@ class TableSchema (object):
       """
    
       # The name of the table.
-      self.tableName = tableName
+      self.tableName = internString (tableName)
 
-      # A sequential list of the columns in the table.
-      self.columns = []
+      # The columns in the table, in order, by name.
+      self.columns = OrderedNameMap ()
 
-      # A list of the indexes in the table.
-      self.indexes = []
+      # The indexes in the table, in order, by name.
+      self.indexes = OrderedNameMap ()
 
       # An list of zero or more columns in the table's primary key.
       self.primaryKey = []
-      
-      # A map of column names to columns, for fast lookups.
-      # columnName: col
-      self.columnMap = {}
 
-      # A map of index names to indexes, for fast lookups.
-      # indexName: index
-      self.indexMap = {}
+      # An opaque value supplied by the schematizer which changes
+      # whenever the table's definition may have changed, or None.
+      self.fingerprint = None
+
+      # The cached structural hash of the table, or None.
+      self.structuralHash = None
 
    
    def getName (self):
@@ -158,16 +611,34 @@ class TableSchema (object):
       return self.tableName
 
 
+   def getFingerprint (self):
+      """
+         Gets the schematizer-specific fingerprint of this table,
+         or None if the table has no fingerprint.
+      """
+
+      return self.fingerprint
+
+
+   def setFingerprint (self, fingerprint):
+      """
+         Sets the schematizer-specific fingerprint of this table.
+      """
+
+      self.fingerprint = fingerprint
+
+
    def addColumn (self, column):
       """
          Adds the given column to the table.
       """
       
       if self.hasColumn (column.getName ()):
-         raise TableSchemaException ('A column by the name "%s" already exists in the table "%s"' % (column.getName (), table.getName ()))
+         raise TableSchemaException ('A column by the name "%s" already exists in the table "%s"' % (column.getName (), self.getName ()))
 
-      self.columns.append (column)
-      self.columnMap [column.name] = column
+      self.columns.add (column.getName (), column)
+      column.owner = self
+      self.resetStructuralHash ()
 
 
    def getColumn (self, columnName):
@@ -175,10 +646,7 @@ class TableSchema (object):
          Gets the named column if it exists.
       """
 
-      if self.hasColumn (columnName):
-         return self.columnMap [columnName]
-      else:
-         return None
+      return self.columns.get (columnName)
 
 
    def getAllColumns (self):
@@ -186,15 +654,15 @@ class TableSchema (object):
          Gets a list of all columns in the table.
       """
 
-      return self.columns
+      return self.columns.getValues ()
 
 
    def getColumnNames (self):
       """
-         Gets a list of all column names in the table.
+         Gets a list of all column names in the table, in order.
       """
 
-      return self.columnMap.keys ()
+      return self.columns.getNames ()
 
 
    def hasColumn (self, columnName):
@@ -202,7 +670,7 @@ class TableSchema (object):
          Checks if the table contains the named column.
       """
       
-      return self.columnMap.has_key (columnName)
+      return columnName in self.columns
 
 
    def removeColumn (self, columnName):
@@ -211,9 +679,31 @@ class TableSchema (object):
       """
 
       if self.hasColumn (columnName):
-         column = self.getColumn (columnName)
-         del self.columnMap [columnName]
-         self.columns.remove (column)
+         self.columns.remove (columnName)
+         self.resetStructuralHash ()
+
+
+   def removeColumns (self, columnNames):
+      """
+         Removes those of the named columns which exist.
+      """
+
+      self.columns.removeAll (columnNames)
+      self.resetStructuralHash ()
+
+
+   def replaceColumn (self, column):
+      """
+         Replaces the column of the same name with the given
+         column, keeping its position in the table.
+      """
+
+      if not self.hasColumn (column.getName ()):
+         raise TableSchemaException ('There is no column by the name "%s" in the table "%s"' % (column.getName (), self.getName ()))
+
+      self.columns.replace (column.getName (), column)
+      column.owner = self
+      self.resetStructuralHash ()
 
    
    def addIndex (self, index):
@@ -221,8 +711,12 @@ class TableSchema (object):
          Adds the given index to the table.
       """
 
-      self.indexes.append (index)
-      self.indexMap [index.name] = index
+      if self.hasIndex (index.getName ()):
+         raise TableSchemaException ('An index by the name "%s" already exists in the table "%s"' % (index.getName (), self.getName ()))
+
+      self.indexes.add (index.getName (), index)
+      index.owner = self
+      self.resetStructuralHash ()
 
    
    def getIndex (self, indexName):
@@ -230,10 +724,7 @@ class TableSchema (object):
          Gets the named index if it exists.
       """
 
-      if self.hasIndex (indexName):
-         return self.indexMap [indexName]
-      else:
-         return None
+      return self.indexes.get (indexName)
 
 
    def getAllIndexes (self):
@@ -241,15 +732,15 @@ class TableSchema (object):
          Gets a list of all indexes.
       """
 
-      return self.indexes
+      return self.indexes.getValues ()
 
 
    def getIndexNames (self):
       """
-         Gets a list of all index names.
+         Gets a list of all index names, in order.
       """
 
-      return self.indexMap.keys ()
+      return self.indexes.getNames ()
 
 
    def hasIndex (self, indexName):
@@ -257,7 +748,7 @@ class TableSchema (object):
          Checks if the table contains the named index.
       """
 
-      return self.indexMap.has_key (indexName)
+      return indexName in self.indexes
 
 
    def removeIndex (self, indexName):
@@ -266,29 +757,90 @@ class TableSchema (object):
       """
       
       if self.hasIndex (indexName):
-         index = self.getIndex (indexName)
-         del self.indexMap [indexName]
-         self.indexes.remove (index)
+         self.indexes.remove (indexName)
+         self.resetStructuralHash ()
 
 
-   def __repr__ (self):
-      sb = IndentStringBuilder ()
-      
-      sb.println ('<table name="%s">' % self.getName ())
-      
-      with sb:
-         for column in self.getAllColumns ():
-            sb.printLines (str (column))
-      
-      sb.newline ()
-   
+   def removeIndexes (self, indexNames):
+      """
+         Removes those of the named indexes which exist.
+      """
+
+      self.indexes.removeAll (indexNames)
+      self.resetStructuralHash ()
+
+
+   def replaceIndex (self, index):
+      """
+         Replaces the index of the same name with the given
+         index, keeping its position in the table.
+      """
+
+      if not self.hasIndex (index.getName ()):
+         raise TableSchemaException ('There is no index by the name "%s" in the table "%s"' % (index.getName (), self.getName ()))
+
+      self.indexes.replace (index.getName (), index)
+      index.owner = self
+      self.resetStructuralHash ()
+
+
+   def getStructuralHash (self):
+      """
+         Gets a digest of the structure of the table: its name,
+         its columns in order and its indexes in any order.
+
+         The digest is cached, and recomputed only after the
+         columns or indexes of the table, or the constraints of
+         its indexes, are changed.
+      """
+
+      if self.structuralHash is None:
+         columnHashes = [column.getStructuralHash () for column in self.getAllColumns ()]
+         indexHashes = sorted (index.getStructuralHash () for index in self.getAllIndexes ())
+
+         self.structuralHash = structuralHash (self.getName (),
+               len (columnHashes), *(columnHashes + indexHashes))
+
+      return self.structuralHash
+
+
+   def resetStructuralHash (self):
+      """
+         Discards the cached structural hash of the table, and
+         any ForeignKeyGraph built while it had that structure.
+      """
+
+      self.structuralHash = None
+      nextTableGeneration ()
+
+
+   def toStringBuilder (self):
+      """
+         Builds the representation of the table, embedding
+         the representations of its columns and indexes.
+      """
+
+      sb = IndentStringBuilder ()
+      
+      sb.println ('<table name="%s">' % escapeAttribute (self.getName ()))
+      
+      with sb:
+         for column in self.getAllColumns ():
+            sb.embed (str (column))
+      
+      sb.newline ()
+   
       with sb:
          for index in self.getAllIndexes ():
-            sb.printLines (str (index))
+            sb.embed (index.toStringBuilder ())
 
       sb.println ('</table>')
       
-      return str (sb)
+      return sb
+
+
+   def __repr__ (self):
+      return str (self.toStringBuilder ())
 
 #--------------------------------------------------------------------
 class ColumnSchema (object):
@@ -296,13 +848,15 @@ class ColumnSchema (object):
       An abstract representation of a column in a database table.
    """
 
+   __slots__ = ('name', 'datatype', 'isNullableVal', 'extra', 'structuralHash', 'owner')
+
    def __init__ (self, name, datatype, isNullable, extra):
       """
          Initializes a ColumnSchema.
       """
 
-      self.name = name
-      self.datatype = datatype
+      self.name = internString (name)
+      self.datatype = internString (datatype)
    
       if isNullable == 'YES':
          self.isNullableVal = True
@@ -313,7 +867,11 @@ class ColumnSchema (object):
       else:
          raise ColumnSchemaException ('An unexpected value was encountered for field: isNullable = "%s"' % isNullable)
 
-      self.extra = extra
+      self.extra = internString (extra)
+      self.structuralHash = None
+
+      # The table to which the column was added, or None.
+      self.owner = None
 
    
    def getName (self):
@@ -348,11 +906,52 @@ class ColumnSchema (object):
       return self.extra
 
 
+   def getStructuralHash (self):
+      """
+         Gets a digest of the definition of the column.
+      """
+
+      if self.structuralHash is None:
+         self.structuralHash = structuralHash (self.getName (),
+               self.getDataType (), self.isNullable (), self.getExtra ())
+
+      return self.structuralHash
+
+
+   def resetStructuralHash (self):
+      """
+         Discards the cached structural hash of the column,
+         and that of the table to which it was added.
+      """
+
+      self.structuralHash = None
+
+      if self.owner is not None:
+         self.owner.resetStructuralHash ()
+
+
+   def isEquivalent (self, other):
+      """
+         Returns whether the given column has the same
+         definition as this column.
+      """
+
+      return self.getStructuralHash () == other.getStructuralHash ()
+
+
    def __repr__ (self):
-      s = '<column name="%s" type="%s" nullable="%s"/>\n' % (
-            self.getName (),
-            self.getDataType (),
-            self.isNullable ())
+      if self.getExtra ():
+         s = '<column name="%s" type="%s" nullable="%s" extra="%s"/>\n' % (
+               escapeAttribute (self.getName ()),
+               escapeAttribute (self.getDataType ()),
+               self.isNullable (),
+               escapeAttribute (self.getExtra ()))
+
+      else:
+         s = '<column name="%s" type="%s" nullable="%s"/>\n' % (
+               escapeAttribute (self.getName ()),
+               escapeAttribute (self.getDataType ()),
+               self.isNullable ())
    
       return s
 
@@ -367,24 +966,31 @@ class IndexSchema (object):
       unique indexes, composite keys/indexes, and foreign keys. 
    """
 
+   __slots__ = ('name', 'isUniqueVal', 'constraint', 'structuralHash', 'columns', 'owner')
+
    def __init__ (self, indexName, isUnique):
       """
          Initializes an Index.
       """
 
-      self.name = indexName
+      self.name = internString (indexName)
       self.isUniqueVal = not isUnique
       self.constraint = None
+      self.structuralHash = None
 
       self.columns = []
 
+      # The table to which the index was added, or None.
+      self.owner = None
+
    
    def addColumn (self, columnName):
       """
          Adds the named column to the index.
       """
       
-      self.columns.append (columnName)
+      self.columns.append (internString (columnName))
+      self.resetStructuralHash ()
 
 
    def getColumns (self):
@@ -411,6 +1017,11 @@ class IndexSchema (object):
 
       self.constraint = constraint
 
+      if constraint is not None:
+         constraint.owner = self
+
+      self.resetStructuralHash ()
+
 
    def getName (self):
       """
@@ -430,20 +1041,71 @@ class IndexSchema (object):
       return self.isUniqueVal
 
 
-   def __repr__ (self):
+   def getStructuralHash (self):
+      """
+         Gets a digest of the definition of the index,
+         including its constraint.
+      """
+
+      if self.structuralHash is None:
+         if self.getConstraint () is None:
+            constraintHash = None
+
+         else:
+            constraintHash = self.getConstraint ().getStructuralHash ()
+
+         self.structuralHash = structuralHash (self.getName (),
+               self.isUnique (), constraintHash, *self.getColumns ())
+
+      return self.structuralHash
+
+
+   def resetStructuralHash (self):
+      """
+         Discards the cached structural hash of the index,
+         and that of the table to which it was added.
+      """
+
+      self.structuralHash = None
+
+      if self.owner is not None:
+         self.owner.resetStructuralHash ()
+
+
+   def isEquivalent (self, other):
+      """
+         Returns whether the given index has the same
+         definition and constraint as this index.
+      """
+
+      return self.getStructuralHash () == other.getStructuralHash ()
+
+
+   def toStringBuilder (self):
+      """
+         Builds the representation of the index.
+      """
+
       sb = IndentStringBuilder ()
       
       sb.println ('<index name="%s" unique="%s">' % (
-            self.getName (),
+            escapeAttribute (self.getName ()),
             str (self.isUnique ())))
       
       with sb:
          for column in self.getColumns ():
-            sb.println ('<column name="%s"/>' % column)
+            sb.println ('<column name="%s"/>' % escapeAttribute (column))
+
+         if self.getConstraint () is not None:
+            sb.embed (self.getConstraint ().toStringBuilder ())
    
       sb.println ('</index>')
 
-      return str (sb)
+      return sb
+
+
+   def __repr__ (self):
+      return str (self.toStringBuilder ())
 
 
 #--------------------------------------------------------------------
@@ -458,6 +1120,8 @@ class Constraint (object):
       regarding what type and how many parameters to return from
       generated methods, and what sorts of exceptions to expect.
    """
+
+   __slots__ = ('constraintType', 'columns', 'structuralHash', 'owner')
    
    def __init__ (self, constraintType):
       """
@@ -466,6 +1130,10 @@ class Constraint (object):
 
       self.constraintType = constraintType
       self.columns = []
+      self.structuralHash = None
+
+      # The index on which the constraint was set, or None.
+      self.owner = None
    
    
    def addColumn (self, columnName):
@@ -473,7 +1141,8 @@ class Constraint (object):
          Adds the named column to the constraint.
       """
 
-      self.columns.append (columnName)
+      self.columns.append (internString (columnName))
+      self.resetStructuralHash ()
 
 
    def getColumns (self):
@@ -484,19 +1153,75 @@ class Constraint (object):
       return self.columns
 
 
-   def getType ():
+   def getType (self):
       """
          Gets the type of the constraint.
       """
       return self.constraintType
 
 
+   def getStructuralHash (self):
+      """
+         Gets a digest of the type and columns of the constraint.
+      """
+
+      if self.structuralHash is None:
+         self.structuralHash = structuralHash (self.getType (), *self.getColumns ())
+
+      return self.structuralHash
+
+
+   def resetStructuralHash (self):
+      """
+         Discards the cached structural hash of the constraint,
+         and that of the index on which it was set.
+      """
+
+      self.structuralHash = None
+
+      if self.owner is not None:
+         self.owner.resetStructuralHash ()
+
+
+   def isEquivalent (self, other):
+      """
+         Returns whether the given constraint has the same
+         definition as this constraint.
+      """
+
+      return self.getStructuralHash () == other.getStructuralHash ()
+
+
+   def toStringBuilder (self):
+      """
+         Builds the representation of the constraint.
+      """
+
+      sb = IndentStringBuilder ()
+
+      sb.println ('<constraint type="%s">' % self.getType ())
+
+      with sb:
+         for column in self.getColumns ():
+            sb.println ('<column name="%s"/>' % escapeAttribute (column))
+
+      sb.println ('</constraint>')
+
+      return sb
+
+
+   def __repr__ (self):
+      return str (self.toStringBuilder ())
+
+
 #--------------------------------------------------------------------
 class UniqueConstraint (Constraint):
    """
       An object representing a unique key constraint.
    """
 
+   __slots__ = ()
+
    def __init__ (self):
       """
          Initializes a UniqueConstraint.
@@ -511,6 +1236,8 @@ class PrimaryKeyConstraint (Constraint):
       An object representing a primary key constraint.
    """
 
+   __slots__ = ()
+
    def __init__ (self):
       """
          Initializes a PrimaryKeyConstraint.
@@ -528,6 +1255,8 @@ class ForeignKeyConstraint (Constraint):
       into tables in different databases.
    """
 
+   __slots__ = ('columnMap', 'tableName', 'databaseName')
+
    def __init__ (self, tableName, databaseName = None):
       """
          Initializes a ForeignKeyConstraint.
@@ -545,7 +1274,8 @@ class ForeignKeyConstraint (Constraint):
          Maps the given local column to the given foreign column.
       """
 
-      self.columnMap [column] = foreignColumn
+      self.columnMap [internString (column)] = internString (foreignColumn)
+      self.resetStructuralHash ()
 
 
    def getMapping (self, column):
@@ -561,3 +1291,416 @@ class ForeignKeyConstraint (Constraint):
          return None
 
 
+   def getStructuralHash (self):
+      """
+         Gets a digest of the columns of the constraint and the
+         foreign table and columns which they reference.
+      """
+
+      if self.structuralHash is None:
+         mapping = []
+
+         for column in sorted (self.columnMap.keys ()):
+            mapping.extend ((column, self.columnMap [column]))
+
+         self.structuralHash = structuralHash (self.getType (),
+               self.tableName, self.databaseName,
+               len (self.getColumns ()), *(self.getColumns () + mapping))
+
+      return self.structuralHash
+
+
+   def toStringBuilder (self):
+      """
+         Builds the representation of the constraint,
+         including the foreign column each column references.
+      """
+
+      sb = IndentStringBuilder ()
+
+      if self.databaseName is None:
+         sb.println ('<constraint type="%s" table="%s">' % (
+               self.getType (),
+               escapeAttribute (self.tableName)))
+
+      else:
+         sb.println ('<constraint type="%s" table="%s" database="%s">' % (
+               self.getType (),
+               escapeAttribute (self.tableName),
+               escapeAttribute (self.databaseName)))
+
+      with sb:
+         for column in self.getColumns ():
+            foreignColumn = self.getMapping (column)
+
+            if foreignColumn is None:
+               sb.println ('<column name="%s"/>' % escapeAttribute (column))
+
+            else:
+               sb.println ('<column name="%s" references="%s"/>' % (
+                     escapeAttribute (column),
+                     escapeAttribute (foreignColumn)))
+
+      sb.println ('</constraint>')
+
+      return sb
+
+#--------------------------------------------------------------------
+class SchemaDiff (object):
+   """
+      The structural differences between two DatabaseSchema objects.
+
+      Tables are matched by name.  Only tables whose structural
+      hashes differ are examined further, so comparing two large
+      and mostly identical schemas costs little more than one
+      lookup per table.
+   """
+
+   def __init__ (self, oldSchema, newSchema):
+      """
+         Initializes a SchemaDiff, comparing the given old
+         schema to the given new schema.
+      """
+
+      self.oldSchema = oldSchema
+      self.newSchema = newSchema
+
+      # Tables in the new schema but not in the old one,
+      # in the order of the new schema.
+      self.addedTables = []
+
+      # Tables in the old schema but not in the new one,
+      # in the order of the old schema.
+      self.removedTables = []
+
+      # A TableSchemaDiff for each table in both schemas
+      # whose structure differs, in the order of the new schema.
+      self.changedTables = []
+
+      for table in oldSchema.getAllTables ():
+         if not newSchema.hasTable (table.getName ()):
+            self.removedTables.append (table)
+
+      for table in newSchema.getAllTables ():
+         oldTable = oldSchema.getTable (table.getName ())
+
+         if oldTable is None:
+            self.addedTables.append (table)
+
+         elif oldTable.getStructuralHash () != table.getStructuralHash ():
+            self.changedTables.append (TableSchemaDiff (oldTable, table))
+
+
+   def getAddedTables (self):
+      """
+         Gets a list of the tables which were added.
+      """
+
+      return self.addedTables
+
+
+   def getRemovedTables (self):
+      """
+         Gets a list of the tables which were removed.
+      """
+
+      return self.removedTables
+
+
+   def getChangedTables (self):
+      """
+         Gets a list of TableSchemaDiff objects, one for
+         each table whose structure changed.
+      """
+
+      return self.changedTables
+
+
+   def isEmpty (self):
+      """
+         Returns whether the two schemas are structurally identical.
+      """
+
+      return not (self.addedTables or self.removedTables or self.changedTables)
+
+
+   def toStringBuilder (self):
+      """
+         Builds a summary of the differences, embedding
+         the summary of each changed table.
+      """
+
+      sb = IndentStringBuilder ()
+
+      sb.println ('<diff old="%s" new="%s">' % (
+            escapeAttribute (self.oldSchema.getName ()),
+            escapeAttribute (self.newSchema.getName ())))
+
+      with sb:
+         for table in self.getAddedTables ():
+            sb.println ('<table name="%s" change="added"/>' % escapeAttribute (table.getName ()))
+
+         for table in self.getRemovedTables ():
+            sb.println ('<table name="%s" change="removed"/>' % escapeAttribute (table.getName ()))
+
+         for tableDiff in self.getChangedTables ():
+            sb.embed (tableDiff.toStringBuilder ())
+
+      sb.println ('</diff>')
+
+      return sb
+
+
+   def __repr__ (self):
+      return str (self.toStringBuilder ())
+
+
+#--------------------------------------------------------------------
+class TableSchemaDiff (object):
+   """
+      The structural differences between two versions of a table.
+
+      Columns and indexes are matched by name.  A constraint is
+      considered added, removed or changed when the index which
+      carries it is present in both versions of the table.
+   """
+
+   def __init__ (self, oldTable, newTable):
+      """
+         Initializes a TableSchemaDiff, comparing the given old
+         table to the given new table.
+      """
+
+      self.oldTable = oldTable
+      self.newTable = newTable
+
+      self.addedColumns = []
+      self.removedColumns = []
+
+      # A list of (oldColumn, newColumn) pairs.
+      self.changedColumns = []
+
+      # Whether the columns present in both versions of the
+      # table appear in a different order.
+      self.columnsReordered = False
+
+      self.addedIndexes = []
+      self.removedIndexes = []
+
+      # A list of (oldIndex, newIndex) pairs.
+      self.changedIndexes = []
+
+      # Lists of (indexName, constraint) pairs.
+      self.addedConstraints = []
+      self.removedConstraints = []
+
+      # A list of (indexName, oldConstraint, newConstraint) tuples.
+      self.changedConstraints = []
+
+      self.compareColumns ()
+      self.compareIndexes ()
+
+
+   def compareColumns (self):
+      """
+         Finds the columns which were added, removed or changed.
+      """
+
+      for column in self.oldTable.getAllColumns ():
+         if not self.newTable.hasColumn (column.getName ()):
+            self.removedColumns.append (column)
+
+      for column in self.newTable.getAllColumns ():
+         oldColumn = self.oldTable.getColumn (column.getName ())
+
+         if oldColumn is None:
+            self.addedColumns.append (column)
+
+         elif oldColumn.getStructuralHash () != column.getStructuralHash ():
+            self.changedColumns.append ((oldColumn, column))
+
+      oldOrder = [column.getName () for column in self.oldTable.getAllColumns ()
+            if self.newTable.hasColumn (column.getName ())]
+      newOrder = [column.getName () for column in self.newTable.getAllColumns ()
+            if self.oldTable.hasColumn (column.getName ())]
+
+      self.columnsReordered = oldOrder != newOrder
+
+
+   def compareIndexes (self):
+      """
+         Finds the indexes and constraints which were
+         added, removed or changed.
+      """
+
+      for index in self.oldTable.getAllIndexes ():
+         if not self.newTable.hasIndex (index.getName ()):
+            self.removedIndexes.append (index)
+
+      for index in self.newTable.getAllIndexes ():
+         oldIndex = self.oldTable.getIndex (index.getName ())
+
+         if oldIndex is None:
+            self.addedIndexes.append (index)
+            continue
+
+         if oldIndex.getStructuralHash () == index.getStructuralHash ():
+            continue
+
+         self.changedIndexes.append ((oldIndex, index))
+
+         oldConstraint = oldIndex.getConstraint ()
+         newConstraint = index.getConstraint ()
+
+         if oldConstraint is None and newConstraint is not None:
+            self.addedConstraints.append ((index.getName (), newConstraint))
+
+         elif oldConstraint is not None and newConstraint is None:
+            self.removedConstraints.append ((index.getName (), oldConstraint))
+
+         elif oldConstraint is not None and \
+               oldConstraint.getStructuralHash () != newConstraint.getStructuralHash ():
+            self.changedConstraints.append ((index.getName (), oldConstraint, newConstraint))
+
+
+   def getTableName (self):
+      """
+         Gets the name of the table which changed.
+      """
+
+      return self.newTable.getName ()
+
+
+   def getAddedColumns (self):
+      """
+         Gets a list of the columns which were added.
+      """
+
+      return self.addedColumns
+
+
+   def getRemovedColumns (self):
+      """
+         Gets a list of the columns which were removed.
+      """
+
+      return self.removedColumns
+
+
+   def getChangedColumns (self):
+      """
+         Gets a list of (oldColumn, newColumn) pairs for the
+         columns whose definitions changed.
+      """
+
+      return self.changedColumns
+
+
+   def areColumnsReordered (self):
+      """
+         Returns whether the columns common to both versions
+         of the table appear in a different order.
+      """
+
+      return self.columnsReordered
+
+
+   def getAddedIndexes (self):
+      """
+         Gets a list of the indexes which were added.
+      """
+
+      return self.addedIndexes
+
+
+   def getRemovedIndexes (self):
+      """
+         Gets a list of the indexes which were removed.
+      """
+
+      return self.removedIndexes
+
+
+   def getChangedIndexes (self):
+      """
+         Gets a list of (oldIndex, newIndex) pairs for the
+         indexes whose definitions or constraints changed.
+      """
+
+      return self.changedIndexes
+
+
+   def getAddedConstraints (self):
+      """
+         Gets a list of (indexName, constraint) pairs for the
+         constraints which were added to existing indexes.
+      """
+
+      return self.addedConstraints
+
+
+   def getRemovedConstraints (self):
+      """
+         Gets a list of (indexName, constraint) pairs for the
+         constraints which were removed from existing indexes.
+      """
+
+      return self.removedConstraints
+
+
+   def getChangedConstraints (self):
+      """
+         Gets a list of (indexName, oldConstraint, newConstraint)
+         tuples for the constraints which changed.
+      """
+
+      return self.changedConstraints
+
+
+   def toStringBuilder (self):
+      """
+         Builds a summary of the differences.
+      """
+
+      sb = IndentStringBuilder ()
+
+      sb.println ('<table name="%s" change="changed" reordered="%s">' % (
+            escapeAttribute (self.getTableName ()),
+            str (self.areColumnsReordered ())))
+
+      with sb:
+         for column in self.getAddedColumns ():
+            sb.println ('<column name="%s" change="added"/>' % escapeAttribute (column.getName ()))
+
+         for column in self.getRemovedColumns ():
+            sb.println ('<column name="%s" change="removed"/>' % escapeAttribute (column.getName ()))
+
+         for oldColumn, column in self.getChangedColumns ():
+            sb.println ('<column name="%s" change="changed"/>' % escapeAttribute (column.getName ()))
+
+         for index in self.getAddedIndexes ():
+            sb.println ('<index name="%s" change="added"/>' % escapeAttribute (index.getName ()))
+
+         for index in self.getRemovedIndexes ():
+            sb.println ('<index name="%s" change="removed"/>' % escapeAttribute (index.getName ()))
+
+         for oldIndex, index in self.getChangedIndexes ():
+            sb.println ('<index name="%s" change="changed"/>' % escapeAttribute (index.getName ()))
+
+         for indexName, constraint in self.getAddedConstraints ():
+            sb.println ('<constraint index="%s" change="added"/>' % escapeAttribute (indexName))
+
+         for indexName, constraint in self.getRemovedConstraints ():
+            sb.println ('<constraint index="%s" change="removed"/>' % escapeAttribute (indexName))
+
+         for indexName, oldConstraint, constraint in self.getChangedConstraints ():
+            sb.println ('<constraint index="%s" change="changed"/>' % escapeAttribute (indexName))
+
+      sb.println ('</table>')
+
+      return sb
+
+
+   def __repr__ (self):
+      return str (self.toStringBuilder ())
+
@@ -0,0 +1,314 @@
+#
+# SchemaSnapshot
+#
+# A compact binary file format for DatabaseSchema objects,
+# from which individual tables can be loaded on demand.
+#
+# Part of the PyDAO package.
+#
+# (c) 2011 Lee Supe (lain_proliant)
+# Released under the GNU General Public License, version 3.
+#
+# FORMAT:
+#
+#  magic          8 bytes, "PYDAOSNP"
+#  headerLength   unsigned 32-bit little endian integer
+#  header         marshalled (version, databaseName, tableIndex),
+#                 where tableIndex is a tuple of
+#                 (tableName, offset, length) entries
+#  tables         each table marshalled as nested tuples (see
+#                 encodeTable ()), at the given offset from the
+#                 end of the header
+#
+
+import marshal
+import mmap
+import os
+import struct
+import tempfile
+
+from Schema import *
+
+#--------------------------------------------------------------------
+class SchemaSnapshotException (SchemaException): pass
+
+#--------------------------------------------------------------------
+SNAPSHOT_MAGIC = 'PYDAOSNP'
+SNAPSHOT_VERSION = 1
+
+# The version of the marshal format used for all snapshot data.
+MARSHAL_VERSION = 2
+
+#--------------------------------------------------------------------
+def encodeTable (table):
+   """
+      Encodes the given TableSchema as nested tuples of
+      strings, booleans and None.
+   """
+
+   columns = tuple ((column.getName (), column.getDataType (),
+         column.isNullable (), column.getExtra ())
+         for column in table.getAllColumns ())
+
+   indexes = tuple ((index.getName (), index.isUnique (),
+         tuple (index.getColumns ()), encodeConstraint (index.getConstraint ()))
+         for index in table.getAllIndexes ())
+
+   return (table.getName (), columns, indexes)
+
+
+def encodeConstraint (constraint):
+   """
+      Encodes the given Constraint, or None, as nested tuples.
+   """
+
+   if constraint is None:
+      return None
+
+   if constraint.getType () == 'FOREIGN_KEY':
+      mapping = tuple ((column, constraint.getMapping (column))
+            for column in constraint.getColumns ())
+
+      return (constraint.getType (), tuple (constraint.getColumns ()),
+            constraint.tableName, constraint.databaseName, mapping)
+
+   return (constraint.getType (), tuple (constraint.getColumns ()))
+
+
+def decodeTable (data):
+   """
+      Decodes a TableSchema encoded by encodeTable ().
+   """
+
+   tableName, columns, indexes = data
+
+   table = TableSchema (tableName)
+
+   for columnName, dataType, isNullable, extra in columns:
+      table.addColumn (ColumnSchema (columnName, dataType,
+            'YES' if isNullable else 'NO', extra))
+
+   for indexName, isUnique, columnNames, constraint in indexes:
+      index = IndexSchema (indexName, not isUnique)
+
+      for columnName in columnNames:
+         index.addColumn (columnName)
+
+      if constraint is not None:
+         index.setConstraint (decodeConstraint (constraint))
+
+      table.addIndex (index)
+
+   return table
+
+
+def decodeConstraint (data):
+   """
+      Decodes a Constraint encoded by encodeConstraint ().
+   """
+
+   constraintType, columnNames = data [:2]
+
+   if constraintType == 'PRIMARY_KEY':
+      constraint = PrimaryKeyConstraint ()
+
+   elif constraintType == 'UNIQUE':
+      constraint = UniqueConstraint ()
+
+   elif constraintType == 'FOREIGN_KEY':
+      tableName, databaseName, mapping = data [2:]
+      constraint = ForeignKeyConstraint (tableName, databaseName)
+
+      for column, foreignColumn in mapping:
+         if foreignColumn is not None:
+            constraint.mapColumn (column, foreignColumn)
+
+   else:
+      raise SchemaSnapshotException ('Unknown constraint type: "%s"' % constraintType)
+
+   for columnName in columnNames:
+      constraint.addColumn (columnName)
+
+   return constraint
+
+#--------------------------------------------------------------------
+def writeSnapshot (schema, path):
+   """
+      Writes the given DatabaseSchema to a snapshot file.
+
+      The file is written to a temporary file which then
+      replaces the given path, so that readers never observe
+      a partially written snapshot.
+   """
+
+   blobs = []
+   tableIndex = []
+   offset = 0
+
+   for table in schema.getAllTables ():
+      blob = marshal.dumps (encodeTable (table), MARSHAL_VERSION)
+      tableIndex.append ((table.getName (), offset, len (blob)))
+      blobs.append (blob)
+      offset += len (blob)
+
+   header = marshal.dumps ((SNAPSHOT_VERSION, schema.getName (), tuple (tableIndex)),
+         MARSHAL_VERSION)
+
+   directory = os.path.dirname (os.path.abspath (path))
+   fd, tempPath = tempfile.mkstemp (dir = directory, prefix = '.pydao-snapshot-')
+
+   try:
+      with os.fdopen (fd, 'wb') as outfile:
+         outfile.write (SNAPSHOT_MAGIC)
+         outfile.write (struct.pack ('<I', len (header)))
+         outfile.write (header)
+
+         for blob in blobs:
+            outfile.write (blob)
+
+      os.rename (tempPath, path)
+
+   except:
+      os.remove (tempPath)
+      raise
+
+
+def loadSnapshot (path):
+   """
+      Opens the given snapshot file, returning a
+      SnapshotDatabaseSchema.
+   """
+
+   return SnapshotDatabaseSchema (path)
+
+#--------------------------------------------------------------------
+class SnapshotDatabaseSchema (LazyDatabaseSchema):
+   """
+      A DatabaseSchema backed by a memory-mapped snapshot file.
+
+      Only the header of the snapshot, listing the names and
+      offsets of the tables, is read when the schema is opened.
+      Each table is decoded from the mapped file the first time
+      it is accessed, so loading a few tables from a large
+      snapshot costs little more than opening it.
+   """
+
+   def __init__ (self, path):
+      """
+         Opens the given snapshot file.
+      """
+
+      self.path = path
+      self.snapshotFile = open (path, 'rb')
+
+      try:
+         self.snapshotMap = mmap.mmap (self.snapshotFile.fileno (), 0,
+               access = mmap.ACCESS_READ)
+
+      except (mmap.error, ValueError):
+         self.snapshotFile.close ()
+         raise SchemaSnapshotException ('The file "%s" is not a schema snapshot.' % path)
+
+      try:
+         if self.snapshotMap [:len (SNAPSHOT_MAGIC)] != SNAPSHOT_MAGIC:
+            raise SchemaSnapshotException ('The file "%s" is not a schema snapshot.' % path)
+
+         try:
+            version, databaseName, tableNames = self.readHeader ()
+
+         except (TypeError, ValueError, EOFError, struct.error):
+            raise SchemaSnapshotException ('The snapshot "%s" has a corrupt header.' % path)
+
+         if version != SNAPSHOT_VERSION:
+            raise SchemaSnapshotException ('The snapshot "%s" has unsupported version %s.' % (path, version))
+
+      except:
+         self.close ()
+         raise
+
+      LazyDatabaseSchema.__init__ (self, databaseName, tableNames)
+
+
+   def readHeader (self):
+      """
+         Reads the header of the snapshot, setting dataStart and
+         tableOffsets, and returns its (version, databaseName,
+         tableNames).  Raises TypeError, ValueError, EOFError or
+         struct.error if the header is truncated or malformed.
+      """
+
+      start = len (SNAPSHOT_MAGIC)
+
+      if len (self.snapshotMap) < start + 4:
+         raise EOFError ('The header length is missing.')
+
+      headerLength, = struct.unpack ('<I', self.snapshotMap [start:start + 4])
+      start += 4
+
+      if len (self.snapshotMap) < start + headerLength:
+         raise EOFError ('The header is truncated.')
+
+      version, databaseName, tableIndex = marshal.loads (
+            self.snapshotMap [start:start + headerLength])
+
+      # The offset of the first table in the file.
+      self.dataStart = start + headerLength
+
+      # A map of table names to (offset, length) pairs.
+      self.tableOffsets = {}
+      tableNames = []
+
+      for tableName, offset, length in tableIndex:
+         if offset < 0 or length < 0 or self.dataStart + offset + length > len (self.snapshotMap):
+            raise ValueError ('The table "%s" lies outside of the file.' % tableName)
+
+         self.tableOffsets [tableName] = (offset, length)
+         tableNames.append (tableName)
+
+      return (version, databaseName, tableNames)
+
+
+   def loadTables (self, tableNames):
+      """
+         Decodes the named tables from the snapshot.
+      """
+
+      if self.snapshotMap is None:
+         raise SchemaSnapshotException ('The snapshot "%s" has been closed.' % self.path)
+
+      tables = []
+
+      for tableName in tableNames:
+         offset, length = self.tableOffsets [tableName]
+         start = self.dataStart + offset
+
+         try:
+            table = decodeTable (marshal.loads (self.snapshotMap [start:start + length]))
+
+         except (TypeError, ValueError, EOFError):
+            raise SchemaSnapshotException ('The snapshot "%s" has a corrupt table "%s".' % (self.path, tableName))
+
+         if table.getName () != tableName:
+            raise SchemaSnapshotException ('The snapshot "%s" has a corrupt table "%s".' % (self.path, tableName))
+
+         tables.append (table)
+
+      return tables
+
+
+   def close (self):
+      """
+         Closes the snapshot file.
+
+         Tables which have already been loaded remain
+         available; loading any others will fail.
+      """
+
+      if self.snapshotMap is not None:
+         self.snapshotMap.close ()
+         self.snapshotMap = None
+
+      if self.snapshotFile is not None:
+         self.snapshotFile.close ()
+         self.snapshotFile = None
+
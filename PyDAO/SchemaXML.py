@@ -0,0 +1,217 @@
+#
+# SchemaXML
+#
+# Streaming reader and writer for the XML representation
+# of a DatabaseSchema, as produced by its __repr__ method.
+#
+# Part of the PyDAO package.
+#
+# (c) 2011 Lee Supe (lain_proliant)
+# Released under the GNU General Public License, version 3.
+#
+
+from contextlib import closing
+from xml.etree import cElementTree
+
+from IndentWriter import *
+from Schema import *
+
+#--------------------------------------------------------------------
+class SchemaXMLException (SchemaException): pass
+
+#--------------------------------------------------------------------
+def writeDatabaseSchema (schema, outfile):
+   """
+      Writes the representation of the given DatabaseSchema
+      to the given file, one table at a time, without first
+      building the whole representation as a string.
+   """
+
+   with closing (BufferedIndentWriter (outfile)) as writer:
+      schema.printTo (writer)
+
+
+def loadDatabaseSchema (source):
+   """
+      Reads a whole DatabaseSchema from the given file
+      name or file object.
+   """
+
+   reader = SchemaXMLReader (source)
+   schema = DatabaseSchema (reader.getDatabaseName ())
+
+   for table in reader.iterTables ():
+      schema.addTable (table)
+
+   return schema
+
+#--------------------------------------------------------------------
+class SchemaXMLReader (object):
+   """
+      Reads the tables of a DatabaseSchema, one by one, from
+      its XML representation.
+
+      The document is parsed incrementally, and each table's
+      elements are discarded as soon as its TableSchema has
+      been built, so only one table is held in memory at a
+      time however large the document is.
+   """
+
+   def __init__ (self, source):
+      """
+         Initializes a SchemaXMLReader, reading as far as
+         the <database> element.
+
+         source:
+            A file name or a file object.
+      """
+
+      self.events = cElementTree.iterparse (source, events = ('start', 'end'))
+
+      try:
+         event, self.root = self.events.next ()
+
+      except (StopIteration, SyntaxError), excVal:
+         raise SchemaXMLException ('Not a valid schema document: %s' % str (excVal))
+
+      if self.root.tag != 'database':
+         raise SchemaXMLException ('Expected a <database> element, found <%s>.' % self.root.tag)
+
+      self.databaseName = self.root.get ('name')
+
+
+   def getDatabaseName (self):
+      """
+         Gets the name of the database.
+      """
+
+      return self.databaseName
+
+
+   def iterTables (self):
+      """
+         Yields a TableSchema for each <table> element in
+         the document, in order.
+      """
+
+      try:
+         for event, element in self.events:
+            if event == 'end' and element.tag == 'table':
+               table = self.parseTable (element)
+               self.root.clear ()
+
+               yield table
+
+      except SyntaxError, excVal:
+         raise SchemaXMLException ('Not a valid schema document: %s' % str (excVal))
+
+
+   def parseTable (self, element):
+      """
+         Builds a TableSchema from the given <table> element.
+      """
+
+      table = TableSchema (self.getAttribute (element, 'name'))
+
+      for child in element:
+         if child.tag == 'column':
+            table.addColumn (ColumnSchema (
+                  self.getAttribute (child, 'name'),
+                  self.getAttribute (child, 'type'),
+                  self.parseBoolean (child, 'nullable') and 'YES' or 'NO',
+                  child.get ('extra', '')))
+
+         elif child.tag == 'index':
+            table.addIndex (self.parseIndex (child))
+
+         else:
+            raise SchemaXMLException ('Unexpected <%s> element in table "%s".' % (child.tag, table.getName ()))
+
+      return table
+
+
+   def parseIndex (self, element):
+      """
+         Builds an IndexSchema from the given <index> element.
+      """
+
+      index = IndexSchema (self.getAttribute (element, 'name'),
+            not self.parseBoolean (element, 'unique'))
+
+      for child in element:
+         if child.tag == 'column':
+            index.addColumn (self.getAttribute (child, 'name'))
+
+         elif child.tag == 'constraint':
+            index.setConstraint (self.parseConstraint (child))
+
+         else:
+            raise SchemaXMLException ('Unexpected <%s> element in index "%s".' % (child.tag, index.getName ()))
+
+      return index
+
+
+   def parseConstraint (self, element):
+      """
+         Builds a Constraint from the given <constraint> element.
+      """
+
+      constraintType = self.getAttribute (element, 'type')
+
+      if constraintType == 'PRIMARY_KEY':
+         constraint = PrimaryKeyConstraint ()
+
+      elif constraintType == 'UNIQUE':
+         constraint = UniqueConstraint ()
+
+      elif constraintType == 'FOREIGN_KEY':
+         constraint = ForeignKeyConstraint (self.getAttribute (element, 'table'),
+               element.get ('database'))
+
+      else:
+         raise SchemaXMLException ('Unknown constraint type: "%s"' % constraintType)
+
+      for child in element:
+         if child.tag != 'column':
+            raise SchemaXMLException ('Unexpected <%s> element in constraint.' % child.tag)
+
+         columnName = self.getAttribute (child, 'name')
+         constraint.addColumn (columnName)
+
+         if child.get ('references') is not None:
+            constraint.mapColumn (columnName, child.get ('references'))
+
+      return constraint
+
+
+   def getAttribute (self, element, name):
+      """
+         Gets the named attribute of the given element,
+         which must be present.
+      """
+
+      value = element.get (name)
+
+      if value is None:
+         raise SchemaXMLException ('The <%s> element has no "%s" attribute.' % (element.tag, name))
+
+      return value
+
+
+   def parseBoolean (self, element, name):
+      """
+         Gets the named boolean attribute of the given element,
+         as written by the schema's representation.
+      """
+
+      value = self.getAttribute (element, name)
+
+      if value == 'True':
+         return True
+
+      elif value == 'False':
+         return False
+
+      else:
+         raise SchemaXMLException ('An unexpected value was encountered for attribute: %s = "%s"' % (name, value))
+
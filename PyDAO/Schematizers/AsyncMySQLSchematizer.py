@@ -0,0 +1,450 @@
+#
+# Async MySQL Schematizer
+#
+# Interprets the given MySQL database as an abstract
+# DatabaseSchema without blocking, keeping several queries
+# in flight over a set of non-blocking connections.
+#
+# Part of the PyDAO package.
+#
+# (c) 2011 Lee Supe (lain_proliant)
+# Released under the GNU General Public License, version 3.
+#
+
+import collections
+import math
+import time
+
+from PyDAO.Schematizers.MySQLSchematizer import *
+from PyDAO.Schematizers.QueryProfiler import QueryRecord
+
+#--------------------------------------------------------------------
+class AsyncReturn (Exception):
+   """
+      Raised by an AsyncTask's generator to finish the task
+      with the given value.
+   """
+
+   def __init__ (self, value = None):
+      Exception.__init__ (self)
+      self.value = value
+
+#--------------------------------------------------------------------
+class AsyncQuery (object):
+   """
+      A query to be issued by an AsyncQueryScheduler on behalf
+      of an AsyncTask.
+   """
+
+   __slots__ = ('sql', 'params')
+
+   def __init__ (self, sql, params):
+      self.sql = sql
+      self.params = params
+
+#--------------------------------------------------------------------
+class AsyncQueryScheduler (object):
+   """
+      Issues queries over a set of non-blocking connections,
+      each with at most one query in flight, queueing the
+      queries for which no connection is free.
+
+      A connection which fails to send a query is not used
+      again, and the query, which never reached the server, is
+      sent over another connection instead.  Once every
+      connection has failed, the queued queries and any
+      submitted later fail with the last error raised, rather
+      than waiting for a connection which will never be free.
+
+      A non-blocking connection is any object with a method
+      query (sql, params, callback) which starts the query and
+      returns at once, and later calls callback (rows, error)
+      from the event loop, with either a list of row tuples or
+      the exception raised by the query.  Most event-driven
+      MySQL drivers can be adapted to this in a few lines.
+   """
+
+   def __init__ (self, connections, profiler = None):
+      """
+         Initializes an AsyncQueryScheduler over the given
+         connections.  If a QueryProfiler is given, it records
+         each query, from the time it is sent until its rows
+         are delivered.
+      """
+
+      self.idleConnections = list (connections)
+      self.profiler = profiler
+
+      # A queue of (query, callback) pairs waiting for a
+      # free connection.
+      self.waiting = collections.deque ()
+
+      # The number of queries sent and not yet completed.
+      self.inFlight = 0
+
+      # The last error raised by a connection sending a query.
+      self.sendError = None
+
+      if not self.idleConnections:
+         raise MySQLSchematizerException ('At least one connection is required.')
+
+
+   def submit (self, query, callback):
+      """
+         Issues the given AsyncQuery as soon as a connection is
+         free, calling callback (rows, error) when it completes.
+      """
+
+      self.waiting.append ((query, callback))
+      self.dispatch ()
+
+
+   def dispatch (self):
+      """
+         Sends the waiting queries over the free connections.
+      """
+
+      while self.waiting and self.idleConnections:
+         connection = self.idleConnections.pop ()
+         query, callback = self.waiting.popleft ()
+
+         record = None
+
+         if self.profiler is not None:
+            record = QueryRecord (query.sql, query.params)
+
+         self.inFlight += 1
+
+         try:
+            connection.query (query.sql, query.params,
+                  lambda rows, error, connection = connection, callback = callback,
+                        record = record, startTime = time.time ():
+                     self.complete (connection, callback, record, startTime, rows, error))
+
+         except Exception, excVal:
+            # The connection could not send the query, and is
+            # not used again; the query is sent over the next.
+            self.inFlight -= 1
+            self.sendError = excVal
+            self.waiting.appendleft ((query, callback))
+            continue
+
+         if record is not None:
+            self.profiler.addRecord (record)
+
+      if self.waiting and not self.idleConnections and self.inFlight == 0:
+         # No connection is left to send the waiting queries.
+         waiting = list (self.waiting)
+         self.waiting.clear ()
+
+         for query, callback in waiting:
+            callback (None, self.sendError)
+
+
+   def complete (self, connection, callback, record, startTime, rows, error):
+      """
+         Frees the connection of a completed query, sending the
+         next waiting query over it before the rows of the
+         completed query are handled.
+      """
+
+      if record is not None:
+         record.executeSeconds = time.time () - startTime
+         record.rowCount = rows is not None and len (rows) or 0
+
+      self.inFlight -= 1
+      self.idleConnections.append (connection)
+      self.dispatch ()
+
+      callback (rows, error)
+
+#--------------------------------------------------------------------
+class AsyncTask (object):
+   """
+      Runs a generator as a coroutine whose queries are issued
+      by an AsyncQueryScheduler.
+
+      The generator yields either an AsyncQuery, and is sent
+      back its rows, or a list of AsyncQuery objects, which are
+      issued together, and is sent back a list of their rows in
+      the same order.  If a query fails, its error is raised
+      within the generator instead, and the rows of the other
+      queries yielded with it are discarded.  The generator
+      finishes by raising AsyncReturn with its result.
+   """
+
+   def __init__ (self, scheduler, generator, callback):
+      """
+         Initializes an AsyncTask which, once started, calls
+         callback (result, error) when the generator finishes,
+         with either its result or the exception it raised.
+      """
+
+      self.scheduler = scheduler
+      self.generator = generator
+      self.callback = callback
+
+      # Incremented for each batch of queries yielded, so that
+      # results arriving for an abandoned batch are ignored.
+      self.batch = 0
+
+
+   def start (self):
+      """
+         Runs the generator until its first query.
+      """
+
+      self.resume (None, None)
+
+
+   def resume (self, value, error):
+      """
+         Sends the given value, or raises the given error,
+         into the generator, and issues the queries which it
+         yields next.
+      """
+
+      try:
+         if error is not None:
+            request = self.generator.throw (error)
+
+         else:
+            request = self.generator.send (value)
+
+      except AsyncReturn, excVal:
+         self.callback (excVal.value, None)
+         return
+
+      except StopIteration:
+         self.callback (None, None)
+         return
+
+      except Exception, excVal:
+         self.callback (None, excVal)
+         return
+
+      self.batch += 1
+      batch = self.batch
+
+      if isinstance (request, AsyncQuery):
+         self.scheduler.submit (request,
+               lambda rows, error: self.complete (batch, None, None, rows, error))
+         return
+
+      queries = list (request)
+      results = [None] * len (queries)
+      remaining = [len (queries)]
+
+      if not queries:
+         self.resume ([], None)
+         return
+
+      for position, query in enumerate (queries):
+         self.scheduler.submit (query,
+               lambda rows, error, position = position:
+                  self.complete (batch, results, remaining, rows, error, position))
+
+
+   def complete (self, batch, results, remaining, rows, error, position = 0):
+      """
+         Handles the completion of one of the queries of the
+         given batch, resuming the generator once every query
+         of the batch has completed or any has failed.
+      """
+
+      if batch != self.batch:
+         return
+
+      if error is not None:
+         self.batch += 1
+         self.resume (None, error)
+         return
+
+      if results is None:
+         self.resume (list (rows), None)
+         return
+
+      results [position] = list (rows)
+      remaining [0] -= 1
+
+      if remaining [0] == 0:
+         self.resume (results, None)
+
+#--------------------------------------------------------------------
+class AsyncMySQLSchematizer (MySQLSchematizer):
+   """
+      A MySQLSchematizer for code running on an event loop,
+      which must never block on the database.
+
+      The tables of the database are read in chunks, with one
+      query each for the columns, indexes, constraint types and
+      constraint columns of a chunk; see getChunks ().  All of
+      these queries are issued at once and kept in flight over
+      the connections given, so that the latency of each round
+      trip overlaps with those of the others.  The DatabaseSchema built is
+      the same as that built by MySQLSchematizer.
+
+      Only schematize () and schematizeAsync () may be used;
+      the other methods of MySQLSchematizer need a blocking
+      connection.
+   """
+
+   def __init__ (self, connections, databaseName, loop = None):
+      """
+         Initializes an AsyncMySQLSchematizer.
+
+         connections:
+            A list of open non-blocking connections; see
+            AsyncQueryScheduler.  Each connection must have read
+            access to the `information_schema` database.  The
+            connections are closed by closeConnection (), if
+            they have a close () method.
+
+         databaseName:
+            The name of the database to be schematized.
+
+         loop:
+            The event loop on which the connections deliver
+            their results, needed only by schematize ().
+
+            As PyDAO runs on Python 2, which has no asyncio, any
+            loop object will do which has a run () method, which
+            runs the loop until its stop () method is called.
+            That is the whole contract: an asyncio loop, whose
+            method is run_forever (), must be wrapped to provide
+            run () and stop ().
+      """
+
+      MySQLSchematizer.__init__ (self, None, databaseName, True)
+
+      self.connections = list (connections)
+      self.loop = loop
+
+
+   def schematize (self):
+      """
+         Collects all possible information about the database
+         into a DatabaseSchema object, running the event loop
+         until it is complete.
+
+         This blocks the calling thread for as long as it takes,
+         as the SchematizerBase contract requires.  Code which is
+         itself running on the event loop should instead call
+         schematizeAsync ().
+      """
+
+      if self.loop is None:
+         raise MySQLSchematizerException ('An event loop is required to schematize synchronously; use schematizeAsync () instead.')
+
+      outcome = []
+
+      def finish (schema, error):
+         outcome.append ((schema, error))
+         self.loop.stop ()
+
+      self.schematizeAsync (finish)
+
+      if not outcome:
+         self.loop.run ()
+
+      if not outcome:
+         raise MySQLSchematizerException ('The event loop stopped before the database "%s" was schematized.' % self.getDatabaseName ())
+
+      schema, error = outcome [0]
+
+      if error is not None:
+         raise error
+
+      return schema
+
+
+   def schematizeAsync (self, callback):
+      """
+         Starts schematizing the database and returns at once.
+         Once it is complete, callback (schema, error) is called
+         from the event loop, with either the DatabaseSchema or
+         the exception which prevented it from being built.
+      """
+
+      scheduler = AsyncQueryScheduler (self.connections, self.profiler)
+      AsyncTask (scheduler, self.schematizeTask (), callback).start ()
+
+
+   def schematizeTask (self):
+      """
+         The coroutine which schematizes the database; see
+         AsyncTask.
+      """
+
+      tableNames = self.readTableNames ((yield AsyncQuery (*self.getTableNamesQuery ())))
+      tables = [TableSchema (tableName) for tableName in tableNames]
+      chunks = self.getChunks (tables)
+
+      queries = []
+
+      for chunk in chunks:
+         chunkNames = [table.getName () for table in chunk]
+
+         queries.extend ([
+            AsyncQuery (*self.getColumnsQuery (chunkNames)),
+            AsyncQuery (*self.getIndexesQuery (chunkNames)),
+            AsyncQuery (*self.getConstraintTypesQuery (chunkNames)),
+            AsyncQuery (*self.getConstraintColumnsQuery (chunkNames))
+            ])
+
+      results = yield queries
+
+      for position, chunk in enumerate (chunks):
+         columnRows, indexRows, typeRows, keyRows = results [position * 4:position * 4 + 4]
+         tableMap = dict ((table.getName (), table) for table in chunk)
+
+         self.addColumnRows (tableMap, columnRows)
+         self.addIndexRows (tableMap, indexRows)
+         self.attachConstraints (tableMap,
+               self.compileConstraints (tableMap.keys (), typeRows, keyRows))
+
+      schema = DatabaseSchema (self.getDatabaseName ())
+      schema.addTables (tables)
+
+      raise AsyncReturn (schema)
+
+
+   def getChunks (self, tables):
+      """
+         Splits the given tables into chunks to be read by
+         separate queries.  Each chunk is read by four queries,
+         so there are enough chunks for every connection to have
+         one query in flight, and no more, except that no chunk
+         may have more tables than MAX_TABLE_NAME_PARAMS.
+      """
+
+      chunkCount = max (len (self.connections) // 4,
+            int (math.ceil (float (len (tables)) / MAX_TABLE_NAME_PARAMS)), 1)
+      chunkSize = max (1, int (math.ceil (float (len (tables)) / chunkCount)))
+
+      return [tables [start:start + chunkSize]
+            for start in xrange (0, len (tables), chunkSize)]
+
+
+   def getCursor (self):
+      """
+         Raises a MySQLSchematizerException, as there is no
+         blocking connection on which to open a cursor.
+      """
+
+      raise MySQLSchematizerException ('An AsyncMySQLSchematizer can only schematize the whole database, with schematize () or schematizeAsync ().')
+
+
+   def closeConnection (self):
+      """
+         A cleanup method called upon deletion.
+
+         Closes the connections.
+      """
+
+      connections = getattr (self, 'connections', [])
+      self.connections = []
+
+      for connection in connections:
+         if hasattr (connection, 'close'):
+            connection.close ()
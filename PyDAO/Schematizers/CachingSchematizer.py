@@ -0,0 +1,155 @@
+#
+# Caching Schematizer
+#
+# Keeps the DatabaseSchema produced by another schematizer
+# in a file on disk, and re-reads only the tables which have
+# changed since the file was written.
+#
+# Part of the PyDAO package.
+#
+# (c) 2011 Lee Supe (lain_proliant)
+# Released under the GNU General Public License, version 3.
+#
+
+import cPickle
+import os
+import tempfile
+
+from PyDAO.SchematizerBase import *
+from PyDAO.Schema import *
+
+#--------------------------------------------------------------------
+class CachingSchematizer (SchematizerBase):
+   """
+      A schematizer which wraps another schematizer and caches
+      its results on disk, table by table.
+
+      Each cached table is keyed by the fingerprint reported by
+      the wrapped schematizer's getTableFingerprints () method.
+      When schematize () is called, the fingerprints of all of
+      the tables are fetched, and only the tables which are new
+      or whose fingerprint has changed are passed to the wrapped
+      schematizer's schematizeTables () method.  Tables which
+      have been dropped fall out of the cache.
+
+      The wrapped schematizer must provide getDatabaseName (),
+      getTableFingerprints () and schematizeTables (), as
+      MySQLSchematizer does.
+   """
+
+   # Increment whenever the layout of the cache file changes.
+   CACHE_VERSION = 2
+
+   def __init__ (self, schematizer, cachePath):
+      """
+         Initializes a CachingSchematizer.
+
+         schematizer:
+            The schematizer whose results are to be cached.
+
+         cachePath:
+            The path of the cache file.  It is created if it
+            does not exist, and rewritten after each call to
+            schematize ().
+      """
+
+      self.schematizer = schematizer
+      self.cachePath = cachePath
+
+
+   def schematize (self):
+      """
+         Collects all possible information about the
+         database, its tables, their columns and indexes
+         into a DatabaseSchema object, re-reading only the
+         tables which have changed since the last call.
+      """
+
+      fingerprints = self.schematizer.getTableFingerprints ()
+      cachedTables = self.loadCache ()
+
+      staleTableNames = [tableName for tableName, fingerprint in fingerprints
+            if tableName not in cachedTables or
+            cachedTables [tableName][0] != fingerprint]
+
+      freshTables = dict (zip (staleTableNames,
+         self.schematizer.schematizeTables (staleTableNames)))
+
+      schema = DatabaseSchema (self.schematizer.getDatabaseName ())
+      entries = {}
+
+      for tableName, fingerprint in fingerprints:
+         if tableName in freshTables:
+            table = freshTables [tableName]
+            table.setFingerprint (fingerprint)
+
+         else:
+            table = cachedTables [tableName][1]
+
+         schema.addTable (table)
+         entries [tableName] = (fingerprint, table)
+
+      self.saveCache (entries)
+
+      return schema
+
+
+   def loadCache (self):
+      """
+         Loads the cached tables from the cache file.
+
+         Returns a map of table names to (fingerprint, table)
+         pairs.  The map is empty if the cache file does not
+         exist, cannot be read, or was written for a different
+         database or by a different version of the cache.
+      """
+
+      try:
+         with open (self.cachePath, 'rb') as infile:
+            cache = cPickle.load (infile)
+
+      except IOError:
+         return {}
+
+      except Exception:
+         # A truncated or otherwise corrupt cache file can raise
+         # almost anything while unpickling.  It will be rewritten.
+         return {}
+
+      if not isinstance (cache, dict) or \
+            cache.get ('version') != self.CACHE_VERSION or \
+            cache.get ('databaseName') != self.schematizer.getDatabaseName ():
+         return {}
+
+      return cache ['tables']
+
+
+   def saveCache (self, entries):
+      """
+         Writes the given map of table names to (fingerprint, table)
+         pairs to the cache file.
+
+         The cache is written to a temporary file which then
+         replaces the cache file, so that an interrupted write
+         never leaves a corrupt cache behind.
+      """
+
+      cache = {
+            'version': self.CACHE_VERSION,
+            'databaseName': self.schematizer.getDatabaseName (),
+            'tables': entries
+            }
+
+      cacheDir = os.path.dirname (os.path.abspath (self.cachePath))
+      fd, tempPath = tempfile.mkstemp (dir = cacheDir, prefix = '.pydao-cache-')
+
+      try:
+         with os.fdopen (fd, 'wb') as outfile:
+            cPickle.dump (cache, outfile, cPickle.HIGHEST_PROTOCOL)
+
+         os.rename (tempPath, self.cachePath)
+
+      except:
+         os.remove (tempPath)
+         raise
+
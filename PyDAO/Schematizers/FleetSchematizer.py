@@ -0,0 +1,403 @@
+#
+# Fleet Schematizer
+#
+# Interprets many identically shaped databases, such as the
+# shards of a partitioned database, sharing the TableSchema
+# objects which they have in common, and reports the shards
+# whose structure drifts from that of the majority.
+#
+# Part of the PyDAO package.
+#
+# (c) 2011 Lee Supe (lain_proliant)
+# Released under the GNU General Public License, version 3.
+#
+
+import collections
+import threading
+from multiprocessing.pool import ThreadPool
+
+from PyDAO.SchematizerException import *
+from PyDAO.IndentWriter import *
+from PyDAO.Schema import *
+
+#--------------------------------------------------------------------
+class FleetSchematizerException (SchematizerException): pass
+
+#--------------------------------------------------------------------
+class FleetSchematizer (object):
+   """
+      Schematizes a fleet of databases, several at a time.
+
+      Identically shaped shards produce tables with the same
+      structural hash.  Each distinct table is kept only once,
+      as a flyweight shared by the DatabaseSchema of every shard
+      which has it, so the memory used by a fleet grows with the
+      number of distinct table definitions rather than with the
+      number of shards.
+
+      Shared tables must not be altered, as the change would
+      show up in every shard.  Their fingerprints, if any, are
+      those reported for the first shard which had them.
+   """
+
+   def __init__ (self, schematizerFactory, shardNames, jobs = 8):
+      """
+         Initializes a FleetSchematizer.
+
+         schematizerFactory:
+            A callable taking a shard name and returning a new
+            schematizer for that shard, e.g. a MySQLSchematizer
+            in bulk mode over its own connection.  It is called
+            from the worker threads, once for each shard.  The
+            schematizer's connection is closed once the shard
+            has been read.
+
+         shardNames:
+            The names of the shards, in the order in which they
+            are to be reported.
+
+         jobs:
+            The number of shards read at once.
+      """
+
+      if jobs < 1:
+         raise FleetSchematizerException ('The number of jobs must be at least 1, got %d.' % jobs)
+
+      self.schematizerFactory = schematizerFactory
+      self.shardNames = list (shardNames)
+      self.jobs = jobs
+
+      # A map of structural hashes to the shared TableSchema
+      # objects with those hashes.
+      self.tables = {}
+      self.lock = threading.Lock ()
+
+
+   def schematize (self):
+      """
+         Reads every shard of the fleet, returning a FleetSchema.
+
+         A shard which cannot be read does not prevent the
+         others from being read; its error is recorded in
+         the FleetSchema instead.
+      """
+
+      pool = ThreadPool (min (self.jobs, max (len (self.shardNames), 1)))
+
+      try:
+         results = pool.map (self.schematizeShard, self.shardNames, 1)
+
+      finally:
+         pool.close ()
+         pool.join ()
+
+      fleet = FleetSchema ()
+
+      for shardName, schema, error in results:
+         if schema is not None:
+            fleet.addShard (shardName, schema)
+
+         else:
+            fleet.addError (shardName, error)
+
+      return fleet
+
+
+   def schematizeShard (self, shardName):
+      """
+         Reads the named shard, returning a (shardName, schema,
+         error) tuple, in which either the DatabaseSchema of the
+         shard, built from shared tables, or an error message
+         is None.  Runs on a worker thread.
+      """
+
+      schematizer = None
+
+      try:
+         schematizer = self.schematizerFactory (shardName)
+         schema = self.shareTables (schematizer.schematize ())
+
+      except Exception, excVal:
+         # Any error from the driver or the server, such as an
+         # unreachable host, is reported against the shard alone.
+         return (shardName, None, '%s: %s' % (type (excVal).__name__, str (excVal)))
+
+      finally:
+         if schematizer is not None:
+            schematizer.closeConnection ()
+
+      return (shardName, schema, None)
+
+
+   def shareTables (self, schema):
+      """
+         Replaces each table of the given DatabaseSchema with
+         the shared table of the same structure, if any, or
+         else makes it the shared table for its structure.
+      """
+
+      shared = DatabaseSchema (schema.getName ())
+      tables = []
+
+      # Hash outside of the lock; the hashes are cached.
+      for table in schema.getAllTables ():
+         table.getStructuralHash ()
+
+      with self.lock:
+         for table in schema.getAllTables ():
+            tables.append (self.tables.setdefault (table.getStructuralHash (), table))
+
+      shared.addTables (tables)
+
+      return shared
+
+
+   def getDistinctTableCount (self):
+      """
+         Gets the number of distinct tables read so far,
+         across all of the shards.
+      """
+
+      with self.lock:
+         return len (self.tables)
+
+#--------------------------------------------------------------------
+class FleetSchema (object):
+   """
+      The DatabaseSchema of each shard of a fleet, and the
+      errors of the shards which could not be read.
+   """
+
+   def __init__ (self):
+      """
+         Initializes an empty FleetSchema.
+      """
+
+      # The schemas of the shards, in order, by shard name.
+      self.shards = OrderedNameMap ()
+
+      # A list of (shardName, error) pairs.
+      self.errors = []
+
+
+   def addShard (self, shardName, schema):
+      """
+         Adds the DatabaseSchema of the named shard.
+      """
+
+      if shardName in self.shards:
+         raise FleetSchematizerException ('The shard "%s" is already in the fleet.' % shardName)
+
+      self.shards.add (shardName, schema)
+
+
+   def addError (self, shardName, error):
+      """
+         Records that the named shard could not be read.
+      """
+
+      self.errors.append ((shardName, error))
+
+
+   def getShardNames (self):
+      """
+         Gets the names of the shards which were read, in order.
+      """
+
+      return self.shards.getNames ()
+
+
+   def getShard (self, shardName):
+      """
+         Gets the DatabaseSchema of the named shard,
+         or None if it was not read.
+      """
+
+      return self.shards.get (shardName)
+
+
+   def getErrors (self):
+      """
+         Gets a list of (shardName, error) pairs for the
+         shards which could not be read.
+      """
+
+      return list (self.errors)
+
+
+   def getStructuralHashes (self):
+      """
+         Gets a list of (shardName, structuralHash) pairs,
+         one for each shard which was read, in order.
+      """
+
+      return [(shardName, self.shards.get (shardName).getStructuralHash ())
+            for shardName in self.shards.getNames ()]
+
+
+   def getDistinctTableCount (self):
+      """
+         Gets the number of distinct table objects held by
+         the schemas of the shards.
+      """
+
+      return len (set (id (table) for schema in self.shards.getValues ()
+            for table in schema.getAllTables ()))
+
+
+   def getDriftReport (self):
+      """
+         Compares every shard with the structure shared by the
+         most shards, returning a FleetDriftReport.
+      """
+
+      return FleetDriftReport (self)
+
+#--------------------------------------------------------------------
+class FleetDriftReport (object):
+   """
+      Groups the shards of a fleet by structure, and describes
+      how each shard which differs from the majority drifts
+      from it.
+
+      The majority structure is the one shared by the most
+      shards; when several structures are shared by as many
+      shards, the one of the first such shard wins.
+   """
+
+   def __init__ (self, fleet):
+      """
+         Initializes a FleetDriftReport for the given FleetSchema.
+      """
+
+      self.fleet = fleet
+
+      # The names of the shards with each structural hash,
+      # in the order in which the hashes first appear.
+      self.groups = collections.OrderedDict ()
+
+      for shardName, structuralHash in fleet.getStructuralHashes ():
+         self.groups.setdefault (structuralHash, []).append (shardName)
+
+      # The majority structure, and the shard compared with the
+      # others as its representative.
+      self.majorityHash = None
+      self.referenceShardName = None
+
+      for structuralHash, shardNames in self.groups.items ():
+         if self.majorityHash is None or \
+               len (shardNames) > len (self.groups [self.majorityHash]):
+            self.majorityHash = structuralHash
+            self.referenceShardName = shardNames [0]
+
+      # A map of the names of drifted shards to their SchemaDiffs
+      # against the reference shard, computed on demand.
+      self.diffs = {}
+
+
+   def getGroups (self):
+      """
+         Gets a list of (structuralHash, shardNames) pairs, one
+         for each distinct structure, the most common first.
+      """
+
+      return sorted (self.groups.items (), key = lambda group: -len (group [1]))
+
+
+   def getMajorityHash (self):
+      """
+         Gets the structural hash of the majority structure,
+         or None if no shard was read.
+      """
+
+      return self.majorityHash
+
+
+   def getReferenceShardName (self):
+      """
+         Gets the name of the first shard with the majority
+         structure, against which the other shards are compared.
+      """
+
+      return self.referenceShardName
+
+
+   def getDriftedShardNames (self):
+      """
+         Gets the names of the shards whose structure differs
+         from the majority, in order.
+      """
+
+      return [shardName for shardName, structuralHash in self.fleet.getStructuralHashes ()
+            if structuralHash != self.majorityHash]
+
+
+   def getDiff (self, shardName):
+      """
+         Gets the SchemaDiff from the reference shard to the
+         named shard.  Only the tables of the two shards which
+         are not shared need to be compared in detail.
+      """
+
+      if shardName not in self.diffs:
+         schema = self.fleet.getShard (shardName)
+
+         if schema is None:
+            raise FleetSchematizerException ('The shard "%s" was not read.' % shardName)
+
+         self.diffs [shardName] = SchemaDiff (
+               self.fleet.getShard (self.referenceShardName), schema)
+
+      return self.diffs [shardName]
+
+
+   def isEmpty (self):
+      """
+         Gets whether every shard was read and has the
+         majority structure.
+      """
+
+      return not self.getDriftedShardNames () and not self.fleet.getErrors ()
+
+
+   def toStringBuilder (self):
+      """
+         Builds a summary of the structures of the fleet,
+         followed by the differences of each drifted shard
+         from the reference shard and the errors, if any.
+      """
+
+      sb = IndentStringBuilder ()
+
+      shardCount = len (self.fleet.getShardNames ())
+
+      sb.println ('%d shards read, %d distinct structures, %d distinct tables.' % (
+            shardCount, len (self.groups), self.fleet.getDistinctTableCount ()))
+
+      for structuralHash, shardNames in self.getGroups ():
+         sb.println ('%s %5d %s' % (structuralHash,
+               len (shardNames), structuralHash == self.majorityHash and
+               '(majority, e.g. %s)' % self.referenceShardName or
+               ', '.join (shardNames)))
+
+      for shardName in self.getDriftedShardNames ():
+         sb.newline ()
+         sb.println ('Shard "%s" drifts from the majority:' % shardName)
+
+         with sb:
+            sb.embed (self.getDiff (shardName).toStringBuilder ())
+
+      if self.fleet.getErrors ():
+         sb.newline ()
+         sb.println ('Shards which could not be read:')
+
+         with sb:
+            for shardName, error in self.fleet.getErrors ():
+               sb.println ('%s: %s' % (shardName, error))
+
+      return sb
+
+
+   def __repr__ (self):
+      return str (self.toStringBuilder ())
+
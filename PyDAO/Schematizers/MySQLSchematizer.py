@@ -12,13 +12,23 @@
 # Released under the GNU General Public License, version 3.
 #
 
+import itertools
+
 from PyDAO.SchematizerException import *
 from PyDAO.SchematizerBase import *
 from PyDAO.Schema import *
+from PyDAO.Schematizers.QueryProfiler import *
+from PyDAO.Schematizers.TableFilter import *
 
 #--------------------------------------------------------------------
 class MySQLSchematizerException (SchematizerException): pass
 
+#--------------------------------------------------------------------
+# The largest number of table names passed to a single query
+# as parameters.  Queries about more tables read the whole
+# database instead.
+MAX_TABLE_NAME_PARAMS = 256
+
 #--------------------------------------------------------------------
 class MySQLSchematizer (SchematizerBase):
    """
@@ -30,7 +40,7 @@ class MySQLSchematizer (SchematizerBase):
       the Schematizer.schematize () method.
    """
    
-   def __init__ (self, mysqlConnection, databaseName):
+   def __init__ (self, mysqlConnection, databaseName, bulk = False):
       """
          Initializes a MySQLSchematizer.
 
@@ -45,10 +55,19 @@ class MySQLSchematizer (SchematizerBase):
 
          databaseName:
             The name of the database to be schematized.
+
+         bulk:
+            If True, schematize () reads the whole database
+            with a fixed number of set-based queries rather
+            than issuing several queries for every table and
+            index.  See schematizeBulk ().
       """
       
       self._mysqlConnection = mysqlConnection
       self.databaseName = databaseName
+      self.bulk = bulk
+      self.profiler = None
+      self.tableFilter = None
 
 
    def __del__ (self):
@@ -66,20 +85,199 @@ class MySQLSchematizer (SchematizerBase):
          into a DatabaseSchema object.
       """
 
+      if self.bulk:
+         return self.schematizeBulk ()
+
       schema = DatabaseSchema (self.getDatabaseName ())
 
       tableNames = self.getTableNames ()
 
-      for tableName in tableNames:
-         schema.addTable (self.schematizeTable (tableName))
+      for table in self.schematizeTables (tableNames):
+         schema.addTable (table)
 
       return schema
 
 
+   def schematizeBulk (self):
+      """
+         Collects the same information as schematize (), but
+         reads the columns and indexes of every table in the
+         database with one ordered query each, and the constraints
+         with two more.
+
+         All of the TableSchema and IndexSchema objects are
+         built in a single streaming pass over the results,
+         so the number of queries issued does not depend on
+         the number of tables or indexes in the database.
+      """
+
+      schema = DatabaseSchema (self.getDatabaseName ())
+      schema.addTables (self.schematizeBatch (self.getTableNames ()))
+
+      return schema
+
+
+   def schematizeLazy (self, prefetch = 0):
+      """
+         Reads the names of the tables in the database, and
+         returns a LazyMySQLDatabaseSchema which introspects
+         each table only when it is first accessed.
+
+         prefetch:
+            The number of further tables to introspect along
+            with each table which is accessed, in the same
+            queries, in anticipation of their being accessed
+            next.  See LazyDatabaseSchema.
+
+         The schematizer's connection must be kept open for as
+         long as tables may be loaded from the schema.
+      """
+
+      return LazyMySQLDatabaseSchema (self, self.getTableNames (), prefetch)
+
+
+   def schematizeBatch (self, tableNames):
+      """
+         Collects all possible information about each of the
+         named tables, returning a list of TableSchema objects
+         in the same order as the given names.
+
+         Unlike schematizeTables (), the columns, indexes and
+         constraints of all of the tables are read with one or
+         two set-based queries each.
+      """
+
+      tables = [TableSchema (tableName) for tableName in tableNames]
+
+      self.loadColumns (tables)
+      self.loadIndexes (tables)
+      self.loadConstraints (tables)
+
+      return tables
+
+
+   def schematizeIncremental (self, previous):
+      """
+         Brings a DatabaseSchema previously built for this
+         database up to date, patching it in place.
+
+         The fingerprints of all of the tables are fetched with
+         a single query (see getTableFingerprints ()).  Tables
+         which no longer exist are removed from the schema, new
+         tables are added to the end of it, and tables whose
+         fingerprint has changed are re-read and patched with
+         patchTable ().  Unchanged tables are not read at all.
+
+         Tables in the previous schema which have no fingerprint
+         are treated as changed, so the first incremental pass
+         over a schema built by schematize () re-reads every table.
+
+         Returns the patched schema.
+      """
+
+      fingerprints = self.getTableFingerprints ()
+      currentTableNames = set (tableName for tableName, fingerprint in fingerprints)
+
+      for tableName in previous.getTableNames ():
+         if tableName not in currentTableNames:
+            previous.removeTable (tableName)
+
+      changed = [(tableName, fingerprint) for tableName, fingerprint in fingerprints
+            if not previous.hasTable (tableName) or
+            previous.getTable (tableName).getFingerprint () != fingerprint]
+
+      tables = self.schematizeTables ([tableName for tableName, fingerprint in changed])
+
+      for table, (tableName, fingerprint) in zip (tables, changed):
+         table.setFingerprint (fingerprint)
+
+         if previous.hasTable (tableName):
+            self.patchTable (previous.getTable (tableName), table)
+
+         else:
+            previous.addTable (table)
+
+      return previous
+
+
+   def patchTable (self, previousTable, currentTable):
+      """
+         Patches the given previously built TableSchema in place
+         so that it matches the given freshly read TableSchema.
+
+         Only the columns and indexes which were dropped, added
+         or altered are touched.  Altered columns and indexes
+         keep their position; the columns are reordered only if
+         their order in the table has changed.
+      """
+
+      previousTable.setFingerprint (currentTable.getFingerprint ())
+
+      for columnName in previousTable.getColumnNames ():
+         if not currentTable.hasColumn (columnName):
+            previousTable.removeColumn (columnName)
+
+      for column in currentTable.getAllColumns ():
+         previousColumn = previousTable.getColumn (column.getName ())
+
+         if previousColumn is None:
+            previousTable.addColumn (column)
+
+         elif not previousColumn.isEquivalent (column):
+            previousTable.replaceColumn (column)
+
+      columnNames = [column.getName () for column in currentTable.getAllColumns ()]
+
+      if [column.getName () for column in previousTable.getAllColumns ()] != columnNames:
+         columns = [previousTable.getColumn (columnName) for columnName in columnNames]
+
+         for columnName in columnNames:
+            previousTable.removeColumn (columnName)
+
+         for column in columns:
+            previousTable.addColumn (column)
+
+      for indexName in previousTable.getIndexNames ():
+         if not currentTable.hasIndex (indexName):
+            previousTable.removeIndex (indexName)
+
+      for index in currentTable.getAllIndexes ():
+         previousIndex = previousTable.getIndex (index.getName ())
+
+         if previousIndex is None:
+            previousTable.addIndex (index)
+
+         elif not previousIndex.isEquivalent (index):
+            previousTable.replaceIndex (index)
+
+
+   def schematizeTables (self, tableNames):
+      """
+         Collects all possible information about each of the
+         named tables and returns a list of TableSchema objects
+         in the same order as the given names.
+
+         The columns and indexes are read table by table with
+         schematizeTable (), and then the constraints of all of
+         the tables at once with loadConstraints ().
+
+         Override this method to change how a group of tables
+         is introspected, e.g. to spread the work across
+         several connections.
+      """
+
+      tables = [self.schematizeTable (tableName) for tableName in tableNames]
+      self.loadConstraints (tables)
+
+      return tables
+
+
    def schematizeTable (self, tableName):
       """
          Collects all possible information about the given table
          in the database and returns it 
+
+         Constraints are not read; see schematizeTables ().
       """
 
       tableSchema = TableSchema (tableName)
@@ -110,11 +308,14 @@ class MySQLSchematizer (SchematizerBase):
          Compiles the information provided into an IndexSchema object
          and queries the information schema for all of the columns
          in the index.
+
+         Returns None for a functional index, which has an
+         expression rather than a column in some of its parts.
       """
       
       index = IndexSchema (indexName, nonUnique)
 
-      cursor = self.getConnection ().cursor ()
+      cursor = self.getCursor ()
 
       cursor.execute ("""
          select column_name
@@ -129,6 +330,9 @@ class MySQLSchematizer (SchematizerBase):
       results = cursor.fetchall ()
 
       columnNames = [row [0] for row in results]
+
+      if self.isFunctionalIndex (columnNames):
+         return None
       
       for columnName in columnNames:
          index.addColumn (columnName)
@@ -148,6 +352,109 @@ class MySQLSchematizer (SchematizerBase):
       return self._mysqlConnection
 
 
+   def getCursor (self):
+      """
+         Opens a new cursor on the schematizer's connection,
+         through which every query is issued.  If a profiler
+         has been set, the cursor records its queries with it.
+      """
+
+      cursor = self.getConnection ().cursor ()
+
+      if self.profiler is not None:
+         cursor = self.profiler.wrapCursor (cursor)
+
+      return cursor
+
+
+   def getProfiler (self):
+      """
+         Gets the QueryProfiler recording the schematizer's
+         queries, or None.
+      """
+
+      return self.profiler
+
+
+   def setProfiler (self, profiler):
+      """
+         Sets a QueryProfiler to record every query issued
+         by the schematizer from now on, or None to stop
+         recording queries.
+      """
+
+      self.profiler = profiler
+
+
+   def getTableFilter (self):
+      """
+         Gets the TableFilter selecting the tables to be
+         schematized, or None.
+      """
+
+      return self.tableFilter
+
+
+   def setTableFilter (self, tableFilter):
+      """
+         Sets a TableFilter selecting the tables to be schematized,
+         or None to schematize every table.
+
+         The filter's condition is added to the queries which list
+         the tables of the database, and to bulk queries which
+         cover the whole database, so that tables which are
+         filtered out cost as little as possible.
+      """
+
+      self.tableFilter = tableFilter
+
+
+   def getTableFilterCondition (self):
+      """
+         Gets the condition of the table filter, if any, to be
+         appended to the condition of a query, as a (condition,
+         params) pair.  The condition is empty if the filter
+         cannot rule out any tables on the server.
+      """
+
+      if self.tableFilter is None:
+         return ('', [])
+
+      condition, params = self.tableFilter.getCondition ()
+
+      if condition is None:
+         return ('', [])
+
+      return (' and ' + condition, params)
+
+
+   def filterTableRows (self, rows):
+      """
+         Drops the rows, each beginning with a table name, of
+         the tables which the table filter does not select.
+      """
+
+      if self.tableFilter is None:
+         return rows
+
+      return [row for row in rows if self.tableFilter.matches (row [0])]
+
+
+   def checkTableRows (self, rows):
+      """
+         Raises a MySQLSchematizerException if the given rows
+         listing the tables of the database are empty.
+      """
+
+      if rows:
+         return
+
+      if self.tableFilter is not None and not self.tableFilter.isEmpty ():
+         raise MySQLSchematizerException, 'No tables in the database "%s" match the table filter.' % self.databaseName
+
+      raise MySQLSchematizerException, 'The database "%s" does not exist or has no tables.' % self.databaseName
+
+
    def closeConnection (self):
       """
          A cleanup method called upon deletion.
@@ -172,24 +479,78 @@ class MySQLSchematizer (SchematizerBase):
 
    def getTableNames (self):
       """
-         Retrieves the names of all of the tables in the database.
+         Retrieves the names of all of the tables in the database
+         which are selected by the table filter, if any.
       """
       
-      cursor = self.getConnection ().cursor ()
+      cursor = self.getCursor ()
+      cursor.execute (*self.getTableNamesQuery ())
 
-      cursor.execute ("""
+      tableNames = self.readTableNames (cursor.fetchall ())
+      cursor.close ()
+
+      return tableNames
+
+
+   def getTableNamesQuery (self):
+      """
+         Builds the query which lists the tables of the database,
+         returning a (sql, params) pair.  See getTableNames ().
+      """
+
+      condition, params = self.getTableFilterCondition ()
+
+      return ("""
          select table_name from information_schema.tables where
-            table_schema = %s
-         """, (self.databaseName,))
+            table_schema = %%s%s
+         """ % condition, [self.databaseName] + params)
 
-      results = cursor.fetchall ()
+
+   def readTableNames (self, rows):
+      """
+         Gets the names of the tables selected by the table
+         filter from the rows of the getTableNamesQuery () query.
+      """
+
+      results = self.filterTableRows (rows)
+      self.checkTableRows (results)
+
+      return [row [0] for row in results]
+
+
+   def getTableFingerprints (self):
+      """
+         Retrieves a cheap fingerprint of each of the tables in
+         the database, using a single query.
+
+         Returns a list of (tableName, fingerprint) pairs, where
+         each fingerprint is a tuple of the table's creation and
+         update times, row count and storage properties as
+         recorded in information_schema.tables.  A table whose
+         fingerprint has not changed is assumed not to have
+         been altered.  The fingerprint may also change when
+         only the table's data changes, which causes needless
+         but harmless re-reads.
+      """
+
+      condition, params = self.getTableFilterCondition ()
+
+      cursor = self.getCursor ()
+
+      cursor.execute ("""
+         select table_name, create_time, update_time, table_rows,
+               engine, row_format, table_collation, create_options
+            from information_schema.tables where
+            table_schema = %%s%s
+         """ % condition, [self.databaseName] + params)
+
+      results = self.filterTableRows (cursor.fetchall ())
       cursor.close ()
 
-      if not results:
-         raise MySQLSchematizerException, 'The database "%s" does not exist or has no tables.' % self.databaseName
+      self.checkTableRows (results)
 
-      tableNames = [row [0] for row in results]
-      return tableNames
+      fingerprints = [(row [0], tuple (row [1:])) for row in results]
+      return fingerprints
 
 
    def getTableColumns (self, tableName):
@@ -199,7 +560,7 @@ class MySQLSchematizer (SchematizerBase):
       
       columns = []
 
-      cursor = self.getConnection ().cursor ()
+      cursor = self.getCursor ()
 
       cursor.execute ("""
          select column_name, data_type, is_nullable, extra
@@ -212,7 +573,7 @@ class MySQLSchematizer (SchematizerBase):
       cursor.close ()
       
       if not results:
-         raise MySQLSchematizerException, 'The table "%s.%s" does not exist or has no columns.' % (databaseName, tableName)
+         raise MySQLSchematizerException, 'The table "%s.%s" does not exist or has no columns.' % (self.getDatabaseName (), tableName)
 
       for row in results:
          column = self.schematizeColumn (*row)
@@ -223,12 +584,13 @@ class MySQLSchematizer (SchematizerBase):
 
    def getTableIndexes (self, tableName):
       """
-         Fetch a list of all of the indexes on the named table.
+         Fetch a list of all of the indexes on the named table,
+         except functional indexes; see isFunctionalIndex ().
       """
 
       indexes = []
 
-      cursor = self.getConnection ().cursor ()
+      cursor = self.getCursor ()
 
       cursor.execute ("""
          select distinct index_name, non_unique
@@ -241,39 +603,462 @@ class MySQLSchematizer (SchematizerBase):
 
       for row in results:
          index = self.schematizeTableIndex (tableName, *row)
-         indexes.append (index)
+
+         if index is not None:
+            indexes.append (index)
 
       return indexes
 
    
-   def getIndexConstraint (self, tableName, indexName):
+   def getTablesCondition (self, tableNames):
       """
-         Fetch the constraint associated with the given index,
-         if there is one.
+         Builds the condition of a query about the named tables,
+         returning a (condition, params) pair.
+
+         When only a few tables are named the condition is
+         restricted to them; otherwise it covers the whole
+         database, less any tables ruled out by the table filter,
+         and the rows of other tables must be skipped.
       """
 
-      constraint = None
+      condition = 'table_schema = %s'
+      params = [self.getDatabaseName ()]
 
-      cursor = self.getConnection ().cursor ()
+      if len (tableNames) <= MAX_TABLE_NAME_PARAMS:
+         condition += ' and table_name in (%s)' % ', '.join (['%s'] * len (tableNames))
+         params.extend (sorted (tableNames))
 
-      cursor.execute ("""
-         select constraint_type
+      else:
+         filterCondition, filterParams = self.getTableFilterCondition ()
+         condition += filterCondition
+         params.extend (filterParams)
+
+      return (condition, params)
+
+
+   def loadAllColumns (self, schema):
+      """
+         Reads the columns of every table in the given
+         DatabaseSchema.  See loadColumns ().
+      """
+
+      self.loadColumns (schema.getAllTables ())
+
+
+   def loadColumns (self, tables):
+      """
+         Reads the columns of the given TableSchema objects with
+         a single query and adds them to the tables, in ordinal
+         order.
+      """
+
+      if not tables:
+         return
+
+      tableMap = dict ((table.getName (), table) for table in tables)
+
+      cursor = self.getCursor ()
+      cursor.execute (*self.getColumnsQuery (tableMap.keys ()))
+
+      self.addColumnRows (tableMap, cursor)
+      cursor.close ()
+
+
+   def getColumnsQuery (self, tableNames):
+      """
+         Builds the query which reads the columns of the named
+         tables, returning a (sql, params) pair.
+      """
+
+      condition, params = self.getTablesCondition (tableNames)
+
+      return ("""
+         select table_name, column_name, data_type, is_nullable, extra
+            from information_schema.columns
+
+         where %s
+
+         order by table_name, ordinal_position
+         """ % condition, params)
+
+
+   def addColumnRows (self, tableMap, rows):
+      """
+         Adds the columns read by the getColumnsQuery () query
+         to the tables in the given map of table names to
+         TableSchema objects.
+
+         Raises a MySQLSchematizerException if any of the tables
+         is given no columns, as for schematizeTableColumns ().
+      """
+
+      for row in rows:
+         table = tableMap.get (row [0])
+
+         if table is not None:
+            table.addColumn (self.schematizeColumn (*row [1:]))
+
+      for tableName in sorted (tableMap.keys ()):
+         if not tableMap [tableName].getAllColumns ():
+            raise MySQLSchematizerException ('The table "%s.%s" does not exist or has no columns.' % (self.getDatabaseName (), tableName))
+
+
+   def loadAllIndexes (self, schema):
+      """
+         Reads the indexes of every table in the given
+         DatabaseSchema.  See loadIndexes ().
+      """
+
+      self.loadIndexes (schema.getAllTables ())
+
+
+   def loadIndexes (self, tables):
+      """
+         Reads the indexes of the given TableSchema objects with
+         a single query and adds them to the tables.
+
+         The statistics rows are ordered so that the columns
+         of each index arrive consecutively and in sequence,
+         allowing each IndexSchema to be completed as soon as
+         the next index begins.
+      """
+
+      if not tables:
+         return
+
+      tableMap = dict ((table.getName (), table) for table in tables)
+
+      cursor = self.getCursor ()
+      cursor.execute (*self.getIndexesQuery (tableMap.keys ()))
+
+      self.addIndexRows (tableMap, cursor)
+      cursor.close ()
+
+
+   def getIndexesQuery (self, tableNames):
+      """
+         Builds the query which reads the indexes of the named
+         tables, returning a (sql, params) pair.
+      """
+
+      condition, params = self.getTablesCondition (tableNames)
+
+      return ("""
+         select table_name, index_name, non_unique, column_name
+            from information_schema.statistics
+
+         where %s
+
+         order by table_name, index_name, seq_in_index
+         """ % condition, params)
+
+
+   def addIndexRows (self, tableMap, rows):
+      """
+         Adds the indexes read by the getIndexesQuery () query
+         to the tables in the given map of table names to
+         TableSchema objects, except functional indexes; see
+         isFunctionalIndex ().
+      """
+
+      for key, rows in itertools.groupby (rows, lambda row: row [:3]):
+         tableName, indexName, nonUnique = key
+         table = tableMap.get (tableName)
+
+         if table is None:
+            continue
+
+         rows = list (rows)
+
+         if self.isFunctionalIndex (row [3] for row in rows):
+            continue
+
+         index = IndexSchema (indexName, nonUnique)
+
+         for row in rows:
+            index.addColumn (row [3])
+
+         table.addIndex (index)
+
+
+   def isFunctionalIndex (self, columnNames):
+      """
+         Gets whether an index with the given column names, as read
+         from information_schema.statistics, is a functional index.
+
+         MySQL 8 reports a null column_name for each part of an
+         index which is an expression.  Such an index cannot be
+         described by an IndexSchema, so it is left out of the
+         schema entirely rather than described by its other
+         columns, which it may not order or constrain alone.
+      """
+
+      return None in columnNames
+
+
+   def loadAllConstraints (self, schema):
+      """
+         Reads the constraints of every table in the given
+         DatabaseSchema and attaches them to the indexes which
+         enforce them.  See loadConstraints ().
+      """
+
+      self.loadConstraints (schema.getAllTables ())
+
+
+   def loadConstraints (self, tables):
+      """
+         Reads the primary key, unique and foreign key constraints
+         of the given TableSchema objects and attaches each to the
+         index which enforces it.  The indexes of the tables must
+         already have been loaded.
+
+         The constraints are read with two queries, however many
+         tables and indexes there are.  MySQL names the index
+         enforcing a constraint after the constraint itself, but a
+         foreign key may instead be enforced by an existing index
+         whose leading columns are those of the foreign key, so
+         such an index is used when there is none of the same
+         name.  Constraints with no such index are ignored.
+      """
+
+      tableMap = dict ((table.getName (), table) for table in tables)
+      self.attachConstraints (tableMap, self.readConstraints (tableMap.keys ()))
+
+
+   def attachConstraints (self, tableMap, constraints):
+      """
+         Attaches the given (tableName, constraintName, Constraint)
+         tuples to the indexes which enforce them, in the tables
+         in the given map of table names to TableSchema objects.
+         See loadConstraints ().
+      """
+
+      # Attach foreign keys last, so that they never claim an
+      # index which enforces a primary key or unique constraint.
+      constraints.sort (key = lambda item: item [2].getType () == 'FOREIGN_KEY')
+
+      for tableName, constraintName, constraint in constraints:
+         table = tableMap.get (tableName)
+
+         if table is None:
+            continue
+
+         index = table.getIndex (constraintName)
+
+         if index is None and constraint.getType () == 'FOREIGN_KEY':
+            index = self.findEnforcingIndex (table, constraint)
+
+         if index is not None and index.getConstraint () is None:
+            index.setConstraint (constraint)
+
+
+   def findEnforcingIndex (self, table, constraint):
+      """
+         Finds the first index of the given table without a
+         constraint whose leading columns are the columns of
+         the given constraint, or returns None.
+      """
+
+      columnNames = constraint.getColumns ()
+
+      for index in table.getAllIndexes ():
+         if (index.getConstraint () is None and
+               index.getColumns () [:len (columnNames)] == columnNames):
+            return index
+
+      return None
+
+
+   def readConstraints (self, tableNames):
+      """
+         Reads the constraints of the named tables, returning a
+         list of (tableName, constraintName, Constraint) tuples.
+
+         One query reads the name and type of each constraint
+         from table_constraints, and another reads the columns of
+         all of them, and the columns which foreign keys reference,
+         from key_column_usage.  See getTablesCondition ().
+      """
+
+      if not tableNames:
+         return []
+
+      cursor = self.getCursor ()
+      cursor.execute (*self.getConstraintTypesQuery (tableNames))
+
+      typeRows = cursor.fetchall ()
+      cursor.close ()
+
+      cursor = self.getCursor ()
+      cursor.execute (*self.getConstraintColumnsQuery (tableNames))
+
+      constraints = self.compileConstraints (tableNames, typeRows, cursor)
+      cursor.close ()
+
+      return constraints
+
+
+   def getConstraintTypesQuery (self, tableNames):
+      """
+         Builds the query which reads the name and type of each
+         constraint of the named tables, returning a (sql,
+         params) pair.
+      """
+
+      condition, params = self.getTablesCondition (tableNames)
+
+      return ("""
+         select table_name, constraint_name, constraint_type
             from information_schema.table_constraints
 
-         where 
-            table_schema = %s and
-            table_name = %s and
-            constraint_name = %s
-      """, (self.getDatabaseName (), tableName))
+         where %s
+         """ % condition, params)
+
+
+   def getConstraintColumnsQuery (self, tableNames):
+      """
+         Builds the query which reads the columns of each
+         constraint of the named tables, and the columns which
+         foreign keys reference, returning a (sql, params) pair.
+      """
+
+      condition, params = self.getTablesCondition (tableNames)
+
+      return ("""
+         select table_name, constraint_name, column_name,
+               referenced_table_schema, referenced_table_name,
+               referenced_column_name
+            from information_schema.key_column_usage
+
+         where %s
+
+         order by table_name, constraint_name, ordinal_position
+         """ % condition, params)
+
+
+   def compileConstraints (self, tableNames, typeRows, columnRows):
+      """
+         Compiles the rows read by the getConstraintTypesQuery ()
+         and getConstraintColumnsQuery () queries into a list of
+         (tableName, constraintName, Constraint) tuples for the
+         named tables.
+      """
+
+      tableNames = set (tableNames)
+      constraintTypes = {}
+
+      for tableName, constraintName, constraintType in typeRows:
+         constraintTypes [(tableName, constraintName)] = constraintType
+
+      constraints = []
+
+      for key, rows in itertools.groupby (columnRows, lambda row: row [:2]):
+         tableName, constraintName = key
+
+         if tableName not in tableNames:
+            continue
 
-      result = cursor.fetchone ()
+         constraint = self.schematizeConstraint (constraintTypes.get (key), list (rows))
 
-      if result is not None:
-         constraintType = result [0]
+         if constraint is not None:
+            constraints.append ((tableName, constraintName, constraint))
+
+      return constraints
+
+
+   def schematizeConstraint (self, constraintType, rows):
+      """
+         Compiles the given key_column_usage rows of a constraint
+         of the given type into a Constraint object, or returns
+         None if the type of constraint is not supported.
+      """
+
+      if constraintType == 'PRIMARY KEY':
+         constraint = PrimaryKeyConstraint ()
+
+      elif constraintType == 'UNIQUE':
+         constraint = UniqueConstraint ()
+
+      elif constraintType == 'FOREIGN KEY':
+         databaseName = rows [0][3]
+
+         if databaseName == self.getDatabaseName ():
+            databaseName = None
+
+         constraint = ForeignKeyConstraint (rows [0][4], databaseName)
 
       else:
-         # There is no constraint associated with this index.
          return None
 
-      
+      for row in rows:
+         constraint.addColumn (row [2])
+
+         if constraintType == 'FOREIGN KEY':
+            constraint.mapColumn (row [2], row [5])
+
+      return constraint
+
+   
+   def getIndexConstraint (self, tableName, indexName):
+      """
+         Fetch the constraint associated with the given index,
+         if there is one, by the index's name.
+      """
+
+      for constraintTable, constraintName, constraint in self.readConstraints ([tableName]):
+         if constraintName == indexName:
+            return constraint
+
+      # There is no constraint associated with this index.
+      return None
+
+#--------------------------------------------------------------------
+class LazyMySQLDatabaseSchema (LazyDatabaseSchema):
+   """
+      A DatabaseSchema whose tables are introspected by a
+      MySQLSchematizer when they are first accessed.
+
+      Each group of tables loaded together is introspected with
+      a fixed number of queries, using schematizeBatch (), so
+      accessing a few tables of a large database costs little
+      more than listing its tables.
+
+      Use MySQLSchematizer.schematizeLazy () to create one.
+   """
+
+   def __init__ (self, schematizer, tableNames, prefetch = 0):
+      """
+         Initializes a LazyMySQLDatabaseSchema.
+
+         schematizer:
+            The MySQLSchematizer which introspects the tables.
+
+         tableNames:
+            The names of all of the tables, in order.
+
+         prefetch:
+            See LazyDatabaseSchema.
+      """
+
+      LazyDatabaseSchema.__init__ (self, schematizer.getDatabaseName (),
+            tableNames, prefetch)
+
+      self.schematizer = schematizer
+
+
+   def loadTables (self, tableNames):
+      """
+         Introspects the named tables, in groups of no more than
+         MAX_TABLE_NAME_PARAMS so that each query is restricted
+         to the tables it is about.
+      """
+
+      tables = []
+
+      for start in xrange (0, len (tableNames), MAX_TABLE_NAME_PARAMS):
+         tables.extend (self.schematizer.schematizeBatch (
+               tableNames [start:start + MAX_TABLE_NAME_PARAMS]))
+
+      return tables
 
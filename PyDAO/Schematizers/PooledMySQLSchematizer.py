@@ -0,0 +1,180 @@
+#
+# Pooled MySQL Schematizer
+#
+# Interprets the given MySQL database as an abstract
+# DatabaseSchema, spreading the per-table introspection
+# queries across a pool of connections.
+#
+# Uses MySQLdb connection objects.
+#
+# Part of the PyDAO package.
+#
+# (c) 2011 Lee Supe (lain_proliant)
+# Released under the GNU General Public License, version 3.
+#
+
+import threading
+from multiprocessing.pool import ThreadPool
+
+from PyDAO.Schematizers.MySQLSchematizer import *
+
+#--------------------------------------------------------------------
+class PooledMySQLSchematizer (MySQLSchematizer):
+   """
+      A MySQLSchematizer which introspects several tables at
+      once, each worker thread using its own connection.
+
+      Introspection is dominated by the latency of many small
+      queries against information_schema, so running them over
+      several connections hides most of that latency.  The
+      resulting DatabaseSchema is identical to the one built
+      by MySQLSchematizer, with its tables in the same order.
+   """
+
+   def __init__ (self, connectionFactory, databaseName, jobs = 4, bulk = False):
+      """
+         Initializes a PooledMySQLSchematizer.
+
+         connectionFactory:
+            A callable taking no arguments which returns a new,
+            open MySQLdb connection object.  It is called once
+            for each thread which issues a query.  schematize (),
+            schematizeIncremental () and schematizeLazy () issue
+            every query from the worker threads, so they open at
+            most `jobs` connections; other MySQLSchematizer
+            methods called directly, such as getTableColumns (),
+            open one more on the calling thread.  Each connection
+            must have read access to the `information_schema`
+            database.
+
+            The connections will be automatically closed once
+            the object is cleaned up, or can be closed by
+            calling closeConnection ().
+
+         databaseName:
+            The name of the database to be schematized.
+
+         jobs:
+            The number of worker threads and connections.
+
+         bulk:
+            See MySQLSchematizer.  Bulk introspection issues a
+            fixed number of queries, so it runs on a single
+            worker connection.
+      """
+
+      MySQLSchematizer.__init__ (self, None, databaseName, bulk)
+
+      self.connectionFactory = connectionFactory
+      self.jobs = jobs
+
+      self._local = threading.local ()
+      self._lock = threading.Lock ()
+      self._connections = []
+      self._pool = None
+
+      if jobs < 1:
+         raise MySQLSchematizerException ('The number of jobs must be at least 1, got %d.' % jobs)
+
+
+   def schematizeTables (self, tableNames):
+      """
+         Collects all possible information about each of the
+         named tables concurrently, returning a list of
+         TableSchema objects in the same order as the given names.
+      """
+
+      tables = self.getPool ().map (self.schematizeTable, tableNames, 1)
+      self.getPool ().apply (self.loadConstraints, (tables,))
+
+      return tables
+
+
+   def getTableNames (self):
+      """
+         Retrieves the names of all of the tables in the
+         database, on a worker connection.
+      """
+
+      return self.getPool ().apply (MySQLSchematizer.getTableNames, (self,))
+
+
+   def getTableFingerprints (self):
+      """
+         Retrieves the fingerprint of every table in the
+         database, on a worker connection.
+      """
+
+      return self.getPool ().apply (MySQLSchematizer.getTableFingerprints, (self,))
+
+
+   def schematizeBatch (self, tableNames):
+      """
+         Collects all possible information about each of the
+         named tables with set-based queries, on a worker
+         connection.  See MySQLSchematizer.schematizeBatch ().
+      """
+
+      return self.getPool ().apply (MySQLSchematizer.schematizeBatch,
+            (self, tableNames))
+
+
+   def getPool (self):
+      """
+         Fetches the pool of worker threads, creating it
+         if necessary.
+      """
+
+      if self._pool is None:
+         self._pool = ThreadPool (self.jobs)
+
+      return self._pool
+
+
+   def getConnection (self):
+      """
+         Fetches the connection assigned to the calling thread,
+         opening a new one with the connection factory if the
+         thread does not have one yet.
+
+         MySQLdb connections may not be shared between threads,
+         so each thread is given its own.
+      """
+
+      connection = getattr (self._local, 'connection', None)
+
+      if connection is None:
+         connection = self.connectionFactory ()
+         self._local.connection = connection
+
+         with self._lock:
+            self._connections.append (connection)
+
+      return connection
+
+
+   def closeConnection (self):
+      """
+         A cleanup method called upon deletion.
+
+         Shuts down the worker threads and closes all of
+         the connections which they opened.
+
+         The schematizer may still be used afterwards,
+         in which case new connections will be opened.
+      """
+
+      if self._pool is not None:
+         self._pool.close ()
+         self._pool.join ()
+         self._pool = None
+
+      with self._lock:
+         connections = self._connections
+         self._connections = []
+
+      for connection in connections:
+         connection.close ()
+
+      self._local = threading.local ()
+
@@ -0,0 +1,375 @@
+#
+# Query Profiler
+#
+# Records the queries issued by a schematizer, with their
+# latency and row counts, and summarizes them by phase.
+#
+# Part of the PyDAO package.
+#
+# (c) 2011 Lee Supe (lain_proliant)
+# Released under the GNU General Public License, version 3.
+#
+
+import re
+import threading
+import time
+
+from PyDAO.IndentWriter import *
+
+#--------------------------------------------------------------------
+# The phase of introspection to which queries against each
+# information_schema table belong.
+PHASES = {
+   'tables': 'tables',
+   'columns': 'columns',
+   'statistics': 'indexes',
+   'table_constraints': 'constraints',
+   'key_column_usage': 'constraints',
+   'referential_constraints': 'constraints'
+   }
+
+# The order in which phases are reported.
+PHASE_ORDER = ['tables', 'columns', 'indexes', 'constraints', 'other']
+
+TABLE_PATTERN = re.compile (r'\bfrom\s+information_schema\.(\w+)', re.IGNORECASE)
+
+#--------------------------------------------------------------------
+def getQueryPhase (sql):
+   """
+      Gets the phase of introspection to which the given
+      query belongs: one of PHASE_ORDER.
+   """
+
+   match = TABLE_PATTERN.search (sql)
+
+   if match is None:
+      return 'other'
+
+   return PHASES.get (match.group (1).lower (), 'other')
+
+#--------------------------------------------------------------------
+class QueryProfiler (object):
+   """
+      Records every query issued through the cursors which it
+      wraps.  See MySQLSchematizer.setProfiler ().
+
+      A QueryProfiler may be shared by cursors used from
+      several threads at once.
+   """
+
+   def __init__ (self):
+      """
+         Initializes an empty QueryProfiler.
+      """
+
+      self.records = []
+      self.lock = threading.Lock ()
+
+
+   def wrapCursor (self, cursor):
+      """
+         Wraps the given cursor so that the queries issued
+         through it are recorded.
+      """
+
+      return ProfilingCursor (self, cursor)
+
+
+   def addRecord (self, record):
+      """
+         Adds the given QueryRecord to the profile.
+      """
+
+      with self.lock:
+         self.records.append (record)
+
+
+   def getRecords (self):
+      """
+         Gets a list of the QueryRecord objects recorded
+         so far, in the order the queries were issued.
+      """
+
+      with self.lock:
+         return list (self.records)
+
+
+   def reset (self):
+      """
+         Discards all of the records.
+      """
+
+      with self.lock:
+         self.records = []
+
+
+   def getReport (self):
+      """
+         Summarizes the queries recorded so far in a QueryReport.
+      """
+
+      return QueryReport (self.getRecords ())
+
+#--------------------------------------------------------------------
+class QueryRecord (object):
+   """
+      The SQL text, parameters, latency and row count
+      of a single query.
+   """
+
+   __slots__ = ('sql', 'params', 'phase', 'executeSeconds',
+         'fetchSeconds', 'rowCount')
+
+   def __init__ (self, sql, params):
+      """
+         Initializes a QueryRecord for a query about to be run.
+      """
+
+      self.sql = sql
+      self.params = params
+      self.phase = getQueryPhase (sql)
+      self.executeSeconds = 0.0
+      self.fetchSeconds = 0.0
+      self.rowCount = 0
+
+
+   def getSQL (self):
+      return self.sql
+
+
+   def getParams (self):
+      return self.params
+
+
+   def getPhase (self):
+      return self.phase
+
+
+   def getExecuteSeconds (self):
+      """
+         Gets the time spent running the query, which includes
+         the round trip to the server.
+      """
+
+      return self.executeSeconds
+
+
+   def getFetchSeconds (self):
+      """
+         Gets the time spent fetching the query's rows.
+      """
+
+      return self.fetchSeconds
+
+
+   def getSeconds (self):
+      """
+         Gets the total time spent on the query.
+      """
+
+      return self.executeSeconds + self.fetchSeconds
+
+
+   def getRowCount (self):
+      """
+         Gets the number of rows fetched.
+      """
+
+      return self.rowCount
+
+#--------------------------------------------------------------------
+class ProfilingCursor (object):
+   """
+      A cursor which records the queries issued through
+      the cursor it wraps with a QueryProfiler.
+   """
+
+   def __init__ (self, profiler, cursor):
+      """
+         Initializes a ProfilingCursor.
+      """
+
+      self.profiler = profiler
+      self.cursor = cursor
+      self.record = None
+
+
+   def execute (self, sql, params = None):
+      """
+         Runs the given query, recording its latency.
+      """
+
+      self.record = QueryRecord (sql, params)
+      self.profiler.addRecord (self.record)
+
+      startTime = time.time ()
+
+      try:
+         return self.cursor.execute (sql, params)
+
+      finally:
+         self.record.executeSeconds = time.time () - startTime
+
+
+   def fetchone (self):
+      return self.timeFetch (self.cursor.fetchone, True)
+
+
+   def fetchmany (self, *args):
+      return self.timeFetch (lambda: self.cursor.fetchmany (*args), False)
+
+
+   def fetchall (self):
+      return self.timeFetch (self.cursor.fetchall, False)
+
+
+   def __iter__ (self):
+      return iter (self.fetchone, None)
+
+
+   def timeFetch (self, fetch, single):
+      """
+         Runs the given fetch method, adding its latency and
+         the number of rows it returns to the current record.
+      """
+
+      startTime = time.time ()
+      result = fetch ()
+
+      if self.record is not None:
+         self.record.fetchSeconds += time.time () - startTime
+
+         if single:
+            self.record.rowCount += result is not None and 1 or 0
+
+         else:
+            self.record.rowCount += len (result)
+
+      return result
+
+
+   def __getattr__ (self, name):
+      return getattr (self.cursor, name)
+
+#--------------------------------------------------------------------
+class QueryReport (object):
+   """
+      A summary of the queries recorded by a QueryProfiler,
+      giving the number of queries, rows fetched and time spent
+      in each phase of introspection.
+   """
+
+   def __init__ (self, records):
+      """
+         Initializes a QueryReport for the given QueryRecords.
+      """
+
+      self.records = records
+
+      # A map of phase names to [queries, rows, seconds] lists.
+      self.phases = {}
+
+      for record in records:
+         summary = self.phases.setdefault (record.getPhase (), [0, 0, 0.0])
+         summary [0] += 1
+         summary [1] += record.getRowCount ()
+         summary [2] += record.getSeconds ()
+
+
+   def getRecords (self):
+      """
+         Gets the QueryRecord objects summarized by the report.
+      """
+
+      return self.records
+
+
+   def getPhases (self):
+      """
+         Gets the names of the phases in which queries were
+         issued, in the order in which they are reported.
+      """
+
+      return [phase for phase in PHASE_ORDER if phase in self.phases]
+
+
+   def getQueryCount (self, phase = None):
+      """
+         Gets the number of queries issued in the given
+         phase, or in all phases.
+      """
+
+      return self.getTotal (0, phase)
+
+
+   def getRowCount (self, phase = None):
+      """
+         Gets the number of rows fetched in the given
+         phase, or in all phases.
+      """
+
+      return self.getTotal (1, phase)
+
+
+   def getSeconds (self, phase = None):
+      """
+         Gets the time spent on queries in the given
+         phase, or in all phases.
+      """
+
+      return self.getTotal (2, phase)
+
+
+   def getTotal (self, field, phase):
+      """
+         Gets the given field of the summary of the given
+         phase, or its total over all phases.
+      """
+
+      if phase is not None:
+         return self.phases.get (phase, [0, 0, 0.0]) [field]
+
+      return sum (summary [field] for summary in self.phases.values ())
+
+
+   def getSlowestRecords (self, count):
+      """
+         Gets the given number of slowest QueryRecords,
+         slowest first.
+      """
+
+      return sorted (self.records, key = lambda record: record.getSeconds (),
+            reverse = True) [:count]
+
+
+   def toStringBuilder (self, slowest = 5):
+      """
+         Builds a table of the phases and their totals,
+         followed by the given number of slowest queries.
+      """
+
+      sb = IndentStringBuilder ()
+
+      sb.println ('%-12s %8s %10s %10s' % ('phase', 'queries', 'rows', 'seconds'))
+
+      for phase in self.getPhases () + [None]:
+         sb.println ('%-12s %8d %10d %10.4f' % (phase or 'total',
+               self.getQueryCount (phase), self.getRowCount (phase),
+               self.getSeconds (phase)))
+
+      if slowest and self.records:
+         sb.newline ()
+         sb.println ('Slowest queries:')
+
+         with sb:
+            for record in self.getSlowestRecords (slowest):
+               sb.println ('%.4f s, %d rows: %s %r' % (record.getSeconds (),
+                     record.getRowCount (), ' '.join (record.getSQL ().split ()),
+                     record.getParams ()))
+
+      return sb
+
+
+   def __repr__ (self):
+      return str (self.toStringBuilder ())
+
@@ -0,0 +1,222 @@
+#
+# Table Filter
+#
+# Selects the tables of a database to be schematized by
+# glob or regular expression patterns.
+#
+# Part of the PyDAO package.
+#
+# (c) 2011 Lee Supe (lain_proliant)
+# Released under the GNU General Public License, version 3.
+#
+
+import fnmatch
+import re
+
+from PyDAO.SchematizerException import *
+
+#--------------------------------------------------------------------
+class TableFilterException (SchematizerException): pass
+
+#--------------------------------------------------------------------
+class TableFilter (object):
+   """
+      Selects tables by name: a table is selected if it matches
+      any of the include patterns, or if there are none, and
+      matches none of the exclude patterns.
+
+      Patterns are shell-style globs, as for fnmatch, or regular
+      expressions which must match the whole table name.  Both
+      are matched without regard to case, as MySQL may compare
+      the table names in information_schema.  The conditions
+      from getCondition () ignore case too, whatever the
+      collation of information_schema on the server.
+
+      A schematizer using a TableFilter asks the server only for
+      the tables which may match, using the SQL condition from
+      getCondition (), and then checks each table name returned
+      with matches ().  Globs are translated into IN and LIKE
+      conditions; patterns which cannot be translated exactly
+      are either translated into a looser condition or left to
+      be checked by matches () alone.
+   """
+
+   def __init__ (self):
+      """
+         Initializes a TableFilter which selects every table.
+      """
+
+      # Lists of (pattern, isRegex, compiledExpression) tuples.
+      self.includes = []
+      self.excludes = []
+
+
+   def addInclude (self, pattern, isRegex = False):
+      """
+         Selects the tables matching the given pattern.
+      """
+
+      self.includes.append (self.compilePattern (pattern, isRegex))
+
+
+   def addExclude (self, pattern, isRegex = False):
+      """
+         Excludes the tables matching the given pattern.
+      """
+
+      self.excludes.append (self.compilePattern (pattern, isRegex))
+
+
+   def compilePattern (self, pattern, isRegex):
+      """
+         Compiles the given pattern into a (pattern, isRegex,
+         compiledExpression) tuple.
+      """
+
+      if isRegex:
+         expression = '(?:%s)\\Z' % pattern
+
+      else:
+         expression = fnmatch.translate (pattern)
+
+      try:
+         return (pattern, isRegex, re.compile (expression, re.IGNORECASE))
+
+      except re.error, excVal:
+         raise TableFilterException ('Invalid table pattern "%s": %s' % (pattern, str (excVal)))
+
+
+   def isEmpty (self):
+      """
+         Gets whether the filter selects every table.
+      """
+
+      return not self.includes and not self.excludes
+
+
+   def matches (self, tableName):
+      """
+         Gets whether the named table is selected.
+      """
+
+      if self.includes and not any (expression.match (tableName)
+            for pattern, isRegex, expression in self.includes):
+         return False
+
+      return not any (expression.match (tableName)
+            for pattern, isRegex, expression in self.excludes)
+
+
+   def filterNames (self, tableNames):
+      """
+         Gets a list of those of the given table names which
+         are selected, in order.
+      """
+
+      return [tableName for tableName in tableNames if self.matches (tableName)]
+
+
+   def getCondition (self, column = 'table_name'):
+      """
+         Builds an SQL condition on the given column which holds
+         for every table selected by the filter, and as few other
+         tables as possible, returning a (condition, params) pair.
+         The condition is None if no tables can be ruled out on
+         the server.
+
+         Include globs without wildcards become an IN condition,
+         and other include globs become LIKE conditions, in which
+         a bracketed character set matches any character.  If any
+         include pattern is a regular expression, the includes are
+         checked only by matches ().  Exclude globs become NOT IN
+         and NOT LIKE conditions, except those with a character
+         set, which, like exclude regular expressions, are checked
+         only by matches ().
+
+         The column and the patterns are both lowered, so that
+         a server whose table names have a binary collation
+         selects the same tables as matches ().
+      """
+
+      conditions = []
+      params = []
+      column = 'lower (%s)' % column
+
+      includes = [pattern for pattern, isRegex, expression in self.includes]
+
+      if includes and not any (isRegex for pattern, isRegex, expression in self.includes):
+         names = [pattern.lower () for pattern in includes if not hasWildcards (pattern)]
+         likes = [globToLike (pattern).lower () for pattern in includes if hasWildcards (pattern)]
+
+         alternatives = ['%s like %%s' % column for like in likes]
+
+         if names:
+            alternatives.append ('%s in (%s)' % (column, ', '.join (['%s'] * len (names))))
+
+         conditions.append ('(%s)' % ' or '.join (alternatives))
+         params.extend (likes + names)
+
+      names = []
+
+      for pattern, isRegex, expression in self.excludes:
+         if isRegex or '[' in pattern:
+            continue
+
+         if hasWildcards (pattern):
+            conditions.append ('%s not like %%s' % column)
+            params.append (globToLike (pattern).lower ())
+
+         else:
+            names.append (pattern.lower ())
+
+      if names:
+         conditions.append ('%s not in (%s)' % (column, ', '.join (['%s'] * len (names))))
+         params.extend (names)
+
+      if not conditions:
+         return (None, [])
+
+      return (' and '.join (conditions), params)
+
+#--------------------------------------------------------------------
+def hasWildcards (pattern):
+   """
+      Gets whether the given glob contains any wildcards.
+   """
+
+   return any (character in pattern for character in '*?[')
+
+
+def globToLike (pattern):
+   """
+      Translates the given glob into a LIKE pattern which
+      matches every name the glob matches.  Each bracketed
+      character set becomes a single character wildcard, so
+      the LIKE pattern may also match other names.
+   """
+
+   like = ''
+   position = 0
+
+   while position < len (pattern):
+      character = pattern [position]
+      position += 1
+
+      if character == '*':
+         like += '%'
+
+      elif character == '?':
+         like += '_'
+
+      elif character == '[' and pattern.find (']', position + 1) != -1:
+         position = pattern.find (']', position + 1) + 1
+         like += '_'
+
+      elif character in '%_\\':
+         like += '\\' + character
+
+      else:
+         like += character
+
+   return like
+
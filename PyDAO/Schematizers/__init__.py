@@ -1 +1,7 @@
 from MySQLSchematizer import *
+from PooledMySQLSchematizer import *
+from CachingSchematizer import *
+from QueryProfiler import *
+from TableFilter import *
+from FleetSchematizer import *
+from AsyncMySQLSchematizer import *
@@ -0,0 +1,429 @@
+#
+# benchmark
+#
+# Times schematization, rendering and code generation for
+# a synthetic database served by a fake MySQL connection.
+#
+# (c) 2011 Lee Supe (lain_proliant)
+# Released under the GNU General Public License, version 3.
+#
+
+import getopt
+import json
+import multiprocessing
+import os
+import resource
+import shutil
+import sys
+import tempfile
+import time
+
+from PyDAO.Benchmark import *
+from PyDAO.ParallelGenerator import ParallelGenerator
+from PyDAO.SchemaXML import writeDatabaseSchema
+from PyDAO.Schematizers import MySQLSchematizer, PooledMySQLSchematizer, \
+      AsyncMySQLSchematizer
+
+#--------------------------------------------------------------------
+HELP_STRING = """
+Usage: %s [OPTION]... [SCENARIO]...
+
+Run each of the given benchmark scenarios, or all of them, against
+a synthetic database and report its round trips to the server, wall
+time and peak memory.  Each scenario runs in its own process.
+
+Scenarios:
+%s
+
+Options:
+   -h, --help           Show this help message and exit.
+   -t, --tables=N       The number of tables in the database.  (500)
+   -c, --columns=N      The number of columns in each table.  (12)
+   -i, --indexes=N      The number of indexes on each table.  (4)
+   -l, --latency=MS     The time the server takes to answer each
+                        query, in milliseconds.  (0.2)
+   -j, --jobs=N         The number of connections or processes used
+                        by the pooled, async and parallel scenarios.  (4)
+   -r, --repeat=N       Run each scenario N times, reporting the
+                        fastest run.  (3)
+   -o, --save=FILE      Save the results to FILE.
+   -C, --compare=FILE   Compare the results with those saved in FILE,
+                        exiting with status 1 if any scenario makes
+                        more round trips or is slower by more than
+                        the tolerance.
+   -T, --tolerance=PCT  The slowdown allowed by --compare, as a
+                        percentage.  (10)
+"""
+
+#--------------------------------------------------------------------
+class Fixture (object):
+   """
+      The state shared by the benchmark scenarios: the synthetic
+      schema, a fake server serving it, and a scratch directory.
+   """
+
+   def __init__ (self, schema, server, jobs):
+      self.schema = schema
+      self.server = server
+      self.jobs = jobs
+      self.outputDir = tempfile.mkdtemp (prefix = 'pydao-benchmark-')
+
+
+   def close (self):
+      shutil.rmtree (self.outputDir, True)
+
+#--------------------------------------------------------------------
+class NullFile (object):
+   """
+      A file which discards everything written to it.
+   """
+
+   def write (self, output):
+      pass
+
+#--------------------------------------------------------------------
+def schematize (fixture):
+   schematizer = MySQLSchematizer (fixture.server.connect (),
+         fixture.schema.getName ())
+   schematizer.schematize ()
+
+
+def schematizeBulk (fixture):
+   schematizer = MySQLSchematizer (fixture.server.connect (),
+         fixture.schema.getName (), bulk = True)
+   schematizer.schematize ()
+
+
+def schematizePooled (fixture):
+   schematizer = PooledMySQLSchematizer (fixture.server.connect,
+         fixture.schema.getName (), fixture.jobs)
+   schematizer.schematize ()
+   schematizer.closeConnection ()
+
+
+def schematizeAsync (fixture):
+   loop = FakeEventLoop ()
+   connections = [fixture.server.connectAsync (loop) for job in xrange (fixture.jobs)]
+
+   schematizer = AsyncMySQLSchematizer (connections, fixture.schema.getName (), loop)
+   schematizer.schematize ()
+   schematizer.closeConnection ()
+
+
+def render (fixture):
+   str (fixture.schema)
+
+
+def renderStreamed (fixture):
+   writeDatabaseSchema (fixture.schema, NullFile ())
+
+
+def generate (fixture):
+   BenchmarkGenerator (fixture.schema, None, fixture.outputDir).generate ()
+
+
+def regenerate (fixture):
+   """
+      Generates code, asking to be run a second time so that
+      only a run in which no file is rewritten is measured.
+   """
+
+   generate (fixture)
+   return True
+
+
+def generateParallel (fixture):
+   generator = BenchmarkGenerator (fixture.schema, None, fixture.outputDir)
+   ParallelGenerator (generator, fixture.jobs).generate ()
+
+
+# Each scenario's name, description and function.  A function
+# which returns True is run again, and only the second run is
+# measured.
+SCENARIOS = [
+   ('schematize', 'MySQLSchematizer, per-table queries', schematize),
+   ('schematize-bulk', 'MySQLSchematizer, bulk queries', schematizeBulk),
+   ('schematize-pooled', 'PooledMySQLSchematizer, per-table queries', schematizePooled),
+   ('schematize-async', 'AsyncMySQLSchematizer, overlapped queries', schematizeAsync),
+   ('repr', 'str () of the whole schema', render),
+   ('repr-streamed', 'writeDatabaseSchema () to a null file', renderStreamed),
+   ('generate', 'BenchmarkGenerator into an empty directory', generate),
+   ('regenerate', 'BenchmarkGenerator with unchanged output', regenerate),
+   ('generate-parallel', 'BenchmarkGenerator via ParallelGenerator', generateParallel)
+   ]
+
+#--------------------------------------------------------------------
+def getPeakMemory ():
+   """
+      Gets the peak resident memory of this process, in kilobytes.
+   """
+
+   peak = resource.getrusage (resource.RUSAGE_SELF).ru_maxrss
+
+   if sys.platform == 'darwin':
+      peak /= 1024
+
+   return peak
+
+
+def measure (function, fixture, connection):
+   """
+      Runs a scenario and sends its measurements through the
+      given pipe connection.  Runs in a child process.
+   """
+
+   try:
+      if function (fixture):
+         function (fixture)
+
+      fixture.server.resetCounters ()
+      startMemory = getPeakMemory ()
+      startTime = time.time ()
+
+      function (fixture)
+
+      result = {
+         'seconds': time.time () - startTime,
+         'queries': fixture.server.getQueryCount (),
+         'rows': fixture.server.getRowCount (),
+         'connections': fixture.server.getConnectionCount (),
+         'peakMemory': getPeakMemory (),
+         'memoryGrowth': getPeakMemory () - startMemory
+         }
+
+   except Exception, excVal:
+      result = {'error': '%s: %s' % (type (excVal).__name__, str (excVal))}
+
+   connection.send (result)
+   connection.close ()
+
+
+def runScenario (function, fixture):
+   """
+      Runs a scenario in a fresh process forked from this one,
+      so that its peak memory is not masked by that of the
+      scenarios before it, and returns its measurements.
+   """
+
+   receiver, sender = multiprocessing.Pipe (False)
+   process = multiprocessing.Process (target = measure,
+         args = (function, fixture, sender))
+
+   process.start ()
+   result = receiver.recv ()
+   process.join ()
+
+   return result
+
+
+def runScenarios (names, fixture, repeat):
+   """
+      Runs the named scenarios, each the given number of times,
+      and returns a map of names to the fastest run's results.
+   """
+
+   results = {}
+
+   for name, description, function in SCENARIOS:
+      if name not in names:
+         continue
+
+      best = None
+
+      for run in xrange (repeat):
+         # Each run starts from an empty output directory.
+         for filename in os.listdir (fixture.outputDir):
+            os.remove (os.path.join (fixture.outputDir, filename))
+
+         result = runScenario (function, fixture)
+
+         if 'error' in result:
+            best = result
+            break
+
+         if best is None or result ['seconds'] < best ['seconds']:
+            best = result
+
+      results [name] = best
+
+   return results
+
+#--------------------------------------------------------------------
+def printResults (names, results, baseline):
+   """
+      Prints a table of results, with the change in wall
+      time relative to the baseline results, if any.
+   """
+
+   print '%-20s %8s %9s %10s %11s %12s %8s' % ('scenario', 'queries',
+         'rows', 'seconds', 'peak (KB)', 'growth (KB)', 'change')
+
+   for name in names:
+      result = results [name]
+
+      if 'error' in result:
+         print '%-20s %s' % (name, result ['error'])
+         continue
+
+      change = ''
+
+      if name in baseline and baseline [name].get ('seconds'):
+         change = '%+7.1f%%' % (100.0 * (result ['seconds'] - baseline [name]['seconds'])
+               / baseline [name]['seconds'])
+
+      print '%-20s %8d %9d %10.4f %11d %12d %8s' % (name, result ['queries'],
+            result ['rows'], result ['seconds'], result ['peakMemory'],
+            result ['memoryGrowth'], change)
+
+
+def findRegressions (results, baseline, tolerance):
+   """
+      Compares the results with the baseline results, returning
+      a list of messages describing each regression.
+   """
+
+   regressions = []
+
+   for name in sorted (results):
+      result = results [name]
+      previous = baseline.get (name)
+
+      if previous is None or 'error' in previous:
+         continue
+
+      if 'error' in result:
+         regressions.append ('%s: %s' % (name, result ['error']))
+         continue
+
+      if result ['queries'] > previous ['queries']:
+         regressions.append ('%s: %d queries, up from %d' % (name,
+               result ['queries'], previous ['queries']))
+
+      if result ['seconds'] > previous ['seconds'] * (1 + tolerance / 100.0):
+         regressions.append ('%s: %.4f seconds, up from %.4f' % (name,
+               result ['seconds'], previous ['seconds']))
+
+   return regressions
+
+#--------------------------------------------------------------------
+def main (argv):
+   """
+      Entry point for the benchmark suite.
+   """
+
+   options = {
+         'tables': 500,
+         'columns': 12,
+         'indexes': 4,
+         'latency': 0.2,
+         'jobs': 4,
+         'repeat': 3,
+         'save': None,
+         'compare': None,
+         'tolerance': 10.0
+         }
+
+   scenarioHelp = '\n'.join ('   %-20s %s' % (name, description)
+         for name, description, function in SCENARIOS)
+   helpString = HELP_STRING % (os.path.basename (argv [0]), scenarioHelp)
+
+   try:
+      opts, args = getopt.getopt (argv [1:], 'ht:c:i:l:j:r:o:C:T:',
+            ['help', 'tables=', 'columns=', 'indexes=', 'latency=', 'jobs=',
+             'repeat=', 'save=', 'compare=', 'tolerance='])
+
+      for opt, val in opts:
+         if opt in ('-h', '--help'):
+            print helpString
+            sys.exit (0)
+
+         elif opt in ('-t', '--tables'):
+            options ['tables'] = int (val)
+
+         elif opt in ('-c', '--columns'):
+            options ['columns'] = int (val)
+
+         elif opt in ('-i', '--indexes'):
+            options ['indexes'] = int (val)
+
+         elif opt in ('-l', '--latency'):
+            options ['latency'] = float (val)
+
+         elif opt in ('-j', '--jobs'):
+            options ['jobs'] = int (val)
+
+         elif opt in ('-r', '--repeat'):
+            options ['repeat'] = int (val)
+
+         elif opt in ('-o', '--save'):
+            options ['save'] = val
+
+         elif opt in ('-C', '--compare'):
+            options ['compare'] = val
+
+         elif opt in ('-T', '--tolerance'):
+            options ['tolerance'] = float (val)
+
+   except (getopt.GetoptError, ValueError), excVal:
+      sys.stderr.write ('%s\n' % str (excVal))
+      sys.stderr.write (helpString)
+      sys.exit (2)
+
+   scenarioNames = [name for name, description, function in SCENARIOS]
+   names = args or scenarioNames
+
+   for name in names:
+      if name not in scenarioNames:
+         sys.stderr.write ('Unknown scenario: %s\n' % name)
+         sys.exit (2)
+
+   names = [name for name in scenarioNames if name in names]
+
+   baseline = {}
+
+   if options ['compare'] is not None:
+      with open (options ['compare']) as infile:
+         baseline = json.load (infile) ['results']
+
+   schema = buildSyntheticSchema (options ['tables'], options ['columns'],
+         options ['indexes'])
+
+   server = FakeServer (options ['latency'] / 1000.0)
+   server.addDatabase (schema)
+
+   fixture = Fixture (schema, server, options ['jobs'])
+
+   try:
+      print 'Schema: %d tables x %d columns x %d indexes, %.2f ms per query' % (
+            options ['tables'], options ['columns'], options ['indexes'],
+            options ['latency'])
+      print
+
+      results = runScenarios (names, fixture, options ['repeat'])
+
+   finally:
+      fixture.close ()
+
+   printResults (names, results, baseline)
+
+   if options ['save'] is not None:
+      with open (options ['save'], 'w') as outfile:
+         json.dump ({'options': options, 'results': results}, outfile,
+               indent = 3, sort_keys = True)
+
+   regressions = findRegressions (results, baseline, options ['tolerance'])
+
+   if regressions:
+      print
+      print 'Regressions:'
+
+      for regression in regressions:
+         print '   %s' % regression
+
+      sys.exit (1)
+
+   sys.exit (0)
+
+#--------------------------------------------------------------------
+if __name__ == "__main__":
+   main (sys.argv)
@@ -0,0 +1,353 @@
+#
+# fakeSchematizerTest
+#
+# Checks the schematizers against a synthetic database served
+# by a fake MySQL server with simulated latency, comparing
+# what each of them reads with what MySQLSchematizer reads.
+#
+# (c) 2011 Lee Supe (lain_proliant)
+# Released under the GNU General Public License, version 3.
+#
+
+import os
+import shutil
+import sys
+import tempfile
+
+from PyDAO.Benchmark import *
+from PyDAO.Generators.PHP import MySQLiGenerator
+from PyDAO.Schema import DatabaseSchema, TableSchema, ColumnSchema, SchemaDiff
+from PyDAO.Schematizers import MySQLSchematizer, PooledMySQLSchematizer, \
+      CachingSchematizer, AsyncMySQLSchematizer, MySQLSchematizerException, \
+      TableFilter
+
+#--------------------------------------------------------------------
+# The number of connections used by the pooled schematizer.
+JOBS = 4
+
+# The time the fake server takes to answer each query, in seconds.
+LATENCY = 0.0002
+
+#--------------------------------------------------------------------
+class TestFailure (Exception): pass
+
+def check (condition, message):
+   """
+      Raises a TestFailure with the given message unless
+      the condition holds.
+   """
+
+   if not condition:
+      raise TestFailure (message)
+
+
+def checkSameSchema (expected, actual, label):
+   """
+      Checks that the given DatabaseSchema is the same as the
+      one read by MySQLSchematizer, tables in the same order.
+   """
+
+   diff = SchemaDiff (expected, actual)
+
+   check (diff.isEmpty (), '%s differs from MySQLSchematizer:\n%s' % (label, diff))
+   check (expected.getTableNames () == actual.getTableNames (),
+         '%s has the tables in a different order.' % label)
+
+#--------------------------------------------------------------------
+def testPooled (server, expected):
+   for bulk in (False, True):
+      server.resetCounters ()
+
+      schematizer = PooledMySQLSchematizer (server.connect, expected.getName (), JOBS, bulk)
+      checkSameSchema (expected, schematizer.schematize (), 'PooledMySQLSchematizer (bulk = %s)' % bulk)
+      schematizer.closeConnection ()
+
+      check (server.getConnectionCount () <= JOBS,
+            '%d connections were opened for %d jobs.' % (server.getConnectionCount (), JOBS))
+
+
+def testPooledCaching (server, expected):
+   directory = tempfile.mkdtemp (prefix = 'pydao-test-')
+
+   try:
+      server.resetCounters ()
+
+      schematizer = PooledMySQLSchematizer (server.connect, expected.getName (), JOBS)
+      caching = CachingSchematizer (schematizer, os.path.join (directory, 'schema.cache'))
+
+      checkSameSchema (expected, caching.schematize (), 'A first cached read')
+      checkSameSchema (expected, caching.schematize (), 'A second cached read')
+      schematizer.closeConnection ()
+
+      check (server.getConnectionCount () <= JOBS,
+            '%d connections were opened for %d jobs.' % (server.getConnectionCount (), JOBS))
+
+   finally:
+      shutil.rmtree (directory, True)
+
+
+class FailingAsyncConnection (object):
+   """
+      Wraps a FakeAsyncConnection, failing the queries about the
+      given information_schema table as the server would, from
+      the event loop, and answering the others as usual.
+   """
+
+   def __init__ (self, connection, loop, table):
+      self.connection = connection
+      self.loop = loop
+      self.table = table
+
+
+   def query (self, sql, params, callback):
+      if 'information_schema.%s' % self.table in sql:
+         self.loop.callLater (0, callback, None, OperationalError ('Injected failure.'))
+
+      else:
+         self.connection.query (sql, params, callback)
+
+
+class SilentAsyncConnection (object):
+   """
+      A non-blocking connection which accepts every query
+      and never answers any.
+   """
+
+   def query (self, sql, params, callback):
+      pass
+
+
+def connectAsync (server, loop):
+   """
+      Opens JOBS FakeAsyncConnections to the given server.
+   """
+
+   return [server.connectAsync (loop) for job in xrange (JOBS)]
+
+
+def testAsync (server, expected):
+   loop = FakeEventLoop ()
+
+   schematizer = AsyncMySQLSchematizer (connectAsync (server, loop), expected.getName (), loop)
+   checkSameSchema (expected, schematizer.schematize (), 'AsyncMySQLSchematizer')
+   schematizer.closeConnection ()
+
+
+def testAsyncQueryError (server, expected):
+   loop = FakeEventLoop ()
+   connections = [FailingAsyncConnection (connection, loop, 'statistics')
+         for connection in connectAsync (server, loop)]
+
+   outcomes = []
+
+   schematizer = AsyncMySQLSchematizer (connections, expected.getName ())
+   schematizer.schematizeAsync (lambda schema, error: outcomes.append ((schema, error)))
+
+   # Run until every query has been answered, so that results
+   # arriving for the abandoned batch are seen to be ignored.
+   loop.run ()
+
+   check (len (outcomes) == 1, 'The callback was called %d times.' % len (outcomes))
+
+   schema, error = outcomes [0]
+
+   check (schema is None and isinstance (error, OperationalError),
+         'The callback was given (%s, %r) rather than the injected error.' % (
+            type (schema).__name__, error))
+
+
+def testAsyncSendError (server, expected):
+   loop = FakeEventLoop ()
+   connections = connectAsync (server, loop)
+   connections [0].close ()
+
+   # A connection which cannot send is dropped, and the others
+   # carry on without it.
+   schematizer = AsyncMySQLSchematizer (connections, expected.getName (), loop)
+   checkSameSchema (expected, schematizer.schematize (), 'AsyncMySQLSchematizer with a closed connection')
+
+   for connection in connections:
+      connection.close ()
+
+   # Once every connection is dropped, the error of the last
+   # one is raised rather than waiting for a free connection.
+   schematizer = AsyncMySQLSchematizer (connections, expected.getName (), loop)
+
+   try:
+      schematizer.schematize ()
+      check (False, 'Closed connections did not raise an error.')
+
+   except ProgrammingError:
+      pass
+
+
+def testAsyncLoopStopped (server, expected):
+   loop = FakeEventLoop ()
+
+   schematizer = AsyncMySQLSchematizer ([SilentAsyncConnection ()], expected.getName (), loop)
+
+   try:
+      schematizer.schematize ()
+      check (False, 'A loop which stopped early did not raise an error.')
+
+   except MySQLSchematizerException:
+      pass
+
+
+def testIncrementalForeignKeyGraph (server, expected):
+   schema = buildSyntheticSchema (5, 4, 3, 'incremental', foreignKeys = True)
+
+   before = FakeServer ()
+   before.addDatabase (schema)
+
+   previous = MySQLSchematizer (before.connect (), schema.getName ()).schematize ()
+   tableName = getSyntheticTableName (2)
+
+   check (previous.getForeignKeyGraph ().getReferencedTables (tableName) == [getSyntheticTableName (1)],
+         'The foreign key of %s is missing from the graph.' % tableName)
+
+   # Drop the foreign key, and patch the previous schema to match.
+   schema.getTable (tableName).removeIndex ('fk_%s_parent' % tableName)
+
+   after = FakeServer ()
+   after.addDatabase (schema)
+
+   MySQLSchematizer (after.connect (), schema.getName ()).schematizeIncremental (previous)
+   graph = previous.getForeignKeyGraph ()
+
+   check (graph.getForeignKeys (tableName) == [],
+         'The dropped foreign key is still in the graph: %r' % graph.getForeignKeys (tableName))
+   check (graph.getReferencingTables (getSyntheticTableName (1)) == [],
+         'The dropped foreign key still references %s.' % getSyntheticTableName (1))
+
+
+def testTableFilterLike (server, expected):
+   # Table names in which _, % and \\ are literal characters,
+   # names which match only if they are taken as wildcards, and
+   # names which match only if case is ignored, as the fake server
+   # compares table names with a binary collation.
+   tableNames = ['user_a', 'userxa', 'rate%_1', 'rate%x1', 'ratex_1',
+         'tmp_1', 'tmpx1', 'a\\b1', 'ab1', 'a\\\\b1', '100%', '1000',
+         'Users', 'USER_B', 'Tmp_2']
+
+   schema = DatabaseSchema ('filtered')
+
+   for tableName in tableNames:
+      table = TableSchema (tableName)
+      table.addColumn (ColumnSchema ('id', 'int', 'NO', ''))
+      schema.addTable (table)
+
+   filterServer = FakeServer ()
+   filterServer.addDatabase (schema)
+
+   # Each case's include and exclude globs, and the LIKE and IN
+   # parameters which they must be pushed down as.
+   cases = [
+      (['user_*'], [], ['user\\_%']),
+      (['rate%_?'], [], ['rate\\%\\__']),
+      (['a\\b*'], [], ['a\\\\b%']),
+      (['*'], ['tmp_*', '100%'], ['%', 'tmp\\_%', '100%']),
+      (['100%', 'user_a'], [], ['100%', 'user_a']),
+      (['User*'], [], ['user%']),
+      (['USERS', 'user_b'], [], ['users', 'user_b']),
+      (['*'], ['TMP_*', 'users'], ['%', 'tmp\\_%', 'users'])
+      ]
+
+   for includes, excludes, expectedParams in cases:
+      tableFilter = TableFilter ()
+
+      for pattern in includes:
+         tableFilter.addInclude (pattern)
+
+      for pattern in excludes:
+         tableFilter.addExclude (pattern)
+
+      label = 'The filter %r, %r' % (includes, excludes)
+      condition, params = tableFilter.getCondition ()
+
+      check (params == expectedParams, '%s has the parameters %r rather than %r.' % (
+            label, params, expectedParams))
+
+      # Without character sets, the globs are translated exactly,
+      # so the server must select just the tables matches () does.
+      rows = filterServer.answer ('select table_name from information_schema.tables '
+            'where table_schema = %%s and %s' % condition, [schema.getName ()] + params)
+
+      selected = [row [0] for row in rows]
+      matched = tableFilter.filterNames (tableNames)
+
+      check (sorted (selected) == sorted (matched), '%s selects %r on the server, but matches %r.' % (
+            label, selected, matched))
+
+
+def testFunctionalIndex (server, expected):
+   schema = buildSyntheticSchema (2, 4, 2, 'functional')
+   tableName = getSyntheticTableName (1)
+
+   functionalServer = FakeServer ()
+   functionalServer.addDatabase (schema)
+
+   # A functional index over column_1 and an expression, which
+   # MySQL 8 reports with a null column_name.
+   for position, columnName in enumerate (['column_1', None]):
+      functionalServer.addRow ('statistics', table_schema = schema.getName (),
+            table_name = tableName, non_unique = 0, index_schema = schema.getName (),
+            index_name = 'functional', seq_in_index = position + 1,
+            column_name = columnName)
+
+   for bulk in (False, True):
+      actual = MySQLSchematizer (functionalServer.connect (), schema.getName (), bulk).schematize ()
+      label = 'MySQLSchematizer (bulk = %s)' % bulk
+
+      check (not actual.getTable (tableName).hasIndex ('functional'),
+            '%s read the functional index.' % label)
+      check (SchemaDiff (schema, actual).isEmpty (),
+            '%s read the other indexes differently:\n%s' % (label, SchemaDiff (schema, actual)))
+
+      for table in actual.getAllTables ():
+         MySQLiGenerator (actual, None).generateTable (table)
+
+
+# Each test's name and function.  A test function takes the
+# FakeServer and the DatabaseSchema read by MySQLSchematizer,
+# and raises a TestFailure if the test fails.
+TESTS = [
+   ('pooled', testPooled),
+   ('pooled-caching', testPooledCaching),
+   ('async', testAsync),
+   ('async-query-error', testAsyncQueryError),
+   ('async-send-error', testAsyncSendError),
+   ('async-loop-stopped', testAsyncLoopStopped),
+   ('incremental-fk-graph', testIncrementalForeignKeyGraph),
+   ('table-filter-like', testTableFilterLike),
+   ('functional-index', testFunctionalIndex)
+   ]
+
+#--------------------------------------------------------------------
+def main (argv):
+   """
+      Runs every test, exiting with status 1 if any fails.
+   """
+
+   schema = buildSyntheticSchema (200, 8, 4, foreignKeys = True)
+
+   server = FakeServer (LATENCY)
+   server.addDatabase (schema)
+
+   expected = MySQLSchematizer (server.connect (), schema.getName ()).schematize ()
+   failures = 0
+
+   for name, test in TESTS:
+      try:
+         test (server, expected)
+         print '%-20s ok' % name
+
+      except TestFailure, excVal:
+         print '%-20s FAILED: %s' % (name, str (excVal))
+         failures += 1
+
+   sys.exit (failures and 1 or 0)
+
+#--------------------------------------------------------------------
+if __name__ == "__main__":
+   main (sys.argv)
@@ -0,0 +1,483 @@
+#
+# generatorTest
+#
+# Checks the generators and the machinery they share,
+# using small synthetic schemas.
+#
+# (c) 2011 Lee Supe (lain_proliant)
+# Released under the GNU General Public License, version 3.
+#
+
+import os
+import re
+import shutil
+import sys
+import tempfile
+
+from PyDAO.Benchmark import *
+from PyDAO.Generators.PHP import *
+from PyDAO.IndexLinter import *
+from PyDAO.Schema import *
+
+#--------------------------------------------------------------------
+class TestFailure (Exception): pass
+
+def check (condition, message):
+   """
+      Raises a TestFailure with the given message unless
+      the condition holds.
+   """
+
+   if not condition:
+      raise TestFailure (message)
+
+
+def withTempDirectory (function):
+   """
+      Calls the given function with the path of a new temporary
+      directory, removing the directory afterwards.
+   """
+
+   directory = tempfile.mkdtemp (prefix = 'pydao-test-')
+
+   try:
+      return function (directory)
+
+   finally:
+      shutil.rmtree (directory, True)
+
+
+def buildTable (tableName, columns, primaryKey):
+   """
+      Builds a TableSchema with the given (name, datatype,
+      extra) columns, none nullable, and a primary key over
+      the named columns.
+   """
+
+   table = TableSchema (tableName)
+
+   for columnName, datatype, extra in columns:
+      table.addColumn (ColumnSchema (columnName, datatype, 'NO', extra))
+
+   index = IndexSchema ('PRIMARY', 0)
+   index.setConstraint (PrimaryKeyConstraint ())
+
+   for columnName in primaryKey:
+      index.addColumn (columnName)
+      index.getConstraint ().addColumn (columnName)
+
+   table.addIndex (index)
+
+   return table
+
+
+def addIndex (table, indexName, columnNames, isUnique):
+   """
+      Adds an index over the named columns to the given table.
+   """
+
+   index = IndexSchema (indexName, not isUnique)
+
+   for columnName in columnNames:
+      index.addColumn (columnName)
+
+   table.addIndex (index)
+
+
+def generateDAO (table):
+   """
+      Generates the source of the MySQLi DAO of the given table.
+   """
+
+   schema = DatabaseSchema ('test')
+   schema.addTable (table)
+
+   return dict (MySQLiGenerator (schema, None).generateTable (table)) [
+         '%sDAO.php' % toClassName (table.getName ())]
+
+
+def getStatements (table):
+   """
+      Gets a map of the SQL constants of the MySQLi DAO of
+      the given table to their SQL.
+   """
+
+   return dict (MySQLiGenerator (None, None).getStatements (table))
+
+
+def checkContains (source, text):
+   """
+      Checks that the given generated source contains the
+      given text.
+   """
+
+   check (text in source, 'The generated source lacks: %s' % text)
+
+#--------------------------------------------------------------------
+def testOutputUnchanged ():
+   def test (directory):
+      schema = buildSyntheticSchema (3, 4, 2)
+      written = BenchmarkGenerator (schema, None, directory).generate ()
+
+      check (len (written) == 3, 'Wrote %d files rather than 3.' % len (written))
+
+      # Backdate the files, so that rewriting them would be seen
+      # even within the resolution of the file system's clock.
+      for filename in written:
+         os.utime (os.path.join (directory, filename), (1000000000, 1000000000))
+
+      written = BenchmarkGenerator (schema, None, directory).generate ()
+      check (written == [], 'Unchanged files were rewritten: %r' % written)
+
+      for filename in os.listdir (directory):
+         if filename.endswith ('.php'):
+            mtime = os.stat (os.path.join (directory, filename)).st_mtime
+            check (mtime == 1000000000, 'The unchanged file %s was touched.' % filename)
+
+   withTempDirectory (test)
+
+
+def testOutputModePreserved ():
+   def test (directory):
+      schema = buildSyntheticSchema (2, 4, 2)
+      BenchmarkGenerator (schema, None, directory).generate ()
+
+      modes = {'table_00000.php': 0640, 'table_00001.php': 0444}
+
+      for filename, mode in modes.items ():
+         os.chmod (os.path.join (directory, filename), mode)
+
+      for table in schema.getAllTables ():
+         table.addColumn (ColumnSchema ('added', 'int', 'YES', ''))
+
+      written = BenchmarkGenerator (schema, None, directory).generate ()
+      check (sorted (written) == sorted (modes), 'Wrote %r rather than %r.' % (written, sorted (modes)))
+
+      for filename, mode in modes.items ():
+         path = os.path.join (directory, filename)
+
+         with open (path, 'rb') as infile:
+            check ('$added' in infile.read (), 'The file %s was not rewritten.' % filename)
+
+         actual = os.stat (path).st_mode & 07777
+         check (actual == mode, 'The file %s has mode %o rather than %o.' % (filename, actual, mode))
+
+   withTempDirectory (test)
+
+
+def testBatchSinglePrimaryKey ():
+   table = buildTable ('user_account', [
+         ('id', 'bigint', 'auto_increment'),
+         ('name', 'varchar', '')], ['id'])
+
+   generator = MySQLiGenerator (None, None)
+   statements = getStatements (table)
+   source = generateDAO (table)
+
+   getMany = generator.getGetManyBatch (table)
+
+   check (getMany.getSQL (4) == 'select `id`, `name` from `user_account` where `id` in (?, ?, ?, ?)',
+         'Wrong batch SQL: %s' % getMany.getSQL (4))
+   check (statements ['SQL_GET_MANY_BY_PRIMARY_KEY'] == getMany.prefix,
+         'Wrong SQL_GET_MANY_BY_PRIMARY_KEY: %s' % statements ['SQL_GET_MANY_BY_PRIMARY_KEY'])
+   checkContains (source, "$this->selectByKeys (self::SQL_GET_MANY_BY_PRIMARY_KEY, '?', ', ', ')', 'i', 1024, $keys)")
+   checkContains (source, '$results [serialize (array ($vo->getId ()))] = $vo;')
+
+   insert = generator.getInsertBatch (table)
+
+   check (insert.getSQL (2) == 'insert into `user_account` (`name`) values (?), (?)',
+         'Wrong batch SQL: %s' % insert.getSQL (2))
+   check (statements ['SQL_INSERT'] == insert.getSQL (1), 'Wrong SQL_INSERT: %s' % statements ['SQL_INSERT'])
+   check (statements ['SQL_INSERT_MANY'] == insert.prefix, 'Wrong SQL_INSERT_MANY: %s' % statements ['SQL_INSERT_MANY'])
+   checkContains (source, "return $this->insertRows (self::SQL_INSERT_MANY, '(?)', 's', 1024, $rows);")
+
+
+def testBatchCompositePrimaryKey ():
+   table = buildTable ('group_member', [
+         ('group_id', 'int', ''),
+         ('user_id', 'bigint', ''),
+         ('role', 'varchar', '')], ['group_id', 'user_id'])
+
+   generator = MySQLiGenerator (None, None)
+   statements = getStatements (table)
+   source = generateDAO (table)
+
+   getMany = generator.getGetManyBatch (table)
+   sql = getMany.getSQL (2)
+
+   check (sql == 'select `group_id`, `user_id`, `role` from `group_member` where '
+         '(`group_id` = ? and `user_id` = ?) or (`group_id` = ? and `user_id` = ?)',
+         'Wrong batch SQL: %s' % sql)
+   check (statements ['SQL_GET_MANY_BY_PRIMARY_KEY'] == getMany.prefix,
+         'Wrong SQL_GET_MANY_BY_PRIMARY_KEY: %s' % statements ['SQL_GET_MANY_BY_PRIMARY_KEY'])
+   checkContains (source, "$this->selectByKeys (self::SQL_GET_MANY_BY_PRIMARY_KEY, "
+         "'(`group_id` = ? and `user_id` = ?)', ' or ', '', 'ii', 1024, $keys)")
+   checkContains (source, '$results [serialize (array ($vo->getGroupId (), $vo->getUserId ()))] = $vo;')
+
+   insert = generator.getInsertBatch (table)
+
+   check (statements ['SQL_INSERT'] == 'insert into `group_member` (`group_id`, `user_id`, `role`) values (?, ?, ?)',
+         'Wrong SQL_INSERT: %s' % statements ['SQL_INSERT'])
+   check (insert.getSQL (1) == statements ['SQL_INSERT'], 'Wrong batch SQL: %s' % insert.getSQL (1))
+   checkContains (source, "return $this->insertRows (self::SQL_INSERT_MANY, '(?, ?, ?)', 'iis', 1024, $rows);")
+
+
+def testBatchRowCounts ():
+   powers = [2 ** n for n in xrange (11)]
+
+   for bindTypes, maxRows in (('i', 1024), ('i' * 63, 1024), ('i' * 64, 512),
+         ('s' * 100, 512), ('s' * 65535, 1), ('s' * 70000, 1)):
+
+      batch = BatchStatement ('insert into `t` values ', '(...)', ', ', '', bindTypes)
+
+      check (batch.getMaxRows () == maxRows, '%d parameters per row give batches of up to %d rows rather than %d.' % (
+            len (bindTypes), batch.getMaxRows (), maxRows))
+      check (batch.getRowCounts () == [rowCount for rowCount in powers if rowCount <= maxRows],
+            'Wrong row counts for %d parameters per row: %r' % (len (bindTypes), batch.getRowCounts ()))
+
+   # The limit is emitted into the DAO of a wide table.
+   table = buildTable ('wide', [('column_%d' % c, 'int', '') for c in xrange (100)], ['column_0'])
+   checkContains (generateDAO (table), "return $this->insertRows (self::SQL_INSERT_MANY, '(%s)', '%s', 512, $rows);" % (
+         ', '.join (['?'] * 100), 'i' * 100))
+
+
+def testBatchStatementKeys ():
+   # Batch statements are cached by their SQL, so statements of
+   # different row counts, or of different batches of a table,
+   # must never share their SQL.
+   table = buildTable ('pair', [('id', 'int', ''), ('other_id', 'int', '')], ['id'])
+
+   generator = MySQLiGenerator (None, None)
+   batches = [generator.getGetManyBatch (table), generator.getInsertBatch (table)]
+
+   sqls = [batch.getSQL (rowCount) for batch in batches for rowCount in batch.getRowCounts ()]
+   check (len (set (sqls)) == len (sqls), 'Batch statements share their SQL.')
+
+   for batch in batches:
+      check (batch.getSQL (8) == batch.getSQL (8), 'The SQL of a batch statement is not stable.')
+      check (batch.getSQL (8).count ('?') == 8 * len (batch.bindTypes),
+            'The statement of 8 rows has the wrong number of parameters: %s' % batch.getSQL (8))
+
+
+def testKeysetConditions ():
+   generator = MySQLiGenerator (None, None)
+
+   cases = [
+      (['a'], '`a` > ?', ['a']),
+      (['a', 'b'], '`a` > ? or (`a` = ? and `b` > ?)', ['a', 'a', 'b']),
+      (['a', 'b', 'c'], '`a` > ? or (`a` = ? and `b` > ?) or (`a` = ? and `b` = ? and `c` > ?)',
+         ['a', 'a', 'b', 'a', 'b', 'c'])
+      ]
+
+   for keyColumnNames, condition, parameters in cases:
+      actual = generator.getKeysetCondition (keyColumnNames)
+      check (actual == condition, 'The keyset condition of %r is %s' % (keyColumnNames, actual))
+
+      actual = generator.getKeysetParameters (keyColumnNames)
+      check (actual == parameters, 'The keyset parameters of %r are %r' % (keyColumnNames, actual))
+
+   # The condition and its parameters are emitted into the DAO.
+   table = buildTable ('reading', [
+         ('id', 'bigint', 'auto_increment'),
+         ('sensor', 'int', ''),
+         ('taken', 'datetime', ''),
+         ('sequence', 'int', '')], ['id'])
+
+   addIndex (table, 'sensor_taken_sequence', ['sensor', 'taken', 'sequence'], True)
+
+   statements = getStatements (table)
+   source = generateDAO (table)
+
+   check (statements ['SQL_PAGE_BY_SENSOR_AND_TAKEN_AND_SEQUENCE'] ==
+         'select `id`, `sensor`, `taken`, `sequence` from `reading` where '
+         '`sensor` > ? or (`sensor` = ? and `taken` > ?) or (`sensor` = ? and `taken` = ? and `sequence` > ?) '
+         'order by `sensor`, `taken`, `sequence` limit ?',
+         'Wrong page SQL: %s' % statements ['SQL_PAGE_BY_SENSOR_AND_TAKEN_AND_SEQUENCE'])
+   checkContains (source, "$stmt->bind_param ('iisisii', $sensor, $sensor, $taken, $sensor, $taken, $sequence, $limit);")
+
+
+def testPagesSkipped ():
+   generator = MySQLiGenerator (None, None)
+
+   # Without a primary key, only unique indexes over columns
+   # which are never null can order the rows completely.
+   table = TableSchema ('log')
+   table.addColumn (ColumnSchema ('serial', 'int', 'NO', ''))
+   table.addColumn (ColumnSchema ('code', 'int', 'YES', ''))
+   table.addColumn (ColumnSchema ('level', 'int', 'NO', ''))
+
+   addIndex (table, 'serial', ['serial'], True)
+   addIndex (table, 'code', ['code'], True)
+   addIndex (table, 'level', ['level'], False)
+
+   pages = generator.getPages (table)
+   check (pages == [('pageBySerial', ['serial'])], 'Wrong pages: %r' % pages)
+
+   source = generateDAO (table)
+
+   for methodName in ('pageByCode', 'pageByLevel', 'pageByPrimaryKey'):
+      check ('function %s ' % methodName not in source, 'The DAO has a %s method.' % methodName)
+
+   # Every finder which may return many rows has an iterator.
+   iterators = [methodName for methodName, finderName, columnNames in generator.getIterators (table)]
+   check (iterators == ['iterate', 'iterateByLevel'], 'Wrong iterators: %r' % iterators)
+
+
+def getPreparedStatements (source):
+   """
+      Gets a map of the names of the methods of the given
+      generated DAO source to the SQL constants which each
+      passes to the statement cache, directly or through a
+      batch statement.
+   """
+
+   prepared = {}
+   methodName = None
+
+   for line in source.splitlines ():
+      match = re.match (r'\s*public function (\w+) ', line)
+
+      if match is not None:
+         methodName = match.group (1)
+         prepared [methodName] = []
+
+      for constantName in re.findall (r'\$this->(?:prepare|selectByKeys|insertRows) \(self::(\w+)', line):
+         prepared [methodName].append (constantName)
+
+   return prepared
+
+
+def testStatementCache ():
+   table = buildTable ('task', [
+         ('id', 'bigint', 'auto_increment'),
+         ('owner', 'int', ''),
+         ('title', 'varchar', '')], ['id'])
+
+   addIndex (table, 'owner', ['owner'], False)
+
+   statements = getStatements (table)
+   source = generateDAO (table)
+   prepared = getPreparedStatements (source)
+
+   # Every statement is prepared through the cache, which keys
+   # the statements of each connection by their SQL.
+   check ('->db->' not in source and '$db->prepare' not in source,
+         'The DAO uses its connection directly.')
+
+   used = set (constantName for constantNames in prepared.values () for constantName in constantNames)
+   check (used == set (statements), 'The DAO prepares %r, but has the statements %r.' % (
+         sorted (used), sorted (statements)))
+
+   # Different statements must have different cache keys.
+   check (len (set (statements.values ())) == len (statements), 'Statements of the DAO share their SQL.')
+
+   # Methods running the same query share its cached statement.
+   check (prepared ['findByOwner'] == prepared ['iterateByOwner'] == ['SQL_FIND_BY_OWNER'],
+         'findByOwner prepares %r and iterateByOwner %r.' % (prepared ['findByOwner'], prepared ['iterateByOwner']))
+   check (prepared ['getByPrimaryKey'] == ['SQL_GET_BY_PRIMARY_KEY'],
+         'getByPrimaryKey prepares %r.' % prepared ['getByPrimaryKey'])
+
+   # A batch of one row shares the statement of insert (), and
+   # batches of other row counts each have a statement of their own.
+   insert = MySQLiGenerator (None, None).getInsertBatch (table)
+   batchSQLs = [insert.getSQL (rowCount) for rowCount in insert.getRowCounts ()]
+
+   check (batchSQLs [0] == statements ['SQL_INSERT'], 'A batch of one row does not share the insert statement.')
+   check (len (set (batchSQLs)) == len (batchSQLs), 'Batches of different row counts share a statement.')
+
+
+def testIndexLint ():
+   table = buildTable ('event', [
+         ('id', 'bigint', 'auto_increment'),
+         ('account_id', 'int', ''),
+         ('kind', 'varchar', ''),
+         ('created', 'datetime', '')], ['id'])
+
+   index = IndexSchema ('account_created', 1)
+   index.addColumn ('account_id')
+   index.addColumn ('created')
+   table.addIndex (index)
+
+   schema = DatabaseSchema ('test')
+   schema.addTable (table)
+
+   def shape (name, equalColumns = (), orderColumns = ()):
+      return QueryShape (name, 'event', 'select ...', equalColumns, orderColumns)
+
+   queries = [
+      shape ('byAccount', ['account_id']),
+      shape ('byAccountAndCreated', ['account_id', 'created']),
+      shape ('byAccountOrdered', ['account_id'], ['created', 'id']),
+      shape ('byPrimaryKey', ['id']),
+      shape ('byKind', ['kind']),
+      shape ('byKindOrdered', ['kind'], ['created']),
+      shape ('byCreated', ['created']),
+      shape ('orderedByCreated', [], ['created']),
+      shape ('orderedByAccount', [], ['account_id', 'created'])
+      ]
+
+   findings = [(finding.getQuery ().name, finding.getKind ())
+         for finding in IndexLinter (schema).lint (queries).getFindings ()]
+
+   expected = [
+      ('byKind', IndexLintFinding.SCAN),
+      ('byKindOrdered', IndexLintFinding.SCAN),
+      ('byCreated', IndexLintFinding.SCAN),
+      ('orderedByCreated', IndexLintFinding.SORT)
+      ]
+
+   check (findings == expected, 'Found %r rather than %r.' % (findings, expected))
+
+   message = IndexLintFinding (queries [4], IndexLintFinding.SCAN).getMessage ()
+   check (message == 'No index of `event` begins with any of the columns (kind) '
+         'of the where clause; every row is read.', 'Wrong message: %s' % message)
+
+   # Every finder and page of the generated DAO follows an index.
+   generator = MySQLiGenerator (schema, None)
+   shapeNames = [query.name for query in generator.getQueryShapes (table)]
+
+   check ('EventDAO::SQL_FIND_BY_ACCOUNT_ID_AND_CREATED' in shapeNames and
+         'EventDAO::SQL_PAGE_BY_ACCOUNT_ID_AND_CREATED' in shapeNames,
+         'The generated queries were not all described: %r' % shapeNames)
+
+   report = generator.lintIndexes ()
+   check (report.isEmpty (), 'The generated queries cannot all use an index:\n%s' % report)
+
+
+# Each test's name and function.  A test function takes no
+# arguments and raises a TestFailure if the test fails.
+TESTS = [
+   ('output-unchanged', testOutputUnchanged),
+   ('output-mode', testOutputModePreserved),
+   ('batch-single-key', testBatchSinglePrimaryKey),
+   ('batch-composite-key', testBatchCompositePrimaryKey),
+   ('batch-row-counts', testBatchRowCounts),
+   ('batch-statement-keys', testBatchStatementKeys),
+   ('statement-cache', testStatementCache),
+   ('keyset-conditions', testKeysetConditions),
+   ('pages-skipped', testPagesSkipped),
+   ('index-lint', testIndexLint)
+   ]
+
+#--------------------------------------------------------------------
+def main (argv):
+   """
+      Runs every test, exiting with status 1 if any fails.
+   """
+
+   failures = 0
+
+   for name, test in TESTS:
+      try:
+         test ()
+         print '%-20s ok' % name
+
+      except TestFailure, excVal:
+         print '%-20s FAILED: %s' % (name, str (excVal))
+         failures += 1
+
+   sys.exit (failures and 1 or 0)
+
+#--------------------------------------------------------------------
+if __name__ == "__main__":
+   main (sys.argv)
@@ -0,0 +1,181 @@
+#
+# memoryBenchmark
+#
+# Measures the memory used by the schema model for a
+# synthetic database.
+#
+# (c) 2011 Lee Supe (lain_proliant)
+# Released under the GNU General Public License, version 3.
+#
+
+import sys
+
+import PyDAO.Schema
+from PyDAO.Schema import *
+
+#--------------------------------------------------------------------
+DATATYPES = ['int', 'bigint', 'varchar', 'datetime', 'decimal', 'text']
+EXTRAS = ['', '', '', 'on update CURRENT_TIMESTAMP']
+
+#--------------------------------------------------------------------
+def fresh (value):
+   """
+      Returns a new string object equal to the given string,
+      as a database driver would for each row it returns.
+   """
+
+   return ''.join (list (value))
+
+#--------------------------------------------------------------------
+def buildSchema (tableCount, columnCount, indexCount):
+   """
+      Builds a synthetic DatabaseSchema, using a new string
+      object for every name, data type and extra value.
+   """
+
+   schema = DatabaseSchema ('benchmark')
+
+   for t in xrange (tableCount):
+      table = TableSchema ('table_%d' % t)
+      table.addColumn (ColumnSchema (fresh ('id'), fresh ('bigint'), 'NO', fresh ('auto_increment')))
+
+      for c in xrange (1, columnCount):
+         table.addColumn (ColumnSchema ('column_%d' % c,
+               fresh (DATATYPES [c % len (DATATYPES)]),
+               'YES' if c % 2 else 'NO',
+               fresh (EXTRAS [c % len (EXTRAS)])))
+
+      primaryKey = IndexSchema (fresh ('PRIMARY'), 0)
+      primaryKey.addColumn (fresh ('id'))
+      primaryKey.setConstraint (PrimaryKeyConstraint ())
+      primaryKey.getConstraint ().addColumn (fresh ('id'))
+      table.addIndex (primaryKey)
+
+      for i in xrange (1, indexCount):
+         index = IndexSchema ('index_%d' % i, 1)
+         index.addColumn ('column_%d' % (i % columnCount))
+         table.addIndex (index)
+
+      schema.addTable (table)
+
+   return schema
+
+#--------------------------------------------------------------------
+def getSlots (obj):
+   """
+      Gets the names of all of the slots of the given object.
+   """
+
+   slots = []
+
+   for cls in type (obj).__mro__:
+      slots.extend (cls.__dict__.get ('__slots__', ()))
+
+   return slots
+
+#--------------------------------------------------------------------
+class DictBacked (object):
+   """
+      An object with an instance dictionary, used to measure
+      the size of the schema objects without slots.
+   """
+
+   pass
+
+#--------------------------------------------------------------------
+def measure (root, dictBacked):
+   """
+      Measures the total size in bytes of all of the objects
+      reachable from the given root, counting each object once.
+
+      If dictBacked is True, each slotted schema object is
+      counted as the size of an ordinary object plus an
+      instance dictionary holding the same attributes, which
+      is what it would cost without slots.
+   """
+
+   seen = set ()
+   stack = [root]
+   total = 0
+
+   while stack:
+      obj = stack.pop ()
+
+      if id (obj) in seen:
+         continue
+
+      seen.add (id (obj))
+
+      slots = getSlots (obj)
+
+      if slots:
+         values = [getattr (obj, name) for name in slots]
+
+         if dictBacked:
+            total += sys.getsizeof (DictBacked ())
+            total += sys.getsizeof (dict (zip (slots, values)))
+
+         else:
+            total += sys.getsizeof (obj)
+
+         stack.extend (values)
+
+      elif isinstance (obj, DatabaseSchema):
+         total += sys.getsizeof (obj) + sys.getsizeof (obj.__dict__)
+         stack.extend (obj.__dict__.values ())
+
+      elif isinstance (obj, dict):
+         total += sys.getsizeof (obj)
+         stack.extend (obj.keys ())
+         stack.extend (obj.values ())
+
+      elif isinstance (obj, (list, tuple)):
+         total += sys.getsizeof (obj)
+         stack.extend (obj)
+
+      else:
+         total += sys.getsizeof (obj)
+
+   return total
+
+#--------------------------------------------------------------------
+def main (argv):
+   """
+      Entry point for the memory benchmark.
+
+      Usage: memoryBenchmark.py [TABLES [COLUMNS [INDEXES]]]
+   """
+
+   counts = [int (arg) for arg in argv [1:4]]
+   tableCount, columnCount, indexCount = counts + [2000, 20, 4][len (counts):]
+
+   internString = PyDAO.Schema.internString
+
+   # Build one schema without interning, as before.
+   PyDAO.Schema.internString = lambda value: value
+   plainSchema = buildSchema (tableCount, columnCount, indexCount)
+   PyDAO.Schema.internString = internString
+
+   compactSchema = buildSchema (tableCount, columnCount, indexCount)
+
+   results = [
+         ('dict-backed, not interned', measure (plainSchema, True)),
+         ('slots, not interned', measure (plainSchema, False)),
+         ('slots, interned', measure (compactSchema, False))
+         ]
+
+   print 'Schema: %d tables x %d columns x %d indexes' % (
+         tableCount, columnCount, indexCount)
+   print
+
+   print '%-28s %14s %12s %8s' % ('', 'bytes', 'per table', 'saved')
+
+   baseline = results [0][1]
+
+   for label, size in results:
+      print '%-28s %14d %12d %7.1f%%' % (label, size,
+            size / tableCount, 100.0 * (baseline - size) / baseline)
+
+#--------------------------------------------------------------------
+if __name__ == "__main__":
+   main (sys.argv)
@@ -7,38 +7,331 @@
 # Released under the GNU General Public License, version 3.
 #
 
-import MySQLdb
 import getpass
 import getopt
 import sys
 import os
 
-from PyDAO.Exception import PyDAOException
+from PyDAO.Generators.PHP import MySQLiGenerator
+from PyDAO.ParallelGenerator import ParallelGenerator
+from PyDAO.PyDAOException import PyDAOException
+from PyDAO.SchemaSnapshot import writeSnapshot
+from PyDAO.SchemaXML import loadDatabaseSchema, writeDatabaseSchema
+from PyDAO.Schematizers import MySQLSchematizer, PooledMySQLSchematizer, \
+      CachingSchematizer, FleetSchematizer, QueryProfiler, TableFilter
 
 #--------------------------------------------------------------------
-# LRS-TODO: Further define command line parameters.
 HELP_STRING = """
-Usage: %s [OPTION]...
+Usage: %s [OPTION]... {DATABASE | --xml=FILE}
+  or:  %s [OPTION]... --fleet SHARD...
 
 Generate DAO and/or VO class stubs for the given MySQL database tables.
+
+With --fleet, read each SHARD, named [HOST[:PORT]/]DATABASE, and report
+the shards whose structure differs from that of the majority, exiting
+with status 1 if any do or cannot be read.
+
+Options:
+   -h, --help           Show this help message and exit.
+   -H, --host=HOST      The MySQL server to connect to.  (localhost)
+   -P, --port=PORT      The port of the MySQL server.  (3306)
+   -u, --user=USER      The MySQL user to connect as.  (current user)
+   -p, --password       Prompt for the MySQL password.
+   -j, --jobs=N         Introspect N tables at a time, each over its
+                        own connection.  (1)
+   -b, --bulk           Read the whole database with a fixed number
+                        of set-based queries.
+   -c, --cache=FILE     Keep the schema in FILE, re-reading only the
+                        tables which have changed since it was written.
+   -s, --snapshot=FILE  Also write the schema to FILE as a binary
+                        snapshot.
+   -F, --fleet          Read several shards, each with set-based
+                        queries, and report their drift.  --jobs
+                        gives the number of shards read at once.
+   -x, --xml=FILE       Read the schema from FILE, as written by a
+                        previous run, instead of from a database.
+   -o, --output=DIR     Generate PHP mysqli VO and DAO classes into DIR
+                        and list the files written, instead of printing
+                        the schema.
+   -L, --lint           Check that every query of the generated DAOs can
+                        use an index of its table, reporting those which
+                        cannot and exiting with status 1 if any do.
+                        With --output, nothing is generated unless all
+                        of the queries can.
+   -I, --include=GLOB   Only read the tables matching GLOB.  May be
+                        given more than once.
+   -E, --exclude=GLOB   Do not read the tables matching GLOB.  May be
+                        given more than once.
+       --include-regex=RE
+                        As --include, with a regular expression.
+       --exclude-regex=RE
+                        As --exclude, with a regular expression.
+       --profile        Report the queries issued to the database, by
+                        phase, on standard error.
 """
 
+#--------------------------------------------------------------------
+def getSchematizer (options, databaseName):
+   """
+      Creates a schematizer for the named database according
+      to the given command line options.
+   """
+
+   schematizer = createSchematizer (options, databaseName)
+   schematizer.setTableFilter (options ['filter'])
+
+   return schematizer
+
+
+def getShardSchematizer (options, shardName):
+   """
+      Creates a schematizer for the given shard, named
+      [HOST[:PORT]/]DATABASE, which reads it in bulk over
+      a single connection.
+   """
+
+   shardOptions = dict (options, jobs = 1, bulk = True)
+   databaseName = shardName
+
+   if '/' in shardName:
+      host, databaseName = shardName.split ('/', 1)
+
+      if ':' in host:
+         host, port = host.split (':', 1)
+         shardOptions ['port'] = int (port)
+
+      shardOptions ['host'] = host
+
+   return getSchematizer (shardOptions, databaseName)
+
+
+def createSchematizer (options, databaseName):
+   """
+      Creates the schematizer of the right kind for the
+      given command line options.
+
+      MySQLdb is only imported here, so that schemas can be
+      read from files on machines without the driver.
+   """
+
+   try:
+      import MySQLdb
+
+   except ImportError:
+      raise PyDAOException ('The MySQLdb driver is needed to read a schema from a database.')
+
+   connectArgs = {
+         'host': options ['host'],
+         'port': options ['port'],
+         'user': options ['user']
+         }
+
+   if options ['password'] is not None:
+      connectArgs ['passwd'] = options ['password']
+
+   def connect ():
+      return MySQLdb.connect (**connectArgs)
+
+   if options ['jobs'] > 1:
+      return PooledMySQLSchematizer (connect, databaseName,
+            options ['jobs'], options ['bulk'])
+
+   else:
+      return MySQLSchematizer (connect (), databaseName, options ['bulk'])
+
+#--------------------------------------------------------------------
+def reportFleet (options, shardNames):
+   """
+      Reads the named shards and prints their drift report,
+      returning the exit status.
+   """
+
+   profiler = QueryProfiler ()
+
+   def createShardSchematizer (shardName):
+      schematizer = getShardSchematizer (options, shardName)
+
+      if options ['profile']:
+         schematizer.setProfiler (profiler)
+
+      return schematizer
+
+   try:
+      fleet = FleetSchematizer (createShardSchematizer, shardNames,
+            options ['jobs']).schematize ()
+
+   except PyDAOException, excVal:
+      sys.stderr.write ('Error: %s\n' % str (excVal))
+      return 1
+
+   report = fleet.getDriftReport ()
+   sys.stdout.write (str (report))
+
+   if options ['profile']:
+      sys.stderr.write (str (profiler.getReport ()))
+
+   return not report.isEmpty () and 1 or 0
+
 #--------------------------------------------------------------------
 def main (argv):
    """
       Entry point for the pydao utility.
    """
-   
+
+   options = {
+         'host': 'localhost',
+         'port': 3306,
+         'user': getpass.getuser (),
+         'password': None,
+         'jobs': 1,
+         'bulk': False,
+         'cache': None,
+         'snapshot': None,
+         'xml': None,
+         'output': None,
+         'lint': False,
+         'profile': False,
+         'fleet': False,
+         'filter': TableFilter ()
+         }
+
+   try:
+      opts, args = getopt.getopt (argv [1:], 'hH:P:u:pj:bc:s:x:o:LFI:E:',
+            ['help', 'host=', 'port=', 'user=', 'password', 'jobs=', 'bulk',
+             'cache=', 'snapshot=', 'xml=', 'output=', 'lint', 'fleet', 'include=', 'exclude=',
+             'include-regex=', 'exclude-regex=', 'profile'])
+
+   except getopt.GetoptError, excVal:
+      sys.stderr.write ('%s\n' % str (excVal))
+      sys.stderr.write (HELP_STRING % ((os.path.basename (argv [0]),) * 2))
+      sys.exit (2)
+
+   try:
+      for opt, val in opts:
+         if opt in ('-h', '--help'):
+            print HELP_STRING % ((os.path.basename (argv [0]),) * 2)
+            sys.exit (0)
+
+         elif opt in ('-H', '--host'):
+            options ['host'] = val
+
+         elif opt in ('-P', '--port'):
+            options ['port'] = int (val)
+
+         elif opt in ('-u', '--user'):
+            options ['user'] = val
+
+         elif opt in ('-p', '--password'):
+            options ['password'] = getpass.getpass ('Password: ', sys.stderr)
+
+         elif opt in ('-j', '--jobs'):
+            options ['jobs'] = int (val)
+
+         elif opt in ('-b', '--bulk'):
+            options ['bulk'] = True
+
+         elif opt in ('-c', '--cache'):
+            options ['cache'] = val
+
+         elif opt in ('-s', '--snapshot'):
+            options ['snapshot'] = val
+
+         elif opt in ('-x', '--xml'):
+            options ['xml'] = val
+
+         elif opt in ('-o', '--output'):
+            options ['output'] = val
+
+         elif opt in ('-L', '--lint'):
+            options ['lint'] = True
+
+         elif opt in ('-F', '--fleet'):
+            options ['fleet'] = True
+
+         elif opt in ('-I', '--include'):
+            options ['filter'].addInclude (val)
+
+         elif opt in ('-E', '--exclude'):
+            options ['filter'].addExclude (val)
+
+         elif opt == '--include-regex':
+            options ['filter'].addInclude (val, True)
+
+         elif opt == '--exclude-regex':
+            options ['filter'].addExclude (val, True)
+
+         elif opt == '--profile':
+            options ['profile'] = True
+
+   except (ValueError, PyDAOException), excVal:
+      sys.stderr.write ('Invalid option value: %s\n' % str (excVal))
+      sys.exit (2)
+
+   if options ['fleet']:
+      if not args or options ['xml'] or options ['cache'] or options ['snapshot'] or \
+            options ['output'] or options ['lint']:
+         sys.stderr.write (HELP_STRING % ((os.path.basename (argv [0]),) * 2))
+         sys.exit (2)
+
+      sys.exit (reportFleet (options, args))
+
+   if len (args) != (options ['xml'] is None and 1 or 0):
+      sys.stderr.write (HELP_STRING % ((os.path.basename (argv [0]),) * 2))
+      sys.exit (2)
+
    try:
-      print "Hello, world!"
+      if options ['xml'] is not None:
+         schema = loadDatabaseSchema (options ['xml'])
+         schema.retainTables (lambda table: options ['filter'].matches (table.getName ()))
+
+      else:
+         schematizer = getSchematizer (options, args [0])
+         profiler = QueryProfiler ()
+
+         if options ['profile']:
+            schematizer.setProfiler (profiler)
+
+         if options ['cache'] is not None:
+            schema = CachingSchematizer (schematizer, options ['cache']).schematize ()
+
+         else:
+            schema = schematizer.schematize ()
+
+         schematizer.closeConnection ()
+
+         if options ['profile']:
+            sys.stderr.write (str (profiler.getReport ()))
+
+      if options ['snapshot'] is not None:
+         writeSnapshot (schema, options ['snapshot'])
+
+      if options ['output'] is not None:
+         generator = MySQLiGenerator (schema, None, options ['output'])
+         generator.setStrictIndexes (options ['lint'])
+
+         for filename in ParallelGenerator (generator, options ['jobs']).generate ():
+            print filename
+
+      elif options ['lint']:
+         report = MySQLiGenerator (schema, None).lintIndexes ()
+
+         if not report.isEmpty ():
+            sys.stderr.write (str (report))
+            sys.exit (1)
+
+      else:
+         writeDatabaseSchema (schema, sys.stdout)
 
-      raise PyDAOException, "Test exception."
+   except IOError, excVal:
+      sys.stderr.write ('Error: %s\n' % str (excVal))
+      sys.exit (1)
 
    except PyDAOException, excVal:
-      print "Caught %s" % str (excVal)
+      sys.stderr.write ('Error: %s\n' % str (excVal))
+      sys.exit (1)
 
    sys.exit (0)
 
 #--------------------------------------------------------------------
 if __name__ == "__main__":
-   main (sys.argv[:1])
+   main (sys.argv)
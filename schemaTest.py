@@ -0,0 +1,510 @@
+#
+# schemaTest
+#
+# Checks the schema classes and the indexes built over them,
+# using small hand-built schemas.
+#
+# (c) 2011 Lee Supe (lain_proliant)
+# Released under the GNU General Public License, version 3.
+#
+
+import os
+import shutil
+import struct
+import sys
+import tempfile
+from StringIO import StringIO
+
+from PyDAO.Schema import *
+from PyDAO.SchemaSnapshot import *
+from PyDAO.SchemaXML import *
+
+#--------------------------------------------------------------------
+class TestFailure (Exception): pass
+
+def check (condition, message):
+   """
+      Raises a TestFailure with the given message unless
+      the condition holds.
+   """
+
+   if not condition:
+      raise TestFailure (message)
+
+
+def buildTable (tableName, *referencedTableNames):
+   """
+      Builds a TableSchema with an `id` primary key and, for
+      each of the given table names, a column and a foreign
+      key referencing that table's `id`.
+   """
+
+   table = TableSchema (tableName)
+   table.addColumn (ColumnSchema ('id', 'bigint', 'NO', 'auto_increment'))
+
+   primaryKey = IndexSchema ('PRIMARY', 0)
+   primaryKey.addColumn ('id')
+   primaryKey.setConstraint (PrimaryKeyConstraint ())
+   primaryKey.getConstraint ().addColumn ('id')
+   table.addIndex (primaryKey)
+
+   for referencedTableName in referencedTableNames:
+      columnName = '%s_id' % referencedTableName
+      table.addColumn (ColumnSchema (columnName, 'bigint', 'YES', ''))
+
+      index = IndexSchema ('fk_%s_%s' % (tableName, referencedTableName), 1)
+      index.addColumn (columnName)
+
+      constraint = ForeignKeyConstraint (referencedTableName)
+      constraint.addColumn (columnName)
+      constraint.mapColumn (columnName, 'id')
+      index.setConstraint (constraint)
+
+      table.addIndex (index)
+
+   return table
+
+
+def buildSchema (*tables):
+   """
+      Builds a DatabaseSchema of the given tables.
+   """
+
+   schema = DatabaseSchema ('test')
+   schema.addTables (tables)
+
+   return schema
+
+
+def buildSampleSchema ():
+   """
+      Builds a DatabaseSchema with a few related tables and
+      columns of several types.
+   """
+
+   schema = buildSchema (buildTable ('user'), buildTable ('post', 'user'),
+         buildTable ('comment', 'post', 'user'))
+
+   schema.getTable ('post').addColumn (ColumnSchema ('title', 'varchar', 'NO', ''))
+   schema.getTable ('post').addColumn (ColumnSchema ('updated', 'datetime', 'YES',
+         'on update CURRENT_TIMESTAMP'))
+
+   return schema
+
+
+def withTempDirectory (function):
+   """
+      Calls the given function with the path of a new temporary
+      directory, removing the directory afterwards.
+   """
+
+   directory = tempfile.mkdtemp (prefix = 'pydao-test-')
+
+   try:
+      return function (directory)
+
+   finally:
+      shutil.rmtree (directory, True)
+
+#--------------------------------------------------------------------
+def testGraphSelfReference ():
+   graph = buildSchema (buildTable ('node', 'node'), buildTable ('leaf')).getForeignKeyGraph ()
+
+   check (graph.getReferencedTables ('node') == ['node'],
+         'The self-reference is missing: %r' % graph.getReferencedTables ('node'))
+   check (graph.getCycles () == [['node']], 'Wrong cycles: %r' % graph.getCycles ())
+   check (not graph.isAcyclic (), 'A self-referencing table was found acyclic.')
+
+
+def testGraphTwoCycle ():
+   graph = buildSchema (buildTable ('a', 'b'), buildTable ('b', 'a'),
+         buildTable ('c', 'a')).getForeignKeyGraph ()
+
+   check (graph.getCycles () == [['a', 'b']], 'Wrong cycles: %r' % graph.getCycles ())
+   check (graph.getStronglyConnectedComponents () == [['a', 'b'], ['c']],
+         'Wrong components: %r' % graph.getStronglyConnectedComponents ())
+   check (graph.getTopologicalOrder () == ['a', 'b', 'c'],
+         'Wrong order: %r' % graph.getTopologicalOrder ())
+
+
+def testGraphLongChain ():
+   # Each table references the one before it, deeper than
+   # the recursion limit, listed in reverse so that every
+   # search starts from the far end of the chain.
+   length = sys.getrecursionlimit () * 2
+   tableNames = ['table_%05d' % t for t in xrange (length)]
+
+   tables = [buildTable (tableNames [0])] + [buildTable (tableNames [t], tableNames [t - 1])
+         for t in xrange (1, length)]
+
+   graph = buildSchema (*reversed (tables)).getForeignKeyGraph ()
+
+   check (graph.isAcyclic (), 'A chain was found to have cycles.')
+   check (graph.getTopologicalOrder () == tableNames,
+         'The chain is not in dependency order.')
+
+
+def testGraphRebuilt ():
+   schema = buildSchema (buildTable ('a'), buildTable ('b', 'a'), buildTable ('c', 'b', 'a'))
+   graph = schema.getForeignKeyGraph ()
+
+   check (schema.getForeignKeyGraph () is graph, 'An unchanged graph was rebuilt.')
+   check (graph.getReferencingTables ('a') == ['b', 'c'],
+         'Wrong referencing tables: %r' % graph.getReferencingTables ('a'))
+
+   schema.getTable ('c').removeIndex ('fk_c_a')
+   graph = schema.getForeignKeyGraph ()
+
+   check (graph.getReferencingTables ('a') == ['b'],
+         'A removed foreign key is still in the graph: %r' % graph.getReferencingTables ('a'))
+
+   schema.removeTable ('a')
+   graph = schema.getForeignKeyGraph ()
+
+   check (not graph.hasTable ('a'), 'A removed table is still in the graph.')
+   check (graph.getUnresolvedForeignKeys () == [('b', 'fk_b_a', 'a')],
+         'Wrong unresolved foreign keys: %r' % graph.getUnresolvedForeignKeys ())
+
+
+def testGraphConstraintChanged ():
+   schema = buildSchema (buildTable ('a'), buildTable ('b'))
+   table = schema.getTable ('b')
+
+   index = IndexSchema ('fk_b_a', 1)
+   index.addColumn ('id')
+   table.addIndex (index)
+
+   tableHash = table.getStructuralHash ()
+   graph = schema.getForeignKeyGraph ()
+
+   check (graph.getReferencedTables ('b') == [], 'Wrong referenced tables: %r' % graph.getReferencedTables ('b'))
+
+   # Attach the constraint to an index already in the table.
+   constraint = ForeignKeyConstraint ('a')
+   constraint.addColumn ('id')
+   constraint.mapColumn ('id', 'id')
+   index.setConstraint (constraint)
+
+   check (table.getStructuralHash () != tableHash, 'The table hash is stale after setConstraint ().')
+   check (schema.getForeignKeyGraph ().getReferencedTables ('b') == ['a'],
+         'The graph is stale after setConstraint (): %r' % schema.getForeignKeyGraph ().getReferencedTables ('b'))
+
+   # Changing the constraint in place reaches the table too.
+   tableHash = table.getStructuralHash ()
+   constraint.mapColumn ('id', 'other_id')
+
+   check (table.getStructuralHash () != tableHash, 'The table hash is stale after mapColumn ().')
+
+   table.getStructuralHash ()
+   table.getColumn ('id').resetStructuralHash ()
+
+   check (table.structuralHash is None, 'The table hash survived a change to its column.')
+
+
+def testGraphCached ():
+   schema = buildSampleSchema ()
+   graph = schema.getForeignKeyGraph ()
+
+   # Fetching the cached graph does not rehash the tables.
+   for table in schema.getAllTables ():
+      table.structuralHash = 'unchanged'
+
+   check (schema.getForeignKeyGraph () is graph, 'An unchanged graph was rebuilt.')
+   check (all (table.structuralHash == 'unchanged' for table in schema.getAllTables ()),
+         'The tables were rehashed to fetch the graph.')
+
+   # A change to a table shared with another schema reaches both.
+   other = buildSchema (schema.getTable ('user'))
+   otherGraph = other.getForeignKeyGraph ()
+
+   schema.getTable ('user').addIndex (buildTable ('user', 'post').getIndex ('fk_user_post'))
+
+   check (schema.getForeignKeyGraph ().getReferencedTables ('user') == ['post'],
+         'The graph of the schema is stale.')
+   check (other.getForeignKeyGraph () is not otherGraph, 'The graph of the other schema is stale.')
+
+
+def testBufferedWriterFlush ():
+   outfile = StringIO ()
+   writer = BufferedIndentWriter (outfile)
+
+   writer.println ('<a>')
+
+   with writer:
+      with writer:
+         writer.println ('<b/>')
+
+      check (outfile.getvalue () == '', 'An inner with block flushed the buffer.')
+
+   check (outfile.getvalue () == '<a>\n      <b/>\n',
+         'The outermost with block did not flush the buffer: %r' % outfile.getvalue ())
+
+   try:
+      with writer:
+         writer.println ('<c/>')
+         raise TestFailure ('unwound')
+
+   except TestFailure:
+      pass
+
+   check (outfile.getvalue ().endswith ('   <c/>\n'), 'The buffer was not flushed on an exception.')
+
+   writer.println ('</a>')
+   writer.close ()
+
+   check (outfile.getvalue ().endswith ('</a>\n'), 'close () did not flush the buffer.')
+
+
+def testSnapshotRoundTrip ():
+   def test (directory):
+      schema = buildSampleSchema ()
+      path = os.path.join (directory, 'schema.snapshot')
+
+      writeSnapshot (schema, path)
+      snapshot = loadSnapshot (path)
+
+      try:
+         check (snapshot.getName () == schema.getName (), 'Wrong database name: %s' % snapshot.getName ())
+         check (snapshot.getTableNames () == schema.getTableNames (),
+               'Wrong tables: %r' % snapshot.getTableNames ())
+         check (snapshot.getStructuralHash () == schema.getStructuralHash (),
+               'The snapshot differs from the schema.')
+
+      finally:
+         snapshot.close ()
+
+   withTempDirectory (test)
+
+
+def testSnapshotCorruptHeader ():
+   def test (directory):
+      path = os.path.join (directory, 'schema.snapshot')
+      writeSnapshot (buildSampleSchema (), path)
+
+      with open (path, 'rb') as infile:
+         data = infile.read ()
+
+      start = len (SNAPSHOT_MAGIC) + 4
+      headerLength, = struct.unpack ('<I', data [len (SNAPSHOT_MAGIC):start])
+
+      for label, corrupt in (
+            ('truncated', data [:start + headerLength / 2]),
+            ('garbled', data [:start] + '\xff' * headerLength + data [start + headerLength:])):
+
+         with open (path, 'wb') as outfile:
+            outfile.write (corrupt)
+
+         try:
+            loadSnapshot (path).close ()
+            check (False, 'A %s header did not raise an error.' % label)
+
+         except SchemaSnapshotException:
+            pass
+
+   withTempDirectory (test)
+
+
+def testSnapshotCorruptTable ():
+   def test (directory):
+      path = os.path.join (directory, 'schema.snapshot')
+      writeSnapshot (buildSampleSchema (), path)
+
+      snapshot = loadSnapshot (path)
+      offset, length = snapshot.tableOffsets ['post']
+      start = snapshot.dataStart + offset
+      snapshot.close ()
+
+      with open (path, 'rb') as infile:
+         data = infile.read ()
+
+      with open (path, 'wb') as outfile:
+         outfile.write (data [:start] + '\xff' * length + data [start + length:])
+
+      snapshot = loadSnapshot (path)
+
+      try:
+         check (snapshot.getTable ('user') is not None, 'An intact table could not be loaded.')
+
+         try:
+            snapshot.getTable ('post')
+            check (False, 'A corrupt table did not raise an error.')
+
+         except SchemaSnapshotException, excVal:
+            check ('post' in str (excVal), 'The error does not name the table: %s' % excVal)
+
+      finally:
+         snapshot.close ()
+
+   withTempDirectory (test)
+
+
+def testDiffIdentical ():
+   diff = SchemaDiff (buildSampleSchema (), buildSampleSchema ())
+
+   check (diff.isEmpty (), 'Identical schemas differ:\n%s' % diff)
+   check (buildSampleSchema ().getStructuralHash () == buildSampleSchema ().getStructuralHash (),
+         'Identical schemas have different structural hashes.')
+
+
+def testDiffTables ():
+   oldSchema = buildSampleSchema ()
+   newSchema = buildSampleSchema ()
+
+   newSchema.removeTable ('comment')
+   newSchema.addTable (buildTable ('tag', 'post'))
+
+   diff = SchemaDiff (oldSchema, newSchema)
+
+   check ([table.getName () for table in diff.getAddedTables ()] == ['tag'],
+         'Wrong added tables: %r' % diff.getAddedTables ())
+   check ([table.getName () for table in diff.getRemovedTables ()] == ['comment'],
+         'Wrong removed tables: %r' % diff.getRemovedTables ())
+   check (diff.getChangedTables () == [], 'Unchanged tables differ:\n%s' % diff)
+
+
+def testDiffColumnType ():
+   newSchema = buildSampleSchema ()
+   newSchema.getTable ('post').replaceColumn (ColumnSchema ('title', 'text', 'NO', ''))
+
+   diff = SchemaDiff (buildSampleSchema (), newSchema)
+
+   check ([tableDiff.getTableName () for tableDiff in diff.getChangedTables ()] == ['post'],
+         'Wrong changed tables:\n%s' % diff)
+
+   tableDiff = diff.getChangedTables () [0]
+
+   check ([(oldColumn.getDataType (), newColumn.getDataType ())
+         for oldColumn, newColumn in tableDiff.getChangedColumns ()] == [('varchar', 'text')],
+         'Wrong changed columns:\n%s' % tableDiff)
+   check (not tableDiff.getAddedColumns () and not tableDiff.getRemovedColumns () and
+         not tableDiff.areColumnsReordered () and not tableDiff.getChangedIndexes (),
+         'A changed column type was seen as another change:\n%s' % tableDiff)
+
+
+def testDiffIndexRenamed ():
+   newSchema = buildSampleSchema ()
+   table = newSchema.getTable ('post')
+
+   index = table.getIndex ('fk_post_user')
+   renamed = IndexSchema ('fk_post_author', 1)
+   renamed.addColumn ('user_id')
+   renamed.setConstraint (index.getConstraint ())
+
+   table.removeIndex ('fk_post_user')
+   table.addIndex (renamed)
+
+   diff = SchemaDiff (buildSampleSchema (), newSchema)
+
+   check (len (diff.getChangedTables ()) == 1, 'Wrong changed tables:\n%s' % diff)
+
+   tableDiff = diff.getChangedTables () [0]
+
+   check ([index.getName () for index in tableDiff.getRemovedIndexes ()] == ['fk_post_user'],
+         'Wrong removed indexes:\n%s' % tableDiff)
+   check ([index.getName () for index in tableDiff.getAddedIndexes ()] == ['fk_post_author'],
+         'Wrong added indexes:\n%s' % tableDiff)
+   check (not tableDiff.getChangedIndexes () and not tableDiff.getChangedColumns (),
+         'A renamed index was seen as another change:\n%s' % tableDiff)
+
+
+def testDiffColumnOrder ():
+   newSchema = buildSampleSchema ()
+   table = newSchema.getTable ('post')
+
+   columns = table.getAllColumns ()
+   table.removeColumns (table.getColumnNames ())
+
+   for column in reversed (columns):
+      table.addColumn (column)
+
+   check (table.getStructuralHash () != buildSampleSchema ().getTable ('post').getStructuralHash (),
+         'Reordering the columns did not change the structural hash of the table.')
+   check (newSchema.getStructuralHash () != buildSampleSchema ().getStructuralHash (),
+         'Reordering the columns did not change the structural hash of the schema.')
+
+   diff = SchemaDiff (buildSampleSchema (), newSchema)
+
+   check (len (diff.getChangedTables ()) == 1, 'Wrong changed tables:\n%s' % diff)
+
+   tableDiff = diff.getChangedTables () [0]
+
+   check (tableDiff.areColumnsReordered (), 'The reordered columns were not found.')
+   check (not tableDiff.getAddedColumns () and not tableDiff.getRemovedColumns () and
+         not tableDiff.getChangedColumns (),
+         'Reordered columns were seen as another change:\n%s' % tableDiff)
+
+
+def testXMLRoundTrip ():
+   schema = buildSampleSchema ()
+
+   # Names and extras which must be escaped in attribute values.
+   table = buildTable ('odd "name" <&>', 'user')
+   table.addColumn (ColumnSchema ('a "quoted" & <tagged> column', 'enum', 'NO',
+         "default 'x' & \"y\" <z>"))
+
+   index = IndexSchema ('<index> & "key"', 1)
+   index.addColumn ('a "quoted" & <tagged> column')
+   table.addIndex (index)
+
+   schema.addTable (table)
+
+   outfile = StringIO ()
+   writeDatabaseSchema (schema, outfile)
+
+   for label, document in (('writeDatabaseSchema ()', outfile.getvalue ()), ('repr ()', repr (schema))):
+      loaded = loadDatabaseSchema (StringIO (document))
+
+      check (loaded.getName () == schema.getName (), 'Wrong database name from %s: %s' % (label, loaded.getName ()))
+      check (loaded.getTableNames () == schema.getTableNames (),
+            'Wrong tables from %s: %r' % (label, loaded.getTableNames ()))
+      check (loaded.getStructuralHash () == schema.getStructuralHash (),
+            'The schema read from %s differs:\n%s' % (label, SchemaDiff (schema, loaded)))
+
+      column = loaded.getTable ('odd "name" <&>').getColumn ('a "quoted" & <tagged> column')
+      check (column is not None and column.getExtra () == "default 'x' & \"y\" <z>",
+            'The escaped column was not read back from %s.' % label)
+
+
+# Each test's name and function.  A test function takes no
+# arguments and raises a TestFailure if the test fails.
+TESTS = [
+   ('graph-self-reference', testGraphSelfReference),
+   ('graph-two-cycle', testGraphTwoCycle),
+   ('graph-long-chain', testGraphLongChain),
+   ('graph-rebuilt', testGraphRebuilt),
+   ('graph-constraint', testGraphConstraintChanged),
+   ('graph-cached', testGraphCached),
+   ('snapshot-round-trip', testSnapshotRoundTrip),
+   ('snapshot-bad-header', testSnapshotCorruptHeader),
+   ('snapshot-bad-table', testSnapshotCorruptTable),
+   ('diff-identical', testDiffIdentical),
+   ('diff-tables', testDiffTables),
+   ('diff-column-type', testDiffColumnType),
+   ('diff-index-renamed', testDiffIndexRenamed),
+   ('diff-column-order', testDiffColumnOrder),
+   ('xml-round-trip', testXMLRoundTrip),
+   ('writer-flush', testBufferedWriterFlush)
+   ]
+
+#--------------------------------------------------------------------
+def main (argv):
+   """
+      Runs every test, exiting with status 1 if any fails.
+   """
+
+   failures = 0
+
+   for name, test in TESTS:
+      try:
+         test ()
+         print '%-20s ok' % name
+
+      except TestFailure, excVal:
+         print '%-20s FAILED: %s' % (name, str (excVal))
+         failures += 1
+
+   sys.exit (failures and 1 or 0)
+
+#--------------------------------------------------------------------
+if __name__ == "__main__":
+   main (sys.argv)